@@ -96,3 +96,13 @@ admin.site.unregister(Group)
 @admin.register(AppointmentType)
 class TypeAdmin(admin.ModelAdmin):
     list_display = ("name",)
+
+
+class WorkingBreakInline(admin.TabularInline):
+    model = WorkingBreak
+    extra = 0
+
+
+@admin.register(UserAppointmentManager)
+class ManagerAdmin(admin.ModelAdmin):
+    inlines = [WorkingBreakInline]
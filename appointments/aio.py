@@ -0,0 +1,109 @@
+"""
+Helpers for the async views and the ASGI deployment (venture_schedule/asgi.py).
+
+Database work in the async views goes through sync_to_async, thread sensitive. ThreadSensitiveMiddleware
+gives every request its own thread for that, so all of a request's queries stay on one thread and
+connection while other requests run theirs at the same time. CPU work that doesn't touch the database
+(cutting a week into slots) runs in a shared pool ASYNC_CPU_THREADS threads wide, so a burst of
+availability requests queues up instead of starting a thread each.
+
+Django 3.2 reads streaming responses on the event loop, so the streaming views are wsgi_only.
+"""
+import asyncio
+import functools
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from asgiref.sync import sync_to_async, ThreadSensitiveContext
+from django.conf import settings
+from django.contrib.auth.views import redirect_to_login
+from django.core.handlers.asgi import ASGIRequest
+from django.http import HttpResponse
+from django.utils.cache import get_conditional_response
+from django.utils.http import quote_etag
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def cpu_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ThreadPoolExecutor(max_workers=getattr(settings, "ASYNC_CPU_THREADS", 4),
+                                       thread_name_prefix="availability")
+        return _pool
+
+
+async def run_cpu(func, *args):
+    """
+    Runs func(*args) in the CPU pool. func must not use the database.
+    """
+    return await asyncio.get_running_loop().run_in_executor(cpu_pool(), functools.partial(func, *args))
+
+
+def login_required(view):
+    """
+    django.contrib.auth.decorators.login_required for async views.
+    """
+    @functools.wraps(view)
+    async def wrapper(request, *args, **kwargs):
+        if not await sync_to_async(lambda: request.user.is_authenticated)():
+            return redirect_to_login(request.get_full_path())
+        return await view(request, *args, **kwargs)
+    return wrapper
+
+
+def condition(etag_func):
+    """
+    django.views.decorators.http.condition (ETags only) for async views.
+    """
+    def decorator(view):
+        @functools.wraps(view)
+        async def wrapper(request, *args, **kwargs):
+            etag = await sync_to_async(etag_func)(request, *args, **kwargs)
+            etag = quote_etag(etag) if etag else None
+
+            response = get_conditional_response(request, etag=etag)
+            if response is None:
+                response = await view(request, *args, **kwargs)
+
+            if etag and request.method in ("GET", "HEAD") and has_validators(response):
+                response.setdefault("ETag", etag)
+            return response
+        return wrapper
+    return decorator
+
+
+def has_validators(response):
+    """
+    :return: If the response may carry an ETag or Last-Modified, errors are never revalidated
+    """
+    return 200 <= response.status_code < 300 or response.status_code == 304
+
+
+def wsgi_only(view):
+    """
+    For streaming views, which would run their queries and waits on the event loop under ASGI: answers
+    404 there, they are served by the WSGI deployment.
+    """
+    @functools.wraps(view)
+    def wrapper(request, *args, **kwargs):
+        if isinstance(request, ASGIRequest):
+            return HttpResponse("Served by the WSGI deployment.", status=404, content_type="text/plain")
+        return view(request, *args, **kwargs)
+    return wrapper
+
+
+class ThreadSensitiveMiddleware(object):
+    """
+    ASGI middleware that runs each request's thread sensitive sync code (the ORM) on a thread of its own,
+    instead of every request's on the one process-wide thread Django 3.2 uses.
+    """
+
+    def __init__(self, application):
+        self.application = application
+
+    async def __call__(self, scope, receive, send):
+        async with ThreadSensitiveContext():
+            await self.application(scope, receive, send)
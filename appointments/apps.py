@@ -1,5 +1,18 @@
 from django.apps import AppConfig
+from django.conf import settings
 
 
 class AppointmentsConfig(AppConfig):
     name = 'appointments'
+
+    def ready(self):
+        import appointments.signals  # noqa
+        from appointments import database, timing
+        from django.db.backends.signals import connection_created
+
+        connection_created.connect(database.configure_sqlite)
+        connection_created.connect(timing.install_query_hook)
+
+        if settings.APPOINTMENT_PURGE_INTERVAL:
+            from appointments.retention import start_periodic_purge
+            start_periodic_purge(settings.APPOINTMENT_PURGE_INTERVAL)
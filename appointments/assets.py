@@ -0,0 +1,209 @@
+"""
+Static bundles: the scripts and stylesheets a template loads, served as one minified file.
+
+A template wraps the tags of one bundle in {% bundle "name.js" %} ... {% endbundle %} (templatetags/assets).
+While developing the files are loaded one by one like before, less the ones already in the bundle. With
+ASSET_BUNDLES on the tag is a single <script> or <link> to bundles/<name>, which `manage.py build_assets`
+writes into ASSET_BUNDLE_DIR: the files found in every template's bundle tags, each once, minified and
+concatenated. collectstatic then gives every file a content hashed name (CompressedManifestStorage), so
+they can be cached for good, and writes the .gz and .br files next to them.
+"""
+import mimetypes
+import os
+import re
+
+from django.conf import settings
+from django.contrib.staticfiles import finders
+from django.contrib.staticfiles.storage import ManifestStaticFilesStorage, staticfiles_storage
+from django.core.files.base import ContentFile
+from django.template import Context, Node, TemplateSyntaxError, engines
+from django.templatetags.static import StaticNode, static
+from django.utils._os import safe_join
+from django.utils.html import format_html, format_html_join
+
+from lib import assets
+
+HTML_COMMENT = re.compile(r"<!--.*?-->", re.S)
+
+REFERENCE = re.compile(r"""(?:src|href)\s*=\s*["']([^"']+)["']""")
+
+# The names CompressedManifestStorage gives the files, with the first 12 hex digits of the MD5 in them
+HASHED = re.compile(r"\.[0-9a-f]{12}\.[^/]+$")
+
+# Encodings a file may have a copy in, best first
+ENCODINGS = (("br", ".br"), ("gzip", ".gz"))
+
+TAGS = {
+    ".js": '<script type="text/javascript" src="{}"></script>',
+    ".css": '<link rel="stylesheet" type="text/css" href="{}">',
+}
+
+
+class BundleError(Exception):
+    pass
+
+
+class BundleNode(Node):
+
+    child_nodelists = ("nodelist",)
+
+    def __init__(self, name, nodelist):
+        self.name = name
+        self.nodelist = nodelist
+        self.extension = os.path.splitext(name)[1]
+        if self.extension not in TAGS:
+            raise TemplateSyntaxError("Bundles are .js or .css, not %s." % name)
+
+    def paths(self, context):
+        """
+        :return: The static paths the tags inside load, in order and each once (commented out tags left out)
+        """
+        # {% static %} tags give their path as written: before collectstatic the storage has no hashed names
+        html = "".join(settings.STATIC_URL + node.path.resolve(context) if isinstance(node, StaticNode)
+                       else node.render_annotated(context) for node in self.nodelist)
+        html = HTML_COMMENT.sub("", html)
+        paths = []
+        for url in REFERENCE.findall(html):
+            url = url.strip()
+            if not url.startswith(settings.STATIC_URL):
+                raise BundleError("%s in bundle %s isn't a static file." % (url, self.name))
+            path = url[len(settings.STATIC_URL):]
+            if path not in paths:
+                paths.append(path)
+        return paths
+
+    def render(self, context):
+        if settings.ASSET_BUNDLES:
+            return format_html(TAGS[self.extension], staticfiles_storage.url("bundles/" + self.name))
+        return format_html_join("\n", TAGS[self.extension], ((static(path),) for path in self.paths(context)))
+
+
+def loader_dirs(loaders):
+    for loader in loaders:
+        # The cached loader wraps the ones that read the files
+        if hasattr(loader, "loaders"):
+            yield from loader_dirs(loader.loaders)
+        elif hasattr(loader, "get_dirs"):
+            yield from loader.get_dirs()
+
+
+def template_names(engine):
+    for directory in loader_dirs(engine.template_loaders):
+        for root, _, files in os.walk(directory):
+            for name in sorted(files):
+                if name.endswith(".html"):
+                    yield os.path.relpath(os.path.join(root, name), directory).replace(os.sep, "/")
+
+
+def find_bundles():
+    """
+    Reads every template for its bundle tags.
+    :raises BundleError: If two templates give the same bundle different files
+    :return: dict of bundle name -> [static paths]
+    """
+    bundles = {}
+    for backend in engines.all():
+        engine = getattr(backend, "engine", None)
+        if engine is None:
+            continue
+        for name in template_names(engine):
+            template = engine.get_template(name)
+            context = Context()
+            with context.bind_template(template):
+                for node in template.nodelist.get_nodes_by_type(BundleNode):
+                    paths = node.paths(context)
+                    if bundles.setdefault(node.name, paths) != paths:
+                        raise BundleError("Bundle %s has different files in %s." % (node.name, name))
+    return bundles
+
+
+def read_static(path):
+    found = finders.find(path)
+    if not found:
+        raise BundleError("Could not find %s in the static files." % path)
+    with open(found, "rb") as f:
+        data = f.read()
+    try:
+        return data.decode("utf-8-sig")
+    except UnicodeDecodeError:
+        return data.decode("latin-1")
+
+
+def build_bundle(name, paths):
+    """
+    :return: The bundle's text, each file minified
+    """
+    target = "bundles/" + name
+    if name.endswith(".css"):
+        # @charset is only allowed at the very start, everything here is read as UTF-8 anyway
+        return "\n".join(assets.minify_css(re.sub(r"@charset[^;]*;", "", assets.rebase_css(read_static(path), path,
+                                                                                             target)))
+                         for path in paths)
+    # The ; ends a file that leaves its last statement open before the next one starts
+    return "\n;".join(assets.minify_js(read_static(path)) for path in paths)
+
+
+def write_bundles(bundles, directory=None):
+    """
+    :return: dict of bundle name -> (bytes before, bytes after)
+    """
+    directory = directory or settings.ASSET_BUNDLE_DIR
+    if not os.path.isdir(directory):
+        os.makedirs(directory)
+    sizes = {}
+    for name, paths in bundles.items():
+        text = build_bundle(name, paths).encode("utf-8")
+        with open(os.path.join(directory, name), "wb") as f:
+            f.write(text)
+        sizes[name] = (sum(os.path.getsize(finders.find(path)) for path in paths), len(text))
+    return sizes
+
+
+class CompressedManifestStorage(ManifestStaticFilesStorage):
+    """
+    ManifestStaticFilesStorage that writes .gz (and .br with brotli installed) copies of the hashed files,
+    and leaves url()s to files that don't exist as they are instead of failing collectstatic.
+    """
+
+    def hashed_name(self, name, content=None, filename=None):
+        try:
+            return super(CompressedManifestStorage, self).hashed_name(name, content, filename)
+        except ValueError:
+            if content is None and not self.exists(self.clean_name(name.split("?")[0].split("#")[0])):
+                return name
+            raise
+
+    def post_process(self, paths, dry_run=False, **options):
+        for processed in super(CompressedManifestStorage, self).post_process(paths, dry_run, **options):
+            yield processed
+        if dry_run:
+            return
+        for name in set(self.hashed_files.values()):
+            if not name.endswith(assets.COMPRESSIBLE):
+                continue
+            with self.open(name) as f:
+                data = f.read()
+            for suffix, compressed in assets.compress(data).items():
+                if self.exists(name + suffix):
+                    self.delete(name + suffix)
+                self._save(name + suffix, ContentFile(compressed))
+
+
+def find_asset(path, accept_encoding=""):
+    """
+    :param path: Path of a collected file under STATIC_ROOT
+    :param accept_encoding: The request's Accept-Encoding
+    :return: (file path to send, its content type, the Content-Encoding or None), or None if there's no such file
+    """
+    try:
+        full = safe_join(settings.STATIC_ROOT, path)
+    except ValueError:
+        return None
+    if not os.path.isfile(full):
+        return None
+    content_type = mimetypes.guess_type(full)[0] or "application/octet-stream"
+    accepted = [value.split(";")[0].strip() for value in accept_encoding.split(",")]
+    for encoding, suffix in ENCODINGS:
+        if encoding in accepted and os.path.isfile(full + suffix):
+            return full + suffix, content_type, encoding
+    return full, content_type, None
@@ -0,0 +1,109 @@
+"""
+The one way appointments get booked, shared by the public booking page and the manage dashboard.
+
+Booking is check-then-insert, so it is guarded by an optimistic lock: the manager's `version` is read
+first, the slot is checked, and the insert only happens if bumping the version from the value read
+still matches. Whoever loses the race re-checks the slot (and finds it taken). Only bookings for the
+same manager ever contend.
+"""
+import datetime
+import random
+import time
+
+from django.conf import settings
+from django.db import transaction, IntegrityError, OperationalError
+from django.db.models import F
+
+from appointments.models import Appointment, UserAppointmentManager
+from lib import recurrence
+from lib.zones import schedule_zone
+
+
+class BookingError(Exception):
+    pass
+
+
+def check_slot(manager, start, end, busy=None):
+    """
+    :param busy: IntervalIndex of the manager's busy times around the slot (see busy_index), to check
+                 several slots against one read of the schedule
+    :raises BookingError: If the time is outside of the manager's hours or overlaps something already booked
+    """
+    if end <= start:
+        raise BookingError("The appointment has to end after it starts.")
+
+    # The working hours are wall-clock times of the schedule's zone
+    zone = schedule_zone()
+    if not manager.weekly_hours.allows(start.astimezone(zone), end.astimezone(zone)):
+        raise BookingError("That time is outside of the working hours.")
+
+    # Anything booked over it, the occurrences of repeating rows included
+    if busy is None:
+        busy = manager.busy_index(start, end)
+    if busy.overlaps(start, end):
+        raise BookingError("That time is no longer available.")
+
+
+def is_overlap(error):
+    """
+    :return: If the IntegrityError is PostgreSQL refusing an overlapping appointment (migration 0012)
+    """
+    # exclusion_violation
+    return getattr(error.__cause__, "pgcode", None) == "23P01" or "appointments_no_overlap" in str(error)
+
+
+def check_series(manager, start, end, rule):
+    """
+    Checks every occurrence of a standing appointment up to its last one, or STANDING_APPOINTMENT_HORIZON_WEEKS
+    ahead when it goes on forever, against one read of the schedule.
+    :raises BookingError: If the rule can't be read or any occurrence can't be booked
+    """
+    zone = schedule_zone()
+    try:
+        last = recurrence.series_end(start, end, rule, zone)
+    except ValueError as e:
+        raise BookingError(str(e))
+    horizon = start + datetime.timedelta(weeks=settings.STANDING_APPOINTMENT_HORIZON_WEEKS)
+    last = min(last, horizon) if last else horizon
+
+    busy = manager.busy_index(start, last)
+    for occurrence_start, occurrence_end in recurrence.occurrences(start, end, rule, frozenset(), start, last, zone):
+        try:
+            check_slot(manager, occurrence_start, occurrence_end, busy)
+        except BookingError as e:
+            raise BookingError("%s (%s)" % (e, occurrence_start.astimezone(zone).strftime("%m/%d/%Y %I:%M %p")))
+
+
+def book_appointment(manager, appt_type, start, end, name, email, attempts=10, rrule=""):
+    """
+    Creates the appointment if the slot is still free.
+    :param rrule: Makes it a standing appointment (see lib/recurrence.py), every occurrence is checked
+    :raises BookingError: With a message for the user when it can't be booked
+    """
+    for attempt in range(attempts):
+        try:
+            version = UserAppointmentManager.objects.filter(pk=manager.pk).values_list("version", flat=True).get()
+
+            with transaction.atomic():
+                if rrule:
+                    check_series(manager, start, end, rrule)
+                else:
+                    check_slot(manager, start, end)
+
+                claimed = UserAppointmentManager.objects.filter(pk=manager.pk, version=version) \
+                    .update(version=F("version") + 1)
+                if claimed:
+                    return Appointment.objects.create(manager=manager, type=appt_type, start=start, end=end,
+                                                      name=name, email=email, rrule=rrule)
+        except IntegrityError as e:
+            if not is_overlap(e):
+                raise
+            raise BookingError("That time is no longer available.")
+        except OperationalError:
+            # SQLite gives up on a locked database instead of waiting for the other writer
+            pass
+
+        # Someone else booked with this manager in the meantime, look again
+        time.sleep(random.uniform(0, 0.005 * (attempt + 1)))
+
+    raise BookingError("Too many people are booking right now, please try again.")
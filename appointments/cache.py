@@ -0,0 +1,123 @@
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from asgiref.sync import sync_to_async
+import django
+from django.conf import settings
+from django.core.cache import caches
+
+from lib.time import get_sun_sat
+
+
+def availability_cache():
+    return caches[getattr(settings, "AVAILABILITY_CACHE", "availability")]
+
+
+def get_version(manager_id):
+    """
+    :return: The manager's schedule version (UserAppointmentManager.version), which every change moves on in
+             the same transaction. Read from the database rather than the cache, so every worker sees a change
+             as soon as it commits, whatever cache backend AVAILABILITY_CACHE is.
+    """
+    from appointments.models import UserAppointmentManager
+
+    return UserAppointmentManager.objects.filter(id=manager_id).values_list("version", flat=True).first() or 0
+
+
+def entry_key(manager_id, version, sunday, appt_type_id):
+    return "availability:%s:%s:%s:%s" % (manager_id, version, sunday.isoformat(), appt_type_id)
+
+
+def week_key(manager, date, appt_type):
+    """
+    The key of the week under the manager's current version. Read it before the schedule: a week worked out
+    from a schedule at least as new as the version can never be cached under a newer one, and the entries
+    of older versions are never read again and age out of the cache.
+    """
+    return entry_key(manager.id, get_version(manager.id), get_sun_sat(date)["start"], appt_type.id)
+
+
+def get_available_in_week(manager, date, appt_type):
+    """
+    Cached version of UserAppointmentManager.get_available_in_week, one entry per
+    (manager, version, week, appointment type).
+    """
+    key = week_key(manager, date, appt_type)
+    available = availability_cache().get(key)
+    if available is None:
+        available = manager.get_available_in_week(date, appt_type)
+        availability_cache().set(key, available)
+    return available
+
+
+def get_cached_or_busy(manager, date, appt_type):
+    """
+    :return: (key, the cached week or None, and the busy times to work it out from if it wasn't cached)
+    """
+    key = week_key(manager, date, appt_type)
+    available = availability_cache().get(key)
+    return key, available, manager.get_busy_in_week(date) if available is None else None
+
+
+async def aget_available_in_week(manager, date, appt_type):
+    """
+    get_available_in_week for the async views: the cache and the queries run in the request's thread,
+    cutting the week into slots runs in the CPU pool of appointments.aio.
+    """
+    from appointments import aio
+
+    key, available, busy = await sync_to_async(get_cached_or_busy)(manager, date, appt_type)
+    if available is None:
+        available = await aio.run_cpu(manager.get_slots_in_week, date, appt_type, busy)
+        await sync_to_async(availability_cache().set)(key, available)
+    return available
+
+
+def compute_weeks(appt_types, busy_weeks, manager):
+    """
+    Runs in the warm_availability worker processes, without the database.
+    :param busy_weeks: [(sunday, busy times from get_busy_in_week)]
+    :return: ({(sunday, appointment type id): available}, seconds taken)
+    """
+    began = time.time()
+    weeks = {(sunday, appt_type.id): manager.get_slots_in_week(sunday, appt_type, busy)
+             for sunday, busy in busy_weeks for appt_type in appt_types}
+    return weeks, time.time() - began
+
+
+def warm(managers, sundays, processes=None, report=None):
+    """
+    Works out the weeks starting on `sundays` for every appointment type of the managers and caches them.
+    The queries run in this process while `processes` worker processes cut the weeks into slots. The weeks
+    are cached under the version read before the busy times, so one that changes meanwhile is written under
+    a version no request asks for any more.
+    :param managers: UserAppointmentManager instances
+    :param report: Called with (manager, weeks written, query seconds, compute seconds) for each manager
+    :return: Number of weeks written
+    """
+    cache = availability_cache()
+    written = 0
+
+    with ProcessPoolExecutor(processes, initializer=django.setup) as pool:
+        jobs = {}
+        for manager in managers:
+            appt_types = list(manager.appt_types.all())
+            if not appt_types:
+                continue
+            began = time.time()
+            # Read right before the busy times, see week_key
+            version = get_version(manager.id)
+            busy_weeks = [(sunday, manager.get_busy_in_week(sunday)) for sunday in sundays]
+            jobs[pool.submit(compute_weeks, appt_types, busy_weeks, manager)] = \
+                (manager, version, time.time() - began)
+
+        for job in as_completed(jobs):
+            manager, version, query_seconds = jobs[job]
+            weeks, compute_seconds = job.result()
+            cache.set_many({entry_key(manager.id, version, sunday, type_id): available
+                            for (sunday, type_id), available in weeks.items()})
+            written += len(weeks)
+            if report:
+                report(manager, len(weeks), query_seconds, compute_seconds)
+    return written
+
@@ -0,0 +1,87 @@
+"""
+The SQLite production profile and the read connection.
+
+configure_sqlite runs settings.SQLITE_PRAGMAS on every new SQLite connection. In WAL mode readers work from
+the last commit instead of waiting for a booking to finish writing, and the other pragmas trade a little
+durability (synchronous=NORMAL only syncs at checkpoints) and memory for fewer stalls.
+
+Views wrapped in read_only read through settings.READ_DATABASE when there is one, a second connection to
+the same file that can't write (query_only). ReadRouter sends them there; everything else, and any read
+inside a transaction on the default database, stays on default.
+"""
+import asyncio
+import functools
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+
+# Set while a read_only view runs
+reading = ContextVar("reading", default=False)
+
+
+def apply_pragmas(connection, pragmas):
+    """
+    :param connection: A sqlite3 connection
+    :param pragmas: dict of pragma name -> value
+    """
+    for name, value in pragmas.items():
+        connection.execute("PRAGMA %s = %s" % (name, value))
+
+
+def configure_sqlite(sender, connection, **kwargs):
+    """
+    connection_created receiver. Runs on the sqlite3 connection itself, so the pragmas aren't counted as
+    the request's queries.
+    """
+    if connection.vendor != "sqlite":
+        return
+    pragmas = dict(settings.SQLITE_PRAGMAS)
+    if connection.alias == settings.READ_DATABASE:
+        pragmas["query_only"] = "ON"
+    apply_pragmas(connection.connection, pragmas)
+
+
+def read_only(view):
+    """
+    Lets the view's queries go to settings.READ_DATABASE, for sync and async views.
+    """
+    if asyncio.iscoroutinefunction(view):
+        @functools.wraps(view)
+        async def wrapper(*args, **kwargs):
+            token = reading.set(True)
+            try:
+                return await view(*args, **kwargs)
+            finally:
+                reading.reset(token)
+    else:
+        @functools.wraps(view)
+        def wrapper(*args, **kwargs):
+            token = reading.set(True)
+            try:
+                return view(*args, **kwargs)
+            finally:
+                reading.reset(token)
+    return wrapper
+
+
+class ReadRouter(object):
+
+    def db_for_read(self, model, **hints):
+        if not settings.READ_DATABASE or not reading.get():
+            return None
+        # Reads after a write in the same transaction have to see it
+        if connections[DEFAULT_DB_ALIAS].in_atomic_block:
+            return None
+        return settings.READ_DATABASE
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Both connections are the same database
+        if {obj1._state.db, obj2._state.db} <= {DEFAULT_DB_ALIAS, settings.READ_DATABASE}:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        if db == settings.READ_DATABASE:
+            return False
+        return None
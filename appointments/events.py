@@ -0,0 +1,130 @@
+"""
+Live schedule changes for the server-sent events stream (see views.schedule_events).
+
+Model signals publish a small change event per manager once the transaction commits, and every open
+stream for that manager gets it. Events go through the broker named by SCHEDULE_EVENTS_BROKER:
+LocalBroker only reaches streams in the same process, RedisBroker shares them between workers.
+"""
+import json
+import queue
+import threading
+
+from django.conf import settings
+from django.db import transaction
+from django.utils.module_loading import import_string
+
+
+class Subscription(object):
+
+    def __init__(self, broker, channel):
+        self.broker = broker
+        self.channel = channel
+        self.queue = queue.Queue(maxsize=getattr(settings, "SCHEDULE_EVENTS_QUEUE_SIZE", 100))
+        # Set when events had to be dropped, the stream then tells the page to reload everything
+        self.overflowed = False
+
+    def get(self, timeout):
+        """
+        :return: The next event, or None if there wasn't one within timeout seconds
+        """
+        try:
+            return self.queue.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+    def put(self, event):
+        try:
+            self.queue.put_nowait(event)
+        except queue.Full:
+            self.overflowed = True
+
+    def close(self):
+        self.broker.unsubscribe(self)
+
+
+class LocalBroker(object):
+    """
+    Hands events to the streams open in this process.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.subscriptions = {}
+
+    def subscribe(self, channel):
+        subscription = Subscription(self, channel)
+        with self.lock:
+            self.subscriptions.setdefault(channel, set()).add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self.lock:
+            subscriptions = self.subscriptions.get(subscription.channel, set())
+            subscriptions.discard(subscription)
+            if not subscriptions:
+                self.subscriptions.pop(subscription.channel, None)
+
+    def publish(self, channel, event):
+        with self.lock:
+            subscriptions = list(self.subscriptions.get(channel, ()))
+        for subscription in subscriptions:
+            subscription.put(event)
+
+
+class RedisBroker(LocalBroker):
+    """
+    Publishes through Redis so that every worker's streams get the events. Each process keeps one
+    pattern subscription on a background thread and hands what arrives to its local streams.
+    Needs the redis package and SCHEDULE_EVENTS_REDIS_URL.
+    """
+
+    PREFIX = "schedule-events:"
+
+    def __init__(self):
+        import redis
+
+        super(RedisBroker, self).__init__()
+        self.redis = redis.Redis.from_url(settings.SCHEDULE_EVENTS_REDIS_URL)
+        self.pubsub = self.redis.pubsub(ignore_subscribe_messages=True)
+        self.pubsub.psubscribe(**{self.PREFIX + "*": self.receive})
+        self.pubsub.run_in_thread(sleep_time=1, daemon=True)
+
+    def receive(self, message):
+        channel = message["channel"].decode("utf-8")[len(self.PREFIX):]
+        LocalBroker.publish(self, channel, json.loads(message["data"].decode("utf-8")))
+
+    def publish(self, channel, event):
+        self.redis.publish(self.PREFIX + channel, json.dumps(event))
+
+
+_broker = None
+_broker_lock = threading.Lock()
+
+
+def get_broker():
+    global _broker
+    with _broker_lock:
+        if _broker is None:
+            _broker = import_string(getattr(settings, "SCHEDULE_EVENTS_BROKER", "appointments.events.LocalBroker"))()
+        return _broker
+
+
+def channel_name(manager_id):
+    return "manager:%s" % manager_id
+
+
+def publish(manager_id, kind, action, **data):
+    """
+    Sends the change to the manager's streams once the current transaction (if any) commits.
+    :param kind: "appointment", "timeoff", "hours", "types" or "schedule" (anything, reload it all)
+    :param action: "created", "deleted" or "changed"
+    """
+    event = dict(data, kind=kind, action=action)
+    transaction.on_commit(lambda: get_broker().publish(channel_name(manager_id), event))
+
+
+def public_event(event):
+    """
+    The event without the details only the coach should see (student names, emails, reasons).
+    """
+    return {key: value for key, value in event.items() if key not in ("title", "email")}
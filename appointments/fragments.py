@@ -0,0 +1,53 @@
+"""
+Versioned keys for the template fragments cached with {% cache %}.
+
+Each group of fragments has a generation number (FragmentVersion) that goes into the fragment's key. The
+User and AppointmentType signals move it on in the same transaction as the change, so the next render on
+any worker misses and caches the new markup under the new key while the old entries age out of the
+cache. Nothing has to find and delete them.
+"""
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db.models import F
+
+from appointments.models import FragmentVersion
+
+# The coach dropdown: every coach's name and if they are private
+COACHES = "coaches"
+
+
+def fragment_cache():
+    return caches[settings.FRAGMENT_CACHE]
+
+
+def types_group(manager_id):
+    """
+    :return: Group of the fragments that list the manager's appointment types
+    """
+    return "types:%s" % manager_id
+
+
+def get_generations(*groups):
+    """
+    :return: [generation of each group], 0 for the ones never changed
+    """
+    found = dict(FragmentVersion.objects.filter(name__in=groups).values_list("name", "version"))
+    return [found.get(group, 0) for group in groups]
+
+
+def invalidate(group):
+    # Never restart from a number that could still be in older keys if the row was lost
+    FragmentVersion.objects.get_or_create(name=group, defaults={"version": int(time.time() * 1000)})
+    FragmentVersion.objects.filter(name=group).update(version=F("version") + 1)
+
+
+def index_context(manager_id):
+    """
+    :param manager_id: The manager whose appointment types the page lists, or None
+    :return: The context the {% cache %} tags of dashboard/appt/index.html key on
+    """
+    coaches, types = get_generations(COACHES, types_group(manager_id))
+    return {"fragment_cache": settings.FRAGMENT_CACHE, "fragment_timeout": settings.FRAGMENT_CACHE_TIMEOUT,
+            "coaches_version": coaches, "types_version": types}
@@ -0,0 +1,135 @@
+"""
+The materialized free time of every manager (FreeInterval rows), kept in step with the appointments
+and time off as they are created and deleted, so the availability can be read with one range query.
+
+The free intervals are the gaps between the busy times over all time, from NEVER_BEFORE to NEVER_AFTER.
+Working hours aren't part of them; slots are still checked against WeeklyHours when they are cut.
+Neither are repeating appointments and time off, which never have to end; their occurrences are
+expanded on top when the intervals are read.
+"""
+import datetime
+import itertools
+
+import pytz
+from django.conf import settings
+from django.db import transaction
+from django.db.models import CharField, TextField, Value
+
+from appointments.models import FreeInterval, Appointment, TimeOff, UserAppointmentManager
+from lib import recurrence
+from lib.intervals import IntervalIndex
+from lib.zones import schedule_zone
+
+NEVER_BEFORE = pytz.utc.localize(datetime.datetime(1970, 1, 1))
+NEVER_AFTER = pytz.utc.localize(datetime.datetime(9999, 1, 1))
+
+
+def enabled():
+    return getattr(settings, "AVAILABILITY_MATERIALIZED", False)
+
+
+def busy_times(manager_id, start=NEVER_BEFORE, end=NEVER_AFTER):
+    """
+    :return: Flattened busy times (see flatten_time_array) of the one-off appointments and time off
+             overlapping the range
+    """
+    return IntervalIndex(itertools.chain(*(model.objects.filter(manager_id=manager_id).overlapping(start, end)
+                                           .values_list("start", "end") for model in (Appointment, TimeOff)))) \
+        .flattened()
+
+
+def gaps(times, start, end):
+    """
+    :return: (start, end) of every gap between the flattened busy times, clipped to the range
+    """
+    edges = [start] + times + [end]
+    return [(max(edges[i], start), min(edges[i + 1], end)) for i in range(0, len(edges), 2)
+            if min(edges[i + 1], end) > max(edges[i], start)]
+
+
+def compute(manager_id):
+    return gaps(busy_times(manager_id), NEVER_BEFORE, NEVER_AFTER)
+
+
+@transaction.atomic
+def rebuild(manager_id):
+    FreeInterval.objects.filter(manager_id=manager_id).delete()
+    FreeInterval.objects.bulk_create([FreeInterval(manager_id=manager_id, start=start, end=end)
+                                      for start, end in compute(manager_id)])
+    UserAppointmentManager.objects.filter(id=manager_id).update(free_time_built=True)
+
+
+def is_built(manager_id):
+    return UserAppointmentManager.objects.filter(id=manager_id, free_time_built=True).exists()
+
+
+def is_consistent(manager_id):
+    stored = list(FreeInterval.objects.filter(manager_id=manager_id).order_by("start").values_list("start", "end"))
+    return stored == compute(manager_id)
+
+
+@transaction.atomic
+def mark_busy(manager_id, start, end):
+    """
+    Splits the free intervals that start to end now cuts through.
+    """
+    if not is_built(manager_id):
+        # The change is already in the rows the rebuild reads
+        rebuild(manager_id)
+        return
+    overlapping = FreeInterval.objects.select_for_update().filter(manager_id=manager_id).overlapping(start, end)
+
+    pieces = []
+    for interval in overlapping:
+        if interval.start < start:
+            pieces.append(FreeInterval(manager_id=manager_id, start=interval.start, end=start))
+        if end < interval.end:
+            pieces.append(FreeInterval(manager_id=manager_id, start=end, end=interval.end))
+    overlapping.delete()
+    FreeInterval.objects.bulk_create(pieces)
+
+
+@transaction.atomic
+def mark_free(manager_id, start, end):
+    """
+    Works the free intervals out again from start to end and merges them into the ones either side.
+    """
+    if not is_built(manager_id):
+        rebuild(manager_id)
+        return
+    touching = FreeInterval.objects.select_for_update().filter(manager_id=manager_id, start__lte=end, end__gte=start)
+    for interval in touching:
+        start = min(start, interval.start)
+        end = max(end, interval.end)
+    touching.delete()
+
+    FreeInterval.objects.bulk_create([FreeInterval(manager_id=manager_id, start=gap_start, end=gap_end)
+                                      for gap_start, gap_end in gaps(busy_times(manager_id, start, end), start, end)])
+
+
+def busy_times_for_range(manager, start, end):
+    """
+    The busy times from start to end rebuilt from the free intervals, in the flattened form that
+    get_available_in_week works with. The repeating rows come in the same query.
+    """
+    if not manager.free_time_built:
+        rebuild(manager.id)
+        manager.free_time_built = True
+
+    fields = ("start", "end", "rrule", "exdates")
+    intervals = manager.free_intervals.overlapping(start, end).order_by() \
+        .annotate(rrule=Value("", CharField()), exdates=Value("", TextField())).values_list(*fields)
+    series = [rows.recurring(start, end).order_by().values_list(*fields)
+              for rows in (manager.appointments, manager.exceptions)]
+    rows = list(intervals.union(*series, all=True).order_by("start"))
+
+    free = [(free_start, free_end) for free_start, free_end, rule, _ in rows if not rule]
+    times = [start]
+    for free_start, free_end in free:
+        times += [max(free_start, start), min(free_end, end)]
+    times.append(end)
+
+    repeats = list(recurrence.expand([row for row in rows if row[2]], start, end, schedule_zone()))
+    if not repeats:
+        return times
+    return IntervalIndex([(times[i], times[i + 1]) for i in range(0, len(times), 2)] + repeats).flattened()
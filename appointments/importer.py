@@ -0,0 +1,257 @@
+"""
+Bulk import of appointments and time off from CSV or JSON lines, for coaches moving a whole semester in.
+
+Every row has a `kind` ("appointment" or "timeoff"), a `manager` (id or the coach's email), `start` and
+`end` (ISO 8601, in SCHEDULE_TIME_ZONE unless an offset is given) and then `type`, `name` and `email` for appointments or
+`reason` for time off.
+
+The file is read twice so it never has to fit in memory. The first pass validates every row and keeps
+only (manager, start, end, kind, line) numbers for the good ones, which are sorted and swept once to find
+overlaps with each other and with what is already booked. The second pass reads the file again and
+inserts the rows that passed with bulk_create, `batch_size` at a time.
+"""
+import csv
+import datetime
+import json
+import time
+from array import array
+
+import pytz
+from django.conf import settings
+from django.db import transaction
+from django.utils.dateparse import parse_datetime
+
+from appointments import events, free_time
+from appointments.models import Appointment, AppointmentType, TimeOff, UserAppointmentManager
+from lib.intervals import IntervalIndex
+from lib.zones import schedule_zone
+
+FORMATS = ("csv", "jsonl")
+
+EPOCH = pytz.utc.localize(datetime.datetime(1970, 1, 1))
+
+
+class ScheduleImportError(Exception):
+    pass
+
+
+def guess_format(filename):
+    """
+    :return: "csv" or "jsonl" from the file's extension
+    """
+    if filename.lower().endswith(".csv"):
+        return "csv"
+    if filename.lower().endswith((".jsonl", ".json", ".ndjson")):
+        return "jsonl"
+    raise ScheduleImportError("Unknown file type, upload a .csv or .jsonl file.")
+
+
+def read_rows(lines, fmt):
+    """
+    :param lines: Iterable of text lines
+    :return: Generator of (line number, dict or None if the line couldn't be read)
+    """
+    if fmt == "csv":
+        reader = csv.DictReader(lines)
+        for row in reader:
+            yield reader.line_num, row
+    else:
+        for number, line in enumerate(lines, 1):
+            if not line.strip():
+                continue
+            try:
+                row = json.loads(line)
+            except ValueError:
+                row = None
+            yield number, row if isinstance(row, dict) else None
+
+
+def to_micros(value):
+    return (value - EPOCH) // datetime.timedelta(microseconds=1)
+
+
+class RowParser(object):
+    """
+    Turns rows into model instances, looking up each manager and appointment type once.
+    """
+
+    def __init__(self, manager=None):
+        # Uploads through the dashboard can only import into the coach's own schedule
+        self.manager = manager
+        self.managers = {}
+        self.types = {}
+        self.zone = schedule_zone()
+
+    def get_manager_id(self, value):
+        value = str(value or "").strip()
+        if self.manager is not None:
+            if value and value not in (str(self.manager.id), self.manager.user.email if self.manager.user else ""):
+                raise ValueError("You can only import into your own schedule.")
+            return self.manager.id
+        if not value:
+            raise ValueError("Missing manager.")
+        if value not in self.managers:
+            managers = UserAppointmentManager.objects
+            found = managers.filter(id=int(value)) if value.isdigit() else managers.filter(user__email=value.lower())
+            self.managers[value] = found.values_list("id", flat=True).first()
+        if self.managers[value] is None:
+            raise ValueError("Could not find the manager %s." % value)
+        return self.managers[value]
+
+    def get_type_manager_id(self, value):
+        try:
+            type_id = int(value)
+        except (TypeError, ValueError):
+            raise ValueError("Invalid appointment type.")
+        if type_id not in self.types:
+            self.types[type_id] = AppointmentType.objects.filter(id=type_id).values_list("manager_id", flat=True).first()
+        return self.types[type_id]
+
+    def get_time(self, row, field):
+        value = parse_datetime(str(row.get(field) or "").strip())
+        if value is None:
+            raise ValueError("Invalid %s time." % field)
+        if value.tzinfo is None:
+            value = self.zone.normalize(self.zone.localize(value))
+        return value
+
+    def parse(self, row):
+        """
+        :raises ValueError: With the message for the error report
+        :return: An unsaved Appointment or TimeOff
+        """
+        if row is None:
+            raise ValueError("Could not read the row.")
+
+        kind = str(row.get("kind") or "").strip().lower()
+        if kind not in ("appointment", "timeoff"):
+            raise ValueError("Kind must be 'appointment' or 'timeoff'.")
+
+        manager_id = self.get_manager_id(row.get("manager"))
+        start, end = self.get_time(row, "start"), self.get_time(row, "end")
+        if end <= start:
+            raise ValueError("End has to be after the start.")
+
+        if kind == "timeoff":
+            reason = str(row.get("reason") or "Vacation").strip()
+            if len(reason) > TimeOff._meta.get_field("reason").max_length:
+                raise ValueError("Reason is too long.")
+            return TimeOff(manager_id=manager_id, reason=reason, start=start, end=end)
+
+        if self.get_type_manager_id(row.get("type")) != manager_id:
+            raise ValueError("Could not find the type.")
+        name, email = str(row.get("name") or "").strip(), str(row.get("email") or "").strip()
+        if len(name) < 3 or len(email) < 3:
+            raise ValueError("Missing name or email.")
+        return Appointment(manager_id=manager_id, type_id=int(row["type"]), name=name[:128], email=email[:128],
+                           start=start, end=end)
+
+
+def find_overlaps(managers, starts, ends, appointments, lines, errors):
+    """
+    Goes through the validated rows of every manager in start order, checking each against an
+    IntervalIndex of what the manager already has booked and the rows kept so far, and adds an error for
+    each row that overlaps one of those. Time off may overlap other time off, nothing may overlap an
+    appointment.
+    """
+    order = sorted(range(len(lines)), key=lambda i: (managers[i], starts[i], lines[i]))
+
+    position = 0
+    while position < len(order):
+        manager_id = managers[order[position]]
+        last = position
+        while last < len(order) and managers[order[last]] == manager_id:
+            last += 1
+        rows = order[position:last]
+        position = last
+
+        earliest = EPOCH + datetime.timedelta(microseconds=min(starts[i] for i in rows))
+        latest = EPOCH + datetime.timedelta(microseconds=max(ends[i] for i in rows))
+        booked = [(to_micros(start), to_micros(end), model is Appointment) for model in (Appointment, TimeOff)
+                  for start, end in model.objects.filter(manager_id=manager_id).busy_times(earliest, latest)]
+
+        # Everything booked and kept so far, and just the appointments
+        busy = IntervalIndex((start, end) for start, end, _ in booked)
+        appointments_busy = IntervalIndex((start, end) for start, end, is_appointment in booked if is_appointment)
+
+        for i in rows:
+            if (busy if appointments[i] else appointments_busy).overlaps(starts[i], ends[i]):
+                errors[lines[i]] = "Overlaps another appointment or time off."
+                continue
+
+            busy.insert(starts[i], ends[i])
+            if appointments[i]:
+                appointments_busy.insert(starts[i], ends[i])
+
+
+def import_schedule(open_lines, fmt, manager=None, batch_size=None, dry_run=False):
+    """
+    :param open_lines: Called (twice) to get an iterable over the lines of the file
+    :param fmt: "csv" or "jsonl"
+    :param manager: Only allow rows for this manager (the coach uploading)
+    :param dry_run: Only validate, insert nothing
+    :return: dict with the number of appointments and time off imported, the sorted
+             [(line, message)] errors and the seconds taken
+    """
+    if fmt not in FORMATS:
+        raise ScheduleImportError("Unknown format %s." % fmt)
+    batch_size = batch_size or settings.IMPORT_BATCH_SIZE
+
+    began = time.time()
+    parser = RowParser(manager)
+    errors = {}
+
+    with transaction.atomic():
+        # Take the same lock as a booking, so nothing gets booked between the check and the insert. A dry run
+        # changes nothing and leaves the versions (and with them the ETags and cached weeks) alone.
+        if manager is not None and not dry_run:
+            UserAppointmentManager.bump_version(manager.id)
+
+        managers, starts, ends, appointments, lines = array("q"), array("q"), array("q"), array("b"), array("q")
+        for line, row in read_rows(open_lines(), fmt):
+            try:
+                instance = parser.parse(row)
+            except ValueError as e:
+                errors[line] = str(e)
+                continue
+            managers.append(instance.manager_id)
+            starts.append(to_micros(instance.start))
+            ends.append(to_micros(instance.end))
+            appointments.append(isinstance(instance, Appointment))
+            lines.append(line)
+
+        if manager is None and managers and not dry_run:
+            UserAppointmentManager.bump_version(*set(managers))
+
+        find_overlaps(managers, starts, ends, appointments, lines, errors)
+
+        imported = [appointments[i] for i in range(len(lines)) if lines[i] not in errors]
+        counts = {Appointment: sum(imported), TimeOff: len(imported) - sum(imported)}
+        touched = set()
+        if not dry_run:
+            batches = {Appointment: [], TimeOff: []}
+            for line, row in read_rows(open_lines(), fmt):
+                if line in errors:
+                    continue
+                instance = parser.parse(row)
+                batch = batches[type(instance)]
+                batch.append(instance)
+                touched.add(instance.manager_id)
+                if len(batch) >= batch_size:
+                    type(instance).objects.bulk_create(batch)
+                    del batch[:]
+            for model, batch in batches.items():
+                model.objects.bulk_create(batch)
+
+        # Every row was skipped, take the lock's version bump back
+        if not touched:
+            transaction.set_rollback(True)
+
+    # bulk_create skips the save signals, so update the free time and open pages by hand
+    for manager_id in touched:
+        if free_time.enabled():
+            free_time.rebuild(manager_id)
+        events.publish(manager_id, "schedule", "changed")
+
+    return {"appointments": counts[Appointment], "time_off": counts[TimeOff],
+            "errors": sorted(errors.items()), "seconds": time.time() - began}
@@ -0,0 +1,39 @@
+from django.core.management.base import BaseCommand
+from django.test.utils import setup_test_environment, teardown_test_environment, setup_databases, \
+    teardown_databases
+
+from benchmarks import runner
+
+
+class Command(BaseCommand):
+    help = "Runs the benchmarks/ suites against a throwaway database and saves the timings as JSON."
+
+    def add_arguments(self, parser):
+        parser.add_argument("names", nargs="*", help="Only run benchmarks whose name contains one of these.")
+        parser.add_argument("--output", help="Where to write the JSON results (default: benchmarks/results/).")
+        parser.add_argument("--compare", help="JSON results of an earlier run to compare against.")
+
+    def handle(self, *args, **options):
+        setup_test_environment()
+        databases = setup_databases(verbosity=0, interactive=False)
+        try:
+            results = runner.run(options["names"], progress=self.report)
+        finally:
+            teardown_databases(databases, verbosity=0)
+            teardown_test_environment()
+
+        self.stdout.write("Saved to %s" % runner.save(results, options["output"]))
+
+        if options["compare"]:
+            self.stdout.write("")
+            for name, old, new, ratio in runner.compare(results, options["compare"]):
+                self.stdout.write("%-45s %10.3fms -> %10.3fms  %5.2fx" % (name, old * 1000, new * 1000, ratio))
+
+    def report(self, name, result):
+        line = "%-45s best %10.3fms  median %10.3fms" % (name, result["best"] * 1000, result["median"] * 1000)
+        if "per_item" in result:
+            line += "  (%.2fus per item)" % (result["per_item"] * 1000000)
+        for key, value in result.items():
+            if key not in ("best", "median", "number", "repeat", "per_item"):
+                line += "  %s=%s" % (key, round(value, 1))
+        self.stdout.write(line)
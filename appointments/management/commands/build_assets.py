@@ -0,0 +1,44 @@
+from django.conf import settings
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+
+from appointments import assets
+from lib import assets as assets_lib
+
+
+class Command(BaseCommand):
+    help = "Writes the minified bundle of every {% bundle %} tag in the templates to ASSET_BUNDLE_DIR and " \
+           "collects the static files under content hashed names, with .gz/.br copies."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--no-collect", action="store_true",
+                            help="Only write the bundles, don't run collectstatic.")
+
+    def handle(self, *args, **options):
+        if assets_lib.rjsmin is None:
+            raise CommandError("Minifying the scripts needs rjsmin, install requirements.txt first.")
+        try:
+            bundles = assets.find_bundles()
+            sizes = assets.write_bundles(bundles)
+        except assets.BundleError as e:
+            raise CommandError(str(e))
+
+        for name in sorted(bundles):
+            before, after = sizes[name]
+            self.stdout.write("%-20s %3d files  %9d -> %8d bytes" % (name, len(bundles[name]), before, after))
+
+        # A page loading two bundles with the same file in them downloads it twice
+        found = {}
+        for name, paths in sorted(bundles.items()):
+            for path in paths:
+                found.setdefault(path, []).append(name)
+        for path, names in sorted(found.items()):
+            if len(names) > 1:
+                self.stdout.write("%s is in %s" % (path, ", ".join(names)))
+
+        if not settings.ASSET_BUNDLES:
+            self.stderr.write("ASSET_BUNDLES is off, the files are collected under their own names and the "
+                              "templates still load them one by one.")
+
+        if not options["no_collect"]:
+            call_command("collectstatic", interactive=False, verbosity=options["verbosity"])
@@ -0,0 +1,36 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from appointments.importer import import_schedule, guess_format, FORMATS, ScheduleImportError
+
+
+class Command(BaseCommand):
+    help = "Imports appointments and time off from a CSV or JSON lines file, reporting the rows that were skipped."
+
+    def add_arguments(self, parser):
+        parser.add_argument("path", help="File to import.")
+        parser.add_argument("--format", choices=FORMATS, help="File format (default: from the extension).")
+        parser.add_argument("--batch-size", type=int, default=settings.IMPORT_BATCH_SIZE,
+                            help="Rows inserted per INSERT statement.")
+        parser.add_argument("--dry-run", action="store_true", help="Only check the file, import nothing.")
+
+    def handle(self, *args, **options):
+        try:
+            fmt = options["format"] or guess_format(options["path"])
+            with open(options["path"], newline="", encoding="utf-8") as f:
+
+                # The file is read twice, once to check the rows and once to insert them
+                def open_lines():
+                    f.seek(0)
+                    return f
+
+                result = import_schedule(open_lines, fmt, batch_size=options["batch_size"],
+                                         dry_run=options["dry_run"])
+        except (ScheduleImportError, OSError) as e:
+            raise CommandError(str(e))
+
+        for line, message in result["errors"]:
+            self.stdout.write("Line %s: %s" % (line, message))
+        self.stdout.write("%s %s appointments and %s time off in %.2fs, skipped %s rows." % (
+            "Checked" if options["dry_run"] else "Imported", result["appointments"], result["time_off"],
+            result["seconds"], len(result["errors"])))
@@ -0,0 +1,84 @@
+import statistics
+import threading
+import time
+import urllib.error
+import urllib.request
+
+from django.core.management.base import BaseCommand
+
+
+def percentile(values, fraction):
+    return values[min(len(values) - 1, int(len(values) * fraction))] if values else 0
+
+
+class Command(BaseCommand):
+    help = "Sends requests to a running server from many threads at once and reports the throughput and " \
+           "latency. Run it against the WSGI (gunicorn venture_schedule.wsgi) and ASGI " \
+           "(uvicorn venture_schedule.asgi:application) deployments to compare them."
+
+    def add_arguments(self, parser):
+        parser.add_argument("urls", nargs="+", help="Full URLs, requested in turn.")
+        parser.add_argument("--concurrency", type=int, default=50, help="Requests in flight at once.")
+        parser.add_argument("--duration", type=float, default=10, help="Seconds to keep sending requests.")
+        parser.add_argument("--timeout", type=float, default=10, help="Seconds before a request counts as failed.")
+        parser.add_argument("--streams", type=int, default=0,
+                            help="Event streams (/<user_id>/events) to hold open during the test, which keep "
+                                 "a sync worker busy each. Opened on the first URL's server for user 1.")
+
+    def handle(self, *args, **options):
+        urls = options["urls"]
+        stop = time.time() + options["duration"]
+        latencies, errors = [], []
+        lock = threading.Lock()
+
+        def client(number):
+            position = number
+            while time.time() < stop:
+                url = urls[position % len(urls)]
+                position += 1
+                began = time.time()
+                try:
+                    with urllib.request.urlopen(url, timeout=options["timeout"]) as response:
+                        response.read()
+                except (urllib.error.URLError, OSError) as e:
+                    with lock:
+                        errors.append(str(e))
+                    continue
+                with lock:
+                    latencies.append(time.time() - began)
+
+        def stream():
+            base = urls[0].split("/", 3)
+            url = "/".join(base[:3]) + "/1/events"
+            try:
+                with urllib.request.urlopen(url, timeout=options["duration"] + options["timeout"]) as response:
+                    while time.time() < stop and response.readline():
+                        pass
+            except (urllib.error.URLError, OSError):
+                pass
+
+        threads = [threading.Thread(target=stream, daemon=True) for _ in range(options["streams"])]
+        for thread in threads:
+            thread.start()
+        if threads:
+            # Let the streams take their workers before the requests start
+            time.sleep(1)
+            stop += 1
+
+        began = time.time()
+        clients = [threading.Thread(target=client, args=(i,)) for i in range(options["concurrency"])]
+        for thread in clients:
+            thread.start()
+        for thread in clients:
+            thread.join()
+        seconds = time.time() - began
+
+        latencies.sort()
+        self.stdout.write("%d requests in %.1fs, %.1f req/s, %d errors" %
+                          (len(latencies), seconds, len(latencies) / seconds, len(errors)))
+        if latencies:
+            self.stdout.write("latency median %.1fms  p95 %.1fms  p99 %.1fms  max %.1fms" %
+                              (statistics.median(latencies) * 1000, percentile(latencies, 0.95) * 1000,
+                               percentile(latencies, 0.99) * 1000, latencies[-1] * 1000))
+        for error in sorted(set(errors))[:5]:
+            self.stdout.write("  %s" % error)
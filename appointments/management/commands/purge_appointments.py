@@ -0,0 +1,19 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from appointments.retention import purge_expired_appointments
+
+
+class Command(BaseCommand):
+    help = "Deletes appointments that ended more than the retention window ago, in batches."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--weeks", type=int, default=settings.APPOINTMENT_RETENTION_WEEKS,
+                            help="Keep appointments that ended within this many weeks.")
+        parser.add_argument("--batch-size", type=int, default=settings.APPOINTMENT_PURGE_BATCH_SIZE,
+                            help="Rows removed per DELETE statement.")
+
+    def handle(self, *args, **options):
+        deleted, seconds = purge_expired_appointments(weeks=options["weeks"], batch_size=options["batch_size"])
+        rate = deleted / seconds if seconds else 0
+        self.stdout.write("Deleted %s appointments in %.2fs (%.0f rows/sec)." % (deleted, seconds, rate))
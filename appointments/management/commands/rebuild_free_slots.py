@@ -0,0 +1,34 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from appointments import free_time
+from appointments.models import UserAppointmentManager
+
+
+class Command(BaseCommand):
+    help = "Rebuilds the materialized free intervals from the appointments and time off, or checks them."
+
+    def add_arguments(self, parser):
+        parser.add_argument("managers", nargs="*", type=int, help="Manager ids (default: all of them).")
+        parser.add_argument("--check", action="store_true",
+                            help="Only report managers whose stored free intervals are out of date.")
+
+    def handle(self, *args, **options):
+        managers = UserAppointmentManager.objects.order_by("id")
+        if options["managers"]:
+            managers = managers.filter(id__in=options["managers"])
+
+        stale = 0
+        for manager_id in managers.values_list("id", flat=True):
+            if options["check"]:
+                if not free_time.is_consistent(manager_id):
+                    stale += 1
+                    self.stdout.write("Manager %s is out of date." % manager_id)
+            else:
+                free_time.rebuild(manager_id)
+
+        if options["check"]:
+            if stale:
+                raise CommandError("%s manager(s) out of date." % stale)
+            self.stdout.write("All free intervals are up to date.")
+        else:
+            self.stdout.write("Rebuilt the free intervals of %s manager(s)." % managers.count())
@@ -0,0 +1,60 @@
+import datetime
+import os
+import time
+
+from django.conf import settings
+from django.core.cache.backends.dummy import DummyCache
+from django.core.cache.backends.locmem import LocMemCache
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from appointments import cache
+from appointments.models import UserAppointmentManager
+from lib.time import get_sun_sat
+
+
+class Command(BaseCommand):
+    help = "Works out the open slots of every coach's next weeks in parallel and stores them in the " \
+           "availability cache, so the first requests after booking opens don't have to."
+
+    def add_arguments(self, parser):
+        parser.add_argument("managers", nargs="*", type=int, help="Manager ids (default: every coach).")
+        parser.add_argument("--weeks", type=int, default=settings.WARM_AVAILABILITY_WEEKS,
+                            help="Weeks to fill in, starting with this one.")
+        parser.add_argument("--start", help="A date (YYYY-MM-DD) in the first week (default: today).")
+        parser.add_argument("--processes", type=int, default=os.cpu_count(),
+                            help="Worker processes cutting the weeks into slots.")
+        parser.add_argument("--force", action="store_true",
+                            help="Warm the weeks even if AVAILABILITY_CACHE isn't shared with the servers.")
+
+    def handle(self, *args, **options):
+        if options["weeks"] < 1 or options["processes"] < 1:
+            raise CommandError("--weeks and --processes have to be at least 1.")
+        try:
+            start = datetime.datetime.strptime(options["start"], "%Y-%m-%d").date() if options["start"] \
+                else timezone.now().date()
+        except ValueError:
+            raise CommandError("Invalid --start date, use YYYY-MM-DD.")
+
+        # These keep the weeks in this command's own process, which exits when it is done
+        if isinstance(cache.availability_cache(), (LocMemCache, DummyCache)) and not options["force"]:
+            raise CommandError("AVAILABILITY_CACHE isn't shared with the servers, so they would never see these "
+                               "weeks. Point it at a shared backend (memcached, redis, database) or pass --force.")
+
+        managers = UserAppointmentManager.objects.filter(user__type__startswith="h__") \
+            .select_related("user").prefetch_related("appt_types").order_by("id")
+        if options["managers"]:
+            managers = managers.filter(id__in=options["managers"])
+        sunday = get_sun_sat(start)["start"]
+        sundays = [sunday + datetime.timedelta(weeks=week) for week in range(options["weeks"])]
+
+        began = time.time()
+        written = cache.warm(managers, sundays, processes=options["processes"], report=self.report)
+        seconds = time.time() - began
+
+        self.stdout.write("Cached %s weeks in %.2fs, %.1f weeks/s with %s processes." %
+                          (written, seconds, written / seconds if seconds else 0, options["processes"]))
+
+    def report(self, manager, weeks, query_seconds, compute_seconds):
+        self.stdout.write("%-40s %4d weeks  queries %8.1fms  compute %8.1fms" %
+                          (manager.user.email, weeks, query_seconds * 1000, compute_seconds * 1000))
@@ -0,0 +1,84 @@
+import asyncio
+import logging
+import time
+
+from django.conf import settings
+
+from appointments import timing
+
+logger = logging.getLogger(__name__)
+
+# Where requests that matched no URL are counted, every 404 path would be an entry of its own otherwise
+UNRESOLVED = "<unresolved>"
+
+
+class QueryBudgetExceeded(AssertionError):
+    pass
+
+
+class RequestTimingMiddleware(object):
+    """
+    Counts the queries and times the database, templates and view of every request. The numbers are
+    sent back in a Server-Timing header and added to timing.summary under the URL name.
+
+    settings.QUERY_BUDGETS maps URL names to the most queries they may run. Going over is logged, or
+    raises QueryBudgetExceeded when settings.QUERY_BUDGET_STRICT is on (meant for the tests).
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if asyncio.iscoroutinefunction(get_response):
+            # Marks this middleware as async for Django, the way MiddlewareMixin does
+            self._is_coroutine = asyncio.coroutines._is_coroutine
+
+    def __call__(self, request):
+        if asyncio.iscoroutinefunction(self.get_response):
+            return self.__acall__(request)
+
+        stats = timing.RequestStats()
+        token = timing.current_stats.set(stats)
+        began = time.time()
+        try:
+            response = self.get_response(request)
+        finally:
+            stats.view_time = time.time() - began
+            timing.current_stats.reset(token)
+        return self.process_stats(request, response, stats)
+
+    async def __acall__(self, request):
+        stats = timing.RequestStats()
+        token = timing.current_stats.set(stats)
+        began = time.time()
+        try:
+            response = await self.get_response(request)
+        finally:
+            stats.view_time = time.time() - began
+            timing.current_stats.reset(token)
+        return self.process_stats(request, response, stats)
+
+    def process_stats(self, request, response, stats):
+        """
+        Records the request and sends the numbers back (see the class docstring).
+        """
+        match = getattr(request, "resolver_match", None)
+        if match:
+            # The dotted path of the view for the URLs without a name
+            url_name = match.url_name or match.view_name
+        else:
+            url_name = UNRESOLVED
+        timing.summary.add(url_name, stats)
+
+        if getattr(settings, "SERVER_TIMING", True):
+            response["Server-Timing"] = stats.server_timing()
+
+        budget = getattr(settings, "QUERY_BUDGETS", {}).get(url_name)
+        if budget is not None and stats.queries > budget:
+            message = "%s ran %s queries, the budget is %s." % (url_name, stats.queries, budget)
+            if getattr(settings, "QUERY_BUDGET_STRICT", False):
+                raise QueryBudgetExceeded(message)
+            logger.warning(message)
+
+        return response
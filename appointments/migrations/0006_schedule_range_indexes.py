@@ -0,0 +1,21 @@
+# Generated by Django 2.2.28 on 2026-10-18 06:28
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('appointments', '0005_auto_20170204_2007'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='appointment',
+            index=models.Index(fields=['manager', 'start', 'end'], name='appointments_range_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='timeoff',
+            index=models.Index(fields=['manager', 'start', 'end'], name='exceptions_range_idx'),
+        ),
+    ]
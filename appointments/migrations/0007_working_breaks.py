@@ -0,0 +1,28 @@
+# Generated by Django 2.2.28 on 2026-10-18 06:32
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('appointments', '0006_schedule_range_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='WorkingBreak',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.CharField(choices=[('sun', 'Sunday'), ('mon', 'Monday'), ('tue', 'Tuesday'), ('wed', 'Wednesday'), ('thu', 'Thursday'), ('fri', 'Friday'), ('sat', 'Saturday')], max_length=3)),
+                ('start', models.TimeField()),
+                ('end', models.TimeField()),
+                ('manager', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='breaks', to='appointments.UserAppointmentManager')),
+            ],
+            options={
+                'db_table': 'working_breaks',
+                'ordering': ['start'],
+            },
+        ),
+    ]
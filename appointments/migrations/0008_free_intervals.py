@@ -0,0 +1,31 @@
+# Generated by Django 2.2.28 on 2026-10-18 06:34
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('appointments', '0007_working_breaks'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='FreeInterval',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('start', models.DateTimeField()),
+                ('end', models.DateTimeField()),
+                ('manager', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='free_intervals', to='appointments.UserAppointmentManager')),
+            ],
+            options={
+                'db_table': 'free_intervals',
+                'ordering': ['start'],
+            },
+        ),
+        migrations.AddIndex(
+            model_name='freeinterval',
+            index=models.Index(fields=['manager', 'start', 'end'], name='free_intervals_range_idx'),
+        ),
+    ]
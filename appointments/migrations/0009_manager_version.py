@@ -0,0 +1,18 @@
+# Generated by Django 2.2.28 on 2026-10-18 06:35
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('appointments', '0008_free_intervals'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='userappointmentmanager',
+            name='version',
+            field=models.PositiveIntegerField(default=0),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 2.2.28 on 2026-10-18 07:10
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('appointments', '0009_manager_version'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='userappointmentmanager',
+            name='schedule_updated',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
@@ -0,0 +1,51 @@
+# Generated by Django 3.2.25 on 2026-10-18 07:01
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('appointments', '0010_manager_schedule_updated'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='appointment',
+            name='exdates',
+            field=models.TextField(blank=True, default=''),
+        ),
+        migrations.AddField(
+            model_name='appointment',
+            name='recurrence_end',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='appointment',
+            name='rrule',
+            field=models.CharField(blank=True, default='', max_length=255),
+        ),
+        migrations.AddField(
+            model_name='timeoff',
+            name='exdates',
+            field=models.TextField(blank=True, default=''),
+        ),
+        migrations.AddField(
+            model_name='timeoff',
+            name='recurrence_end',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='timeoff',
+            name='rrule',
+            field=models.CharField(blank=True, default='', max_length=255),
+        ),
+        migrations.AddIndex(
+            model_name='appointment',
+            index=models.Index(condition=models.Q(('rrule', ''), _negated=True), fields=['manager', 'start'], name='appointments_recurring_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='timeoff',
+            index=models.Index(condition=models.Q(('rrule', ''), _negated=True), fields=['manager', 'start'], name='exceptions_recurring_idx'),
+        ),
+    ]
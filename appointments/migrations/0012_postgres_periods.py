@@ -0,0 +1,51 @@
+"""
+PostgreSQL only, nothing happens on SQLite.
+
+Appointments and time off get a generated `period` tstzrange column kept in step with start and end, and
+a GiST index on (manager, period) of the one-off rows for `&&` overlap queries. For appointments the
+index is an exclusion constraint, so the database refuses two one-off appointments of the same manager
+that overlap whatever path they come in by. Time off may still overlap time off (and appointments, which
+a constraint on one table can't see), and repeating rows are checked by the app like before.
+
+Needs PostgreSQL 12+ and the btree_gist extension (for `manager_id WITH =`), which the migration creates
+if the role is allowed to. Overlapping appointments already in the table make it fail, move them first.
+"""
+from django.db import migrations
+
+PERIOD = "ALTER TABLE %s ADD COLUMN period tstzrange GENERATED ALWAYS AS (tstzrange(\"start\", \"end\", '[)')) STORED"
+
+FORWARDS = [
+    "CREATE EXTENSION IF NOT EXISTS btree_gist",
+    PERIOD % "appointments",
+    "ALTER TABLE appointments ADD CONSTRAINT appointments_no_overlap "
+    "EXCLUDE USING gist (manager_id WITH =, period WITH &&) WHERE (rrule = '')",
+    PERIOD % "exceptions",
+    "CREATE INDEX exceptions_period_idx ON exceptions USING gist (manager_id, period) WHERE (rrule = '')",
+]
+
+BACKWARDS = [
+    "ALTER TABLE appointments DROP CONSTRAINT appointments_no_overlap",
+    "ALTER TABLE appointments DROP COLUMN period",
+    "DROP INDEX exceptions_period_idx",
+    "ALTER TABLE exceptions DROP COLUMN period",
+]
+
+
+def run(statements):
+    def operation(apps, schema_editor):
+        if schema_editor.connection.vendor != "postgresql":
+            return
+        for statement in statements:
+            schema_editor.execute(statement)
+    return operation
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('appointments', '0011_recurrence'),
+    ]
+
+    operations = [
+        migrations.RunPython(run(FORWARDS), run(BACKWARDS)),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 3.2.25 on 2026-10-18 07:45
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('appointments', '0012_postgres_periods'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='userappointmentmanager',
+            name='free_time_built',
+            field=models.BooleanField(default=False),
+        ),
+    ]
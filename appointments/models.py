@@ -1,8 +1,18 @@
-from django.db import models
+
+import itertools
+
+from django.conf import settings
+from django.db import connections, models
+from django.db.models.expressions import RawSQL
 from django.contrib.auth.base_user import BaseUserManager, AbstractBaseUser
-from django.db.models import Q
 from django.utils import timezone
+from django.utils.functional import cached_property
+from appointments import serializers
+from lib.hours import WeeklyHours
+from lib.intervals import IntervalIndex
 from lib.time import *
+from lib import recurrence
+from lib.zones import schedule_zone, week_clock, from_epoch_minutes, to_epoch_minutes
 
 
 class MyUserManager(BaseUserManager):
@@ -153,83 +163,151 @@ class UserAppointmentManager(models.Model):
     sat_start = models.TimeField(default=timezone.now)
     sat_end = models.TimeField(default=timezone.now)
 
+    # Bumped on every change to the appointments, time off, types or hours, see bump_version. It is the
+    # optimistic lock of appointments/booking.py, the ETag of the schedule views and part of the keys of the
+    # cached weeks (appointments/cache.py).
+    version = models.PositiveIntegerField(default=0)
+
+    # When the schedule last changed
+    schedule_updated = models.DateTimeField(null=True, blank=True)
+
+    # Set once free_time.rebuild has written the manager's free intervals, the incremental updates are only
+    # right on top of a complete set
+    free_time_built = models.BooleanField(default=False)
+
     class Meta:
         db_table = "user_appointment_managers"
 
     def __str__(self):
         return self.user.get_full_name()
 
+    def save(self, *args, **kwargs):
+        # The hours may have changed
+        self.__dict__.pop("weekly_hours", None)
+        if not self._state.adding and not args and not kwargs.get("force_insert") and \
+                kwargs.get("update_fields") is None:
+            # The version only moves through bump_version, never write back the one this copy was loaded with
+            kwargs["update_fields"] = [field.name for field in self._meta.concrete_fields
+                                       if not field.primary_key and
+                                       field.name not in ("version", "schedule_updated", "free_time_built")]
+        super(UserAppointmentManager, self).save(*args, **kwargs)
+
+    @classmethod
+    def bump_version(cls, *manager_ids):
+        """
+        Marks the schedules as changed, which ends the ETags of their feeds.
+        """
+        cls.objects.filter(id__in=manager_ids).update(version=models.F("version") + 1, schedule_updated=timezone.now())
+
+    @cached_property
+    def weekly_hours(self):
+        return WeeklyHours.from_manager(self, self.breaks.all() if self.pk else ())
+
     @property
     def todays_appointments(self):
-        # Needs appointments and timeoff
-        appointment_objs = self.appointments.filter(
-            # Filter by if the start or end day is today.
-            Q(start__date=timezone.now().date()) | Q(end__date=timezone.now().date())).all()
-        appointment_objs = appointment_objs | self.appointments.filter(
-            start__lt=timezone.now().date(), end__gt=timezone.now().date()).all()
-        appts = []
-        for appt in appointment_objs:
-            appts.append(appt.fc_serialize)
-        return appts
+        today = get_day_range(timezone.localtime(timezone.now()).date())
+        return serializers.appointment_events(self.appointments.window_values(*today, *serializers.APPOINTMENT_FIELDS))
 
     @property
     def todays_timeoff(self):
-        # Needs appointments and timeoff
-        timeoff_objs = self.exceptions.filter(
-            # Filter by if the start or end day is today.
-            Q(start__date=timezone.now().date()) | Q(end__date=timezone.now().date()),
-        ).all()
-        # Append the ones that fall within the range
-        timeoff_objs = timeoff_objs | self.exceptions.filter(
-            start__lt=timezone.now().date(), end__gt=timezone.now().date()).all()
-        times = []
-        for time_off in timeoff_objs:
-            times.append(time_off.fc_serialize)
-        return times
+        today = get_day_range(timezone.localtime(timezone.now()).date())
+        return serializers.time_off_events(self.exceptions.window_values(*today, *serializers.TIME_OFF_FIELDS))
 
     @property
     def get_min_time(self):
-        min_time = self.sun_start
-        for day in self.DAYS:
-            time = getattr(self, day[0] + "_start")
-            if min_time > time:
-                min_time = time
-        hour = int(min_time.strftime("%H")) # - 1
+        hour = self.weekly_hours.earliest // 60 # - 1
         return "%s:00:00" % hour
 
     @property
     def get_max_time(self):
-        max_time = self.sun_start
-        for day in self.DAYS:
-            time = getattr(self, day[0] + "_end")
-            if max_time < time:
-                max_time = time
-        hour = int(max_time.strftime("%H")) # + 1
+        hour = self.weekly_hours.latest // 60 # + 1
         return "%s:00:00" % hour
 
     def get_appts_for_range(self, date_range):
-        return self.appointments.filter(Q(start__range=date_range) | Q(end__range=date_range)).all()
+        return self.appointments.overlapping(*date_range)
 
     def get_time_off_for_range(self, date_range):
-        return self.exceptions.filter(Q(start__range=date_range) | Q(end__range=date_range)).all()
+        return self.exceptions.overlapping(*date_range)
 
     def get_available_in_week(self, date, appt_type):
+        return self.get_slots_in_week(date, appt_type, self.get_busy_in_week(date))
+
+    def iter_available(self, start, appt_type, limit=None, horizon=None):
+        """
+        The open slots from `start` on, a week at a time. A week is only read from the database once the
+        slots before it have been taken, so asking for the next few stops early.
+        :param start: Aware datetime, slots that start before it are left out
+        :param limit: Most slots to give, all of them up to the horizon without
+        :param horizon: timedelta after start to look up to (default NEXT_AVAILABLE_HORIZON_WEEKS)
+        :return: Generator of FullCalendar "Available" events, in order
+        """
+        from lib.slots import iter_week
+
+        if horizon is None:
+            horizon = datetime.timedelta(weeks=settings.NEXT_AVAILABLE_HORIZON_WEEKS)
+        zone = schedule_zone()
+        after, before = to_epoch_minutes(start, round_up=True), to_epoch_minutes(start + horizon, round_up=True)
+
+        def weeks():
+            sunday = get_sun_sat(start.astimezone(zone).date())["start"]
+            while week_clock(zone, sunday).start < before:
+                yield from iter_week(self.get_busy_in_week(sunday), sunday, self.weekly_hours, appt_type.minutes,
+                                     zone, after=after, before=before)
+                sunday += datetime.timedelta(weeks=1)
+
+        return itertools.islice(weeks(), limit)
+
+    def get_busy_in_week(self, date):
+        """
+        The database half of get_available_in_week.
+        :return: Flattened busy times (see flatten_time_array) from Sunday 00:00 to Saturday 24:00
+                 (in SCHEDULE_TIME_ZONE)
+        """
         # Get the range for the week
         date_range = get_sun_sat(date)
 
-        query_range = [date_range["start"], date_range["end"]]
+        # Everything that overlaps Sunday 00:00 through Saturday 24:00
+        clock = week_clock(schedule_zone(), date_range["start"])
+        week_range = [from_epoch_minutes(clock.start), from_epoch_minutes(clock.end)]
 
-        # Get all of the appointments for the week
-        appts_this_week = self.get_appts_for_range(query_range)
-        busy_time = abstract_datetime_ranges(appts_this_week)
+        # Loaded here so that get_slots_in_week doesn't need the database
+        self.weekly_hours
 
-        # Get all of the time off for the week
-        times_off_this_week = self.get_time_off_for_range(query_range)
-        busy_time = busy_time + abstract_datetime_ranges(times_off_this_week)
-        busy_time.sort(key=lambda x:x['start'])
+        if getattr(settings, "AVAILABILITY_MATERIALIZED", False):
+            # One range query on the stored free time instead of both tables
+            from appointments.free_time import busy_times_for_range
+            return busy_times_for_range(self, *week_range)
 
-        # Filter through available times and accept if the total minutes is greater than the appointment type
-        available_times = flatten_time_array(busy_time)
+        return self.busy_index(*week_range).flattened()
+
+    def busy_index(self, start, end):
+        """
+        :return: IntervalIndex of the appointments and time off overlapping [start, end), with the
+                 occurrences of the repeating ones
+        """
+        return IntervalIndex(itertools.chain(self.appointments.busy_times(start, end),
+                                             self.exceptions.busy_times(start, end)))
+
+    def get_slots_in_week(self, date, appt_type, available_times):
+        """
+        The CPU half of get_available_in_week, cuts the free time between the busy times into slots.
+        :param available_times: From get_busy_in_week
+        """
+        date_range = get_sun_sat(date)
+        query_range = [date_range["start"], date_range["end"]]
+        engine = getattr(settings, "AVAILABILITY_ENGINE", "python")
+        zone = schedule_zone()
+
+        # The loop and the bitmap only know UTC, any other zone goes through the epoch engine
+        if zone is not pytz.utc or (engine == "epoch" and is_minute_aligned(available_times)):
+            from lib.slots import epoch_available_times
+            return epoch_available_times(available_times, date_range["start"], self.weekly_hours, appt_type.minutes,
+                                         zone)
+
+        # The bitmap engine works in whole minutes, anything finer goes through the loop below
+        if engine == "bitmap" and is_minute_aligned(available_times):
+            from lib.bitmap import bitmap_available_times
+            return bitmap_available_times(available_times, date_range["start"], self.weekly_hours, appt_type.minutes)
 
         # These are blocks of free times
         free_times = break_into_free_time(available_times, query_range[0], query_range[1])
@@ -238,6 +316,7 @@ class UserAppointmentManager(models.Model):
         free_times = [free_time for free_time in free_times if (free_time["end"] - free_time["start"]).total_seconds() / 60 > appt_type.minutes]
 
         appt_times = []
+        hours = self.weekly_hours
 
         # Iterate over free blocks of time
         for block in free_times:
@@ -248,15 +327,9 @@ class UserAppointmentManager(models.Model):
             # Break up into the blocks of time
             while cur_end <= block["end"]:
 
-                start_day_of_week = cur_time.strftime("%a").lower()[:3]  # sun/mon/tue....
-                end_day_of_week = cur_end.strftime("%a").lower()[:3]  # sun/mon/tue....
-
                 # If within the open and close hours of the org
-                if getattr(self, "%s_start" % start_day_of_week) < cur_time.time() and \
-                                getattr(self, "%s_end" % end_day_of_week) > cur_end.time():
-                    data = {"title": "Available", "start": cur_time.strftime("%Y/%m/%d %H:%M"),
-                            "end": cur_end.strftime("%Y/%m/%d %H:%M")}
-                    appt_times.append(data)
+                if hours.allows(cur_time, cur_end):
+                    appt_times.append(serializers.available_event(cur_time, cur_end))
 
                 # Update
                 cur_time = cur_end
@@ -265,7 +338,155 @@ class UserAppointmentManager(models.Model):
         return appt_times
 
 
-class TimeOff(models.Model):
+class ScheduleQuerySet(models.QuerySet):
+
+    def overlapping(self, start, end):
+        """
+        Rows whose [start, end) overlaps [start, end). Goes through the (manager, start, end) index.
+        """
+        return self.filter(start__lt=end, end__gt=start)
+
+
+class RecurringQuerySet(ScheduleQuerySet):
+    """
+    Appointments and time off, where a row can repeat (see Recurring). overlapping() only gives the
+    one-off rows, window_values() gives those and the occurrences of the repeating ones together. On
+    PostgreSQL the one-off rows are found with the `period` range column instead of start and end.
+    """
+
+    def uses_periods(self):
+        """
+        If the table has the PostgreSQL `period` column (see migration 0012)
+        """
+        return connections[self.db].vendor == "postgresql"
+
+    def period_overlaps(self, start, end):
+        """
+        `period && [start, end)`, which goes through the GiST index on (manager, period) of the one-off rows
+        """
+        column = "%s.period" % connections[self.db].ops.quote_name(self.model._meta.db_table)
+        return RawSQL(column + " && tstzrange(%s, %s, '[)')", (start, end), output_field=models.BooleanField())
+
+    def one_off(self, start, end):
+        """
+        :return: Q of the one-off rows overlapping [start, end)
+        """
+        if self.uses_periods():
+            return models.Q(self.period_overlaps(start, end), rrule="")
+        return models.Q(rrule="", start__lt=end, end__gt=start)
+
+    def overlapping(self, start, end):
+        return self.filter(self.one_off(start, end))
+
+    def recurring(self, start, end):
+        """
+        Repeating rows that have started by `end` and not finished by `start`
+        """
+        return self.exclude(rrule="").filter(start__lt=end) \
+            .filter(models.Q(recurrence_end__isnull=True) | models.Q(recurrence_end__gt=start))
+
+    def window_values(self, start, end, *fields):
+        """
+        Generator of values_list(*fields) tuples of the one-off rows overlapping [start, end), and one
+        per occurrence of the repeating rows with the occurrence's times in place of the "start" and "end"
+        fields. One query, the occurrences are only worked out for the window.
+        """
+        one_off = self.one_off(start, end)
+        repeating = ~models.Q(rrule="") & models.Q(start__lt=end) & \
+            (models.Q(recurrence_end__isnull=True) | models.Q(recurrence_end__gt=start))
+        return self._expand(self.filter(one_off | repeating), start, end, fields)
+
+    def occurrence_values(self, start, end, *fields):
+        """
+        Like window_values() for just the occurrences of the repeating rows
+        """
+        return self._expand(self.recurring(start, end), start, end, fields)
+
+    def busy_times(self, start, end):
+        """
+        :return: (start, end) of every one-off row and occurrence that overlaps [start, end)
+        """
+        return self.window_values(start, end, "start", "end")
+
+    @staticmethod
+    def _expand(rows, start, end, fields):
+        first, last = fields.index("start"), fields.index("end")
+        zone = schedule_zone()
+        for values in rows.values_list(*fields + ("rrule", "exdates")):
+            if not values[-2]:
+                yield values[:-2]
+                continue
+            row = list(values[:-2])
+            exdates = recurrence.parse_exdates(values[-1])
+            for occurrence in recurrence.occurrences(values[first], values[last], values[-2], exdates, start, end, zone):
+                row[first], row[last] = occurrence
+                yield tuple(row)
+
+
+class Recurring(models.Model):
+    """
+    A row that can repeat, `start` and `end` are its first occurrence. See lib/recurrence.py.
+    """
+
+    # RRULE value like "FREQ=WEEKLY;BYDAY=FR", blank for a one-off
+    rrule = models.CharField(max_length=255, blank=True, default="")
+
+    # Occurrences taken out of the series, their starts as comma separated UTC times
+    exdates = models.TextField(blank=True, default="")
+
+    # When the last occurrence ends, null while the series goes on forever. Kept by save().
+    recurrence_end = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        abstract = True
+
+    def save(self, *args, **kwargs):
+        self.recurrence_end = recurrence.series_end(self.start, self.end, self.rrule, schedule_zone()) \
+            if self.rrule else None
+        super(Recurring, self).save(*args, **kwargs)
+
+    def occurrences(self, start, end):
+        """
+        Generator of the (start, end) of every occurrence that overlaps [start, end)
+        """
+        if not self.rrule:
+            if self.start < end and self.end > start:
+                yield self.start, self.end
+            return
+        yield from recurrence.occurrences(self.start, self.end, self.rrule, recurrence.parse_exdates(self.exdates),
+                                          start, end, schedule_zone())
+
+    def skip_occurrence(self, start):
+        """
+        Takes the occurrence starting at `start` out of the series. Moving one is skipping it and adding
+        a one-off row.
+        """
+        self.exdates = recurrence.add_exdate(self.exdates, start)
+        self.save()
+
+
+class WorkingBreak(models.Model):
+    """
+    Time taken out of a day's normal hours, like lunch.
+    """
+
+    manager = models.ForeignKey(UserAppointmentManager, on_delete=models.CASCADE, related_name="breaks")
+
+    day = models.CharField(max_length=3, choices=UserAppointmentManager.DAYS)
+
+    start = models.TimeField()
+
+    end = models.TimeField()
+
+    class Meta:
+        db_table = "working_breaks"
+        ordering = ["start"]
+
+    def __str__(self):
+        return "%s %s - %s" % (self.get_day_display(), self.start.strftime("%I:%M %p"), self.end.strftime("%I:%M %p"))
+
+
+class TimeOff(Recurring):
 
     manager = models.ForeignKey(UserAppointmentManager, on_delete=models.CASCADE, related_name="exceptions")
 
@@ -275,14 +496,19 @@ class TimeOff(models.Model):
 
     end = models.DateTimeField(default=timezone.now)
 
+    objects = RecurringQuerySet.as_manager()
+
     class Meta:
         db_table = "exceptions"
         ordering = ["start"]
+        indexes = [
+            models.Index(fields=["manager", "start", "end"], name="exceptions_range_idx"),
+            models.Index(fields=["manager", "start"], name="exceptions_recurring_idx", condition=~models.Q(rrule="")),
+        ]
 
     @property
     def fc_serialize(self):
-        return {"title": "Time Off: %s" % self.reason, "start": self.start.strftime("%Y/%m/%d %H:%M"),
-                "end": self.end.strftime("%Y/%m/%d %H:%M")}
+        return serializers.time_off_events([(self.id, self.start, self.end, self.reason)])[0]
 
 
 class AppointmentType(models.Model):
@@ -300,7 +526,7 @@ class AppointmentType(models.Model):
         return self.name
 
 
-class Appointment(models.Model):
+class Appointment(Recurring):
 
     manager = models.ForeignKey(UserAppointmentManager, on_delete=models.CASCADE, related_name="appointments")
 
@@ -314,14 +540,54 @@ class Appointment(models.Model):
 
     end = models.DateTimeField(default=timezone.now)
 
+    objects = RecurringQuerySet.as_manager()
+
     class Meta:
         db_table = "appointments"
         ordering = ["start"]
+        indexes = [
+            models.Index(fields=["manager", "start", "end"], name="appointments_range_idx"),
+            models.Index(fields=["manager", "start"], name="appointments_recurring_idx", condition=~models.Q(rrule="")),
+        ]
 
     def __str__(self):
         return self.type.name + " Appointment"
 
     @property
     def fc_serialize(self):
-        return {"title": "%s: %s" % (self.type.name, self.name), "start": self.start.strftime("%Y/%m/%d %H:%M"),
-                "end": self.end.strftime("%Y/%m/%d %H:%M")}
+        return serializers.appointment_events([(self.id, self.start, self.end, self.name, self.type.name)])[0]
+
+
+class FreeInterval(models.Model):
+    """
+    A gap between a manager's appointments and time off, see appointments/free_time.py.
+    """
+
+    manager = models.ForeignKey(UserAppointmentManager, on_delete=models.CASCADE, related_name="free_intervals")
+
+    start = models.DateTimeField()
+
+    end = models.DateTimeField()
+
+    objects = ScheduleQuerySet.as_manager()
+
+    class Meta:
+        db_table = "free_intervals"
+        ordering = ["start"]
+        indexes = [
+            models.Index(fields=["manager", "start", "end"], name="free_intervals_range_idx"),
+        ]
+
+
+class FragmentVersion(models.Model):
+    """
+    The generation of a group of cached template fragments, see appointments/fragments.py. Kept in the
+    database so that every worker sees a change as soon as it commits.
+    """
+
+    name = models.CharField(max_length=100, unique=True)
+
+    version = models.BigIntegerField(default=0)
+
+    class Meta:
+        db_table = "fragment_versions"
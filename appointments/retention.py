@@ -0,0 +1,76 @@
+import datetime
+import logging
+import threading
+import time
+
+from django.conf import settings
+from django.db import connections, router, transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from appointments import events, free_time
+from appointments.models import Appointment, UserAppointmentManager
+
+logger = logging.getLogger(__name__)
+
+
+def purge_expired_appointments(weeks=None, batch_size=None):
+    """
+    Deletes the appointments that ended more than `weeks` ago, `batch_size` rows per DELETE.
+    :return: (rows deleted, seconds taken)
+    """
+    weeks = settings.APPOINTMENT_RETENTION_WEEKS if weeks is None else weeks
+    batch_size = batch_size or settings.APPOINTMENT_PURGE_BATCH_SIZE
+
+    began = time.time()
+    cutoff = timezone.now() - datetime.timedelta(weeks=weeks)
+    # A repeating appointment is only expired once its last occurrence is
+    expired = Appointment.objects.filter(Q(rrule="", end__lt=cutoff) | Q(recurrence_end__lt=cutoff)).order_by()
+
+    alias = router.db_for_write(Appointment)
+    connection = connections[alias]
+    table = connection.ops.quote_name(Appointment._meta.db_table)
+
+    deleted = 0
+    # manager id -> (earliest start, latest end) of what was deleted
+    managers = {}
+    while True:
+        rows = list(expired.using(alias).values_list("id", "manager_id", "start", "end")[:batch_size])
+        if not rows:
+            break
+
+        ids = [row[0] for row in rows]
+        with transaction.atomic(using=alias), connection.cursor() as cursor:
+            cursor.execute("DELETE FROM %s WHERE id IN (%s)" % (table, ", ".join(["%s"] * len(ids))), ids)
+
+        deleted += len(ids)
+        for _, manager_id, start, end in rows:
+            earliest, latest = managers.get(manager_id, (start, end))
+            managers[manager_id] = (min(earliest, start), max(latest, end))
+
+    # Nothing went through the delete signals, so update the versions, free time and open pages by hand
+    UserAppointmentManager.bump_version(*managers)
+    for manager_id, (start, end) in managers.items():
+        if free_time.enabled():
+            free_time.mark_free(manager_id, start, end)
+        events.publish(manager_id, "schedule", "changed")
+
+    return deleted, time.time() - began
+
+
+def start_periodic_purge(interval):
+    """
+    Runs purge_expired_appointments every `interval` seconds on a daemon thread.
+    """
+    def run():
+        while True:
+            time.sleep(interval)
+            try:
+                deleted, seconds = purge_expired_appointments()
+                logger.info("Purged %s appointments in %.2fs", deleted, seconds)
+            except Exception:
+                logger.exception("Could not purge the expired appointments.")
+
+    thread = threading.Thread(target=run, name="appointment-purge", daemon=True)
+    thread.start()
+    return thread
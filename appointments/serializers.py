@@ -0,0 +1,110 @@
+"""
+FullCalendar events straight from values_list() rows, and the JSON responses that carry them.
+
+The views ask the database for just the columns an event needs (APPOINTMENT_FIELDS, TIME_OFF_FIELDS) and
+turn the tuples into events here, so no model instances are built and times are formatted with
+format_fc_datetime instead of strftime.
+
+Responses are encoded with orjson when it is installed (JSON_ENCODER = "auto" or "orjson"), otherwise
+with the standard library.
+"""
+import json
+
+from django import http
+from django.conf import settings
+import pytz
+from django.core.serializers.json import DjangoJSONEncoder
+
+from lib.ical import format_utc
+from lib.time import format_fc_datetime
+from lib.zones import schedule_zone
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+APPOINTMENT_FIELDS = ("id", "start", "end", "name", "type__name")
+
+TIME_OFF_FIELDS = ("id", "start", "end", "reason")
+
+
+def wall_clock_formatter():
+    """
+    :return: format_fc_datetime for times in the schedule's zone (SCHEDULE_TIME_ZONE)
+    """
+    zone = schedule_zone()
+    if zone is pytz.utc:
+        # What the database gives back already
+        return format_fc_datetime
+    return lambda value: format_fc_datetime(value.astimezone(zone))
+
+
+def appointment_events(rows, repeats=False):
+    """
+    :param rows: (id, start, end, name, type name) tuples, see APPOINTMENT_FIELDS
+    :param repeats: If the rows end with the rrule, occurrences of repeating appointments are marked
+    """
+    fmt = wall_clock_formatter()
+    rows = list(rows) if repeats else rows
+    events = [{"id": "appointment-%s" % appt_id, "title": "%s: %s" % (type_name, name), "start": fmt(start),
+               "end": fmt(end)} for appt_id, start, end, name, type_name, *_ in rows]
+    return mark_occurrences(events, rows) if repeats else events
+
+
+def time_off_events(rows, repeats=False):
+    """
+    :param rows: (id, start, end, reason) tuples, see TIME_OFF_FIELDS
+    :param repeats: If the rows end with the rrule, occurrences of repeating time off are marked
+    """
+    fmt = wall_clock_formatter()
+    rows = list(rows) if repeats else rows
+    events = [{"id": "timeoff-%s" % time_id, "title": "Time Off: %s" % reason, "start": fmt(start), "end": fmt(end)}
+              for time_id, start, end, reason, *_ in rows]
+    return mark_occurrences(events, rows) if repeats else events
+
+
+def mark_occurrences(events, rows):
+    """
+    Gives the events of occurrences the UTC start they are skipped with (see Recurring.skip_occurrence)
+    """
+    for event, row in zip(events, rows):
+        if row[-1]:
+            event["occurrence"] = format_utc(row[1])
+    return events
+
+
+def available_event(start, end):
+    return {"title": "Available", "start": format_fc_datetime(start), "end": format_fc_datetime(end)}
+
+
+def get_encoder():
+    encoder = getattr(settings, "JSON_ENCODER", "auto")
+    if encoder == "orjson" and orjson is None:
+        raise ImportError("JSON_ENCODER is 'orjson' but orjson isn't installed.")
+    return "orjson" if encoder in ("auto", "orjson") and orjson is not None else "json"
+
+
+def dumps(data):
+    """
+    :return: data as JSON bytes
+    """
+    if get_encoder() == "orjson":
+        # orjson has no fallback encoder, anything it can't handle goes through the standard library
+        try:
+            return orjson.dumps(data)
+        except TypeError:
+            pass
+    return json.dumps(data, cls=DjangoJSONEncoder).encode("utf-8")
+
+
+class JsonResponse(http.JsonResponse):
+    """
+    django.http.JsonResponse encoded with dumps().
+    """
+
+    def __init__(self, data, safe=True, **kwargs):
+        if safe and not isinstance(data, dict):
+            raise TypeError("In order to allow non-dict objects to be serialized set the safe parameter to False.")
+        kwargs.setdefault("content_type", "application/json")
+        http.HttpResponse.__init__(self, content=dumps(data), **kwargs)
@@ -0,0 +1,86 @@
+from django.db.models.signals import pre_save, post_save, post_delete
+from django.dispatch import receiver
+
+from appointments import events, fragments, free_time, serializers
+from appointments.models import User, Appointment, TimeOff, AppointmentType, UserAppointmentManager, WorkingBreak
+
+
+def calendar_event(instance):
+    if isinstance(instance, Appointment):
+        return serializers.appointment_events([(instance.id, instance.start, instance.end, instance.name,
+                                                instance.type.name)])[0]
+    return serializers.time_off_events([(instance.id, instance.start, instance.end, instance.reason)])[0]
+
+
+@receiver(pre_save, sender=Appointment)
+@receiver(pre_save, sender=TimeOff)
+def schedule_saving(sender, instance, **kwargs):
+    # The span an edited row had, to free it again once the new one is saved
+    instance._previous = None
+    if instance.pk:
+        instance._previous = sender.objects.filter(pk=instance.pk).values_list("start", "end", "rrule").first()
+
+
+@receiver(post_save, sender=Appointment)
+@receiver(post_save, sender=TimeOff)
+def schedule_saved(sender, instance, created, **kwargs):
+    UserAppointmentManager.bump_version(instance.manager_id)
+    kind = "appointment" if sender is Appointment else "timeoff"
+    previous = getattr(instance, "_previous", None)
+
+    # Repeating rows aren't in the free time, one-off ones free their old span and take the new one
+    if free_time.enabled():
+        if previous and not previous[2]:
+            free_time.mark_free(instance.manager_id, previous[0], previous[1])
+        if not instance.rrule:
+            free_time.mark_busy(instance.manager_id, instance.start, instance.end)
+
+    if instance.rrule or (previous and previous[2]):
+        # Every occurrence changed, the pages load them again
+        events.publish(instance.manager_id, "schedule", "changed")
+        return
+
+    events.publish(instance.manager_id, kind, "created" if created else "changed", **calendar_event(instance))
+
+
+@receiver(post_delete, sender=Appointment)
+@receiver(post_delete, sender=TimeOff)
+def schedule_deleted(sender, instance, **kwargs):
+    UserAppointmentManager.bump_version(instance.manager_id)
+    fmt = serializers.wall_clock_formatter()
+    # Every occurrence of a repeating row has its id, so this takes them all off the pages
+    events.publish(instance.manager_id, "appointment" if sender is Appointment else "timeoff", "deleted",
+                   id="%s-%s" % ("appointment" if sender is Appointment else "timeoff", instance.id),
+                   start=fmt(instance.start), end=fmt(instance.end))
+    if not instance.rrule and free_time.enabled():
+        free_time.mark_free(instance.manager_id, instance.start, instance.end)
+
+
+@receiver(post_save, sender=AppointmentType)
+@receiver(post_delete, sender=AppointmentType)
+def appt_type_changed(sender, instance, **kwargs):
+    UserAppointmentManager.bump_version(instance.manager_id)
+    events.publish(instance.manager_id, "types", "changed")
+    fragments.invalidate(fragments.types_group(instance.manager_id))
+
+
+@receiver(post_save, sender=UserAppointmentManager)
+def hours_changed(sender, instance, **kwargs):
+    UserAppointmentManager.bump_version(instance.id)
+    events.publish(instance.id, "hours", "changed")
+
+
+@receiver(post_save, sender=WorkingBreak)
+@receiver(post_delete, sender=WorkingBreak)
+def break_changed(sender, instance, **kwargs):
+    UserAppointmentManager.bump_version(instance.manager_id)
+    events.publish(instance.manager_id, "hours", "changed")
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def user_changed(sender, instance, **kwargs):
+    # Logging in saves last_login only, which no fragment shows
+    if set(kwargs.get("update_fields") or ()) == {"last_login"}:
+        return
+    fragments.invalidate(fragments.COACHES)
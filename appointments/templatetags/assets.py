@@ -0,0 +1,18 @@
+from django import template
+
+from appointments.assets import BundleNode
+
+register = template.Library()
+
+
+@register.tag
+def bundle(parser, token):
+    """
+    {% bundle "name.js" %} <script> and <link> tags of static files {% endbundle %}, see appointments/assets.py
+    """
+    bits = token.split_contents()
+    if len(bits) != 2 or bits[1][0] not in "'\"" or bits[1][0] != bits[1][-1]:
+        raise template.TemplateSyntaxError("%s takes the quoted name of the bundle." % bits[0])
+    nodelist = parser.parse(("endbundle",))
+    parser.delete_first_token()
+    return BundleNode(bits[1][1:-1], nodelist)
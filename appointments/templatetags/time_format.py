@@ -1,5 +1,7 @@
 from django import template
+from django.db.models import Q
 from django.utils import timezone
+from lib.recurrence import REPEAT_CHOICES
 from lib.time import same_date
 
 register = template.Library()
@@ -17,9 +19,7 @@ def end(day):
 
 @register.filter
 def get_time(day, appt_manager):
-    time = getattr(appt_manager, day)
-    formatted = time.strftime("%I:%M %p")
-    return formatted
+    return appt_manager.weekly_hours.label(day)
 
 
 @register.filter
@@ -36,4 +36,20 @@ def format_range(exception):
 
 @register.filter
 def get_dates_after_today(date_query):
-    return date_query.filter(end__gte=timezone.now()).all()
+    # Repeating rows stay until their last occurrence is over
+    now = timezone.now()
+    return date_query.filter(Q(rrule="", end__gte=now) | ~Q(rrule="") & (Q(recurrence_end__isnull=True) |
+                                                                       Q(recurrence_end__gte=now))).all()
+
+
+@register.filter
+def repeat_label(rule):
+    """
+    :return: How the time off form names the rule, or the rule itself
+    """
+    return dict(REPEAT_CHOICES).get(rule, rule)
+
+
+@register.simple_tag
+def repeat_choices():
+    return REPEAT_CHOICES
@@ -1,3 +1,1462 @@
-from django.test import TestCase
+import asyncio
+import datetime
+import gc
+import gzip
+import json
+import os
+import random
+import re
+import tempfile
+import threading
+import warnings
+from io import StringIO
+from unittest import skipUnless
 
-# Create your tests here.
+import pytz
+from asgiref.sync import async_to_sync, sync_to_async
+from asgiref.testing import ApplicationCommunicator
+from django.core.cache import caches
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command, CommandError
+from django.db import connection, transaction, IntegrityError
+from django.template import Context, Template
+from django.test import AsyncClient, SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from appointments import aio, assets, cache, events, fragments, timing, free_time
+from appointments.booking import book_appointment, BookingError
+from appointments.database import ReadRouter, read_only
+from appointments.middleware import QueryBudgetExceeded, UNRESOLVED
+from appointments.models import User, UserAppointmentManager, AppointmentType, Appointment, TimeOff, WorkingBreak, \
+    FragmentVersion
+from lib import assets as assets_lib
+from lib.hours import WeeklyHours
+from lib.intervals import IntervalIndex
+from lib.time import parse_slot, flatten_time_array
+
+
+def create_coach(email="coach@buffalo.edu", **hours):
+    user = User.objects.create_user(email, "Venture", "Coach", password="password")
+    user.type = "h__co"
+    user.save()
+    defaults = {}
+    for day, _ in UserAppointmentManager.DAYS:
+        defaults[day + "_start"] = datetime.time(9, 0)
+        defaults[day + "_end"] = datetime.time(17, 0)
+    defaults.update(hours)
+    UserAppointmentManager.objects.create(user=user, **defaults)
+    return user
+
+
+def utc(*args):
+    return pytz.utc.localize(datetime.datetime(*args))
+
+
+class AvailabilityEngineTests(TestCase):
+    """
+    The bitmap and epoch engines have to give back exactly what the original loop does.
+    """
+
+    # A Sunday
+    WEEK = datetime.date(2017, 2, 5)
+
+    def setUp(self):
+        self.user = create_coach()
+        self.manager = self.user.appt_manager
+        self.types = [AppointmentType.objects.create(manager=self.manager, name="%s min" % minutes, minutes=minutes)
+                      for minutes in (10, 15, 30, 45, 60, 90)]
+
+    def assertEnginesMatch(self, date=None):
+        date = date or self.WEEK + datetime.timedelta(days=3)
+        for appt_type in self.types:
+            with override_settings(AVAILABILITY_ENGINE="python"):
+                expected = self.manager.get_available_in_week(date, appt_type)
+            for engine in ("bitmap", "epoch"):
+                with override_settings(AVAILABILITY_ENGINE=engine):
+                    actual = self.manager.get_available_in_week(date, appt_type)
+                self.assertEqual(expected, actual, "%s minute appointments differ (%s)" % (appt_type.minutes, engine))
+
+    def random_schedule(self, rnd):
+        Appointment.objects.all().delete()
+        TimeOff.objects.all().delete()
+        WorkingBreak.objects.all().delete()
+
+        for day, _ in UserAppointmentManager.DAYS:
+            start = datetime.time(rnd.randint(0, 11), rnd.choice((0, 15, 20, 30, 45)), rnd.choice((0, 0, 30)))
+            end = datetime.time(rnd.randint(12, 23), rnd.choice((0, 10, 30, 45)))
+            setattr(self.manager, day + "_start", start)
+            setattr(self.manager, day + "_end", end)
+            if rnd.random() < 0.4:
+                WorkingBreak.objects.create(manager=self.manager, day=day, start=datetime.time(12, rnd.choice((0, 30))),
+                                            end=datetime.time(13, rnd.choice((0, 15))))
+        self.manager.save()
+
+        # Spill over both ends of the week, with the odd event covering all of it. Appointments can't
+        # overlap each other on PostgreSQL, the ones that would are time off.
+        first = utc(2017, 2, 4, 12)
+        appointments = IntervalIndex()
+        for i in range(rnd.randint(0, 25)):
+            start = first + datetime.timedelta(minutes=rnd.randint(0, 8 * 24 * 60))
+            end = start + datetime.timedelta(minutes=rnd.choice((0, 5, 15, 20, 45, 60, 130, 600, 9000)))
+            if rnd.random() < 0.7 and not appointments.overlaps(start, end):
+                Appointment.objects.create(manager=self.manager, type=rnd.choice(self.types), start=start, end=end)
+                appointments.insert(start, end)
+            else:
+                TimeOff.objects.create(manager=self.manager, start=start, end=end)
+
+    def test_empty_week(self):
+        self.assertEnginesMatch()
+
+    def test_random_schedules(self):
+        rnd = random.Random(1017)
+        for _ in range(40):
+            self.random_schedule(rnd)
+            self.assertEnginesMatch()
+
+    def test_event_over_saturday_midnight(self):
+        TimeOff.objects.create(manager=self.manager, start=utc(2017, 2, 10, 20), end=utc(2017, 2, 11, 2))
+        Appointment.objects.create(manager=self.manager, type=self.types[0], start=utc(2017, 2, 8, 10),
+                                   end=utc(2017, 2, 8, 11, 25))
+        self.assertEnginesMatch()
+
+    def test_time_off_over_the_start_of_the_week(self):
+        TimeOff.objects.create(manager=self.manager, start=utc(2017, 2, 4, 20), end=utc(2017, 2, 6, 12))
+        self.assertEnginesMatch()
+
+    def test_seconds_fall_back_to_loop(self):
+        Appointment.objects.create(manager=self.manager, type=self.types[0], start=utc(2017, 2, 8, 10, 0, 30),
+                                   end=utc(2017, 2, 8, 11, 7, 12))
+        self.assertEnginesMatch()
+
+
+class NextAvailableTests(TestCase):
+
+    # A Sunday
+    WEEK = datetime.date(2017, 2, 5)
+
+    def setUp(self):
+        self.user = create_coach()
+        self.manager = self.user.appt_manager
+        self.appt_type = AppointmentType.objects.create(manager=self.manager, minutes=30)
+        Appointment.objects.create(manager=self.manager, type=self.appt_type, start=utc(2017, 2, 6, 9),
+                                   end=utc(2017, 2, 6, 11))
+
+    def test_same_slots_as_the_week(self):
+        slots = self.manager.iter_available(utc(2017, 2, 5), self.appt_type, horizon=datetime.timedelta(weeks=1))
+        self.assertEqual(self.manager.get_available_in_week(self.WEEK, self.appt_type), list(slots))
+
+    def test_stops_early(self):
+        self.manager.weekly_hours
+        # Only the first week's appointments and time off
+        with self.assertNumQueries(2):
+            slots = list(self.manager.iter_available(utc(2017, 2, 6, 10), self.appt_type, limit=3))
+        self.assertEqual(["2017/02/06 11:00", "2017/02/06 11:30", "2017/02/06 12:00"],
+                         [slot["start"] for slot in slots])
+
+    def test_scans_forward(self):
+        TimeOff.objects.create(manager=self.manager, start=utc(2017, 2, 1), end=utc(2017, 2, 20, 12))
+        slots = self.manager.iter_available(utc(2017, 2, 6), self.appt_type, limit=1)
+        self.assertEqual(["2017/02/20 12:00"], [slot["start"] for slot in slots])
+        self.assertEqual([], list(self.manager.iter_available(utc(2017, 2, 6), self.appt_type,
+                                                              horizon=datetime.timedelta(days=14))))
+
+    def test_view(self):
+        url = "/load/next/%s" % self.user.id
+        response = self.client.get(url, {"appt_id": self.appt_type.id, "limit": 2, "start": "2030/02/04 09:00"})
+        self.assertEqual(["2030/02/04 09:30", "2030/02/04 10:00"],
+                         [slot["start"] for slot in response.json()["available"]])
+        self.assertEqual(304, self.client.get(url, {"appt_id": self.appt_type.id, "limit": 2, "start": "2030/02/04 09:00"},
+                                              HTTP_IF_NONE_MATCH=response["ETag"]).status_code)
+        self.assertEqual(400, self.client.get(url, {"appt_id": self.appt_type.id, "limit": 500}).status_code)
+        self.assertEqual("error", self.client.get(url, {"appt_id": 999}).json()["response"])
+
+
+@override_settings(SCHEDULE_TIME_ZONE="America/New_York")
+class ScheduleTimeZoneTests(TestCase):
+    """
+    Working hours in New York wall time, across the weeks the clocks change in 2017.
+    """
+
+    # Clocks go forward on Sunday March 12th and back on Sunday November 5th
+    SPRING = datetime.date(2017, 3, 12)
+    FALL = datetime.date(2017, 11, 5)
+
+    def setUp(self):
+        self.user = create_coach()
+        self.manager = self.user.appt_manager
+        self.appt_type = AppointmentType.objects.create(manager=self.manager, minutes=30)
+
+    def wall_times(self, sunday):
+        """
+        :return: The slots of the week as (day of the week, start time, end time) labels
+        """
+        available = self.manager.get_available_in_week(sunday, self.appt_type)
+        return [((datetime.datetime.strptime(slot["start"][:10], "%Y/%m/%d").date() - sunday).days,
+                 slot["start"][11:], slot["end"][11:]) for slot in available]
+
+    def test_week_clock(self):
+        from lib.zones import week_clock, from_epoch_minutes
+
+        clock = week_clock(pytz.timezone("America/New_York"), self.SPRING)
+        self.assertEqual(utc(2017, 3, 12, 5), from_epoch_minutes(clock.start))
+        self.assertEqual(utc(2017, 3, 19, 4), from_epoch_minutes(clock.end))
+        self.assertEqual((-300, -240), clock.offsets[-2:])
+        # 01:59 EST is followed by 03:00 EDT
+        change = clock.changes[-1]
+        self.assertEqual((119, 180), (clock.wall(change - 1), clock.wall(change)))
+
+        clock = week_clock(pytz.timezone("America/New_York"), self.FALL)
+        self.assertEqual(7 * 24 * 60 + 60, clock.end - clock.start)
+
+    def test_hours_keep_their_wall_time(self):
+        before = self.wall_times(self.SPRING - datetime.timedelta(weeks=1))
+        self.assertTrue(before)
+        self.assertTrue(all("09:00" < start and end < "17:00" for _, start, end in before))
+        self.assertEqual(before, self.wall_times(self.SPRING))
+        self.assertEqual(before, self.wall_times(self.FALL))
+
+    def test_booked_times_are_instants(self):
+        # 10:00 in New York is 15:00 UTC before the change and 14:00 after it
+        Appointment.objects.create(manager=self.manager, type=self.appt_type, start=utc(2017, 3, 13, 14),
+                                   end=utc(2017, 3, 13, 14, 30))
+        slots = self.wall_times(self.SPRING)
+        self.assertNotIn((1, "10:00", "10:30"), slots)
+        self.assertIn((1, "10:30", "11:00"), slots)
+
+    def test_booking_in_wall_time(self):
+        zone = pytz.timezone("America/New_York")
+        start, end = parse_slot("2017/03/13 09:30", zone), parse_slot("2017/03/13 10:00", zone)
+        self.assertEqual(utc(2017, 3, 13, 13, 30), start)
+        book_appointment(self.manager, self.appt_type, start, end, "Student", "student@buffalo.edu")
+        with self.assertRaisesMessage(BookingError, "working hours"):
+            # 14:00 UTC on the Friday before is still 09:00 EST
+            book_appointment(self.manager, self.appt_type, utc(2017, 3, 10, 13, 30), utc(2017, 3, 10, 14),
+                             "Student", "student@buffalo.edu")
+
+    def test_parse_slot_year(self):
+        self.assertEqual(utc(2017, 2, 5, 9), parse_slot("2017/02/05 09:00"))
+        self.assertEqual(utc(2017, 12, 30, 9), parse_slot("Dec 30th 9:00 AM", today=datetime.date(2018, 1, 2)))
+        self.assertEqual(utc(2018, 2, 1, 14), parse_slot("Feb 1st 2:00 PM", today=datetime.date(2018, 1, 2)))
+        self.assertEqual(utc(2020, 2, 29, 9), parse_slot("Feb 29th 9:00 AM", today=datetime.date(2019, 12, 1)))
+        with self.assertRaises(ValueError):
+            parse_slot("sometime")
+
+
+class AvailabilityCacheTests(TestCase):
+
+    DATE = datetime.date(2017, 2, 8)
+
+    def setUp(self):
+        cache.availability_cache().clear()
+        self.manager = create_coach().appt_manager
+        self.appt_type = AppointmentType.objects.create(manager=self.manager, minutes=30)
+
+    def available(self):
+        return cache.get_available_in_week(self.manager, self.DATE, self.appt_type)
+
+    def test_repeat_loads_only_read_the_version(self):
+        first = self.available()
+        with self.assertNumQueries(1):
+            self.assertEqual(first, self.available())
+
+    def test_new_appointment_invalidates_its_week(self):
+        before = self.available()
+        Appointment.objects.create(manager=self.manager, type=self.appt_type, start=utc(2017, 2, 8, 10),
+                                   end=utc(2017, 2, 8, 11))
+        after = self.available()
+        self.assertNotEqual(before, after)
+        self.assertEqual(self.manager.get_available_in_week(self.DATE, self.appt_type), after)
+
+    def test_other_workers_see_changes(self):
+        # Every worker has its own LocMemCache, only the database is shared
+        other_worker = override_settings(AVAILABILITY_CACHE="default")
+        self.addCleanup(caches["default"].clear)
+        with other_worker:
+            before = self.available()
+        TimeOff.objects.create(manager=self.manager, start=utc(2017, 2, 8, 10), end=utc(2017, 2, 8, 11))
+        cache.availability_cache().clear()
+        with other_worker:
+            self.assertNotEqual(before, self.available())
+
+    def test_deleted_time_off_invalidates_its_week(self):
+        time_off = TimeOff.objects.create(manager=self.manager, start=utc(2017, 2, 8, 10), end=utc(2017, 2, 8, 11))
+        before = self.available()
+        time_off.delete()
+        self.assertNotEqual(before, self.available())
+
+    def test_changes_while_computing_are_not_cached_over(self):
+        compute = self.manager.get_available_in_week
+
+        def booked_meanwhile(date, appt_type):
+            available = compute(date, appt_type)
+            TimeOff.objects.create(manager=self.manager, start=utc(2017, 2, 8, 10), end=utc(2017, 2, 8, 11))
+            return available
+
+        self.manager.get_available_in_week = booked_meanwhile
+        stale = self.available()
+        del self.manager.get_available_in_week
+        self.assertNotEqual(stale, self.available())
+
+    def test_hours_and_types_invalidate_everything(self):
+        before = self.available()
+        self.manager.wed_end = datetime.time(12, 0)
+        self.manager.save()
+        after = self.available()
+        self.assertNotEqual(before, after)
+
+        self.appt_type.minutes = 60
+        self.appt_type.save()
+        self.assertNotEqual(after, self.available())
+
+    def test_warm_availability(self):
+        Appointment.objects.create(manager=self.manager, type=self.appt_type, start=utc(2017, 2, 8, 10),
+                                   end=utc(2017, 2, 8, 11))
+        with self.assertRaisesMessage(CommandError, "isn't shared"):
+            call_command("warm_availability", "--start", "2017-02-08", stdout=StringIO())
+
+        # The test settings' cache is in process memory, which is what --force is for
+        out = StringIO()
+        call_command("warm_availability", "--start", "2017-02-08", "--weeks", "2", "--processes", "2", "--force",
+                     stdout=out)
+        self.assertIn("Cached 2 weeks", out.getvalue())
+
+        for date in (self.DATE, self.DATE + datetime.timedelta(weeks=1)):
+            with self.assertNumQueries(1):
+                available = cache.get_available_in_week(self.manager, date, self.appt_type)
+            self.assertEqual(self.manager.get_available_in_week(date, self.appt_type), available)
+
+
+class ScheduleQueryTests(TestCase):
+
+    def setUp(self):
+        self.manager = create_coach().appt_manager
+        self.appt_type = AppointmentType.objects.create(manager=self.manager, minutes=30)
+
+    def test_overlapping(self):
+        inside = TimeOff.objects.create(manager=self.manager, start=utc(2017, 2, 8, 10), end=utc(2017, 2, 8, 11))
+        spanning = TimeOff.objects.create(manager=self.manager, start=utc(2017, 2, 1), end=utc(2017, 2, 20))
+        TimeOff.objects.create(manager=self.manager, start=utc(2017, 2, 3), end=utc(2017, 2, 5))
+        TimeOff.objects.create(manager=self.manager, start=utc(2017, 2, 12), end=utc(2017, 2, 13))
+
+        found = self.manager.exceptions.overlapping(utc(2017, 2, 5), utc(2017, 2, 12))
+        self.assertEqual({inside, spanning}, set(found))
+
+    def test_week_long_time_off_blocks_the_week(self):
+        TimeOff.objects.create(manager=self.manager, start=utc(2017, 2, 1), end=utc(2017, 2, 20))
+        self.assertEqual([], self.manager.get_available_in_week(datetime.date(2017, 2, 8), self.appt_type))
+
+    def test_nested_appointments_stay_busy(self):
+        # Appointments can't overlap each other on PostgreSQL, so the one around it is time off
+        TimeOff.objects.create(manager=self.manager, start=utc(2017, 2, 8, 9), end=utc(2017, 2, 8, 17))
+        Appointment.objects.create(manager=self.manager, type=self.appt_type, start=utc(2017, 2, 8, 10),
+                                   end=utc(2017, 2, 8, 11))
+        available = self.manager.get_available_in_week(datetime.date(2017, 2, 8), self.appt_type)
+        self.assertFalse([slot for slot in available if "2017/02/08 09:00" <= slot["start"] < "2017/02/08 17:00"])
+
+    def test_todays_appointments(self):
+        now = timezone.now()
+        Appointment.objects.create(manager=self.manager, type=self.appt_type, name="Today", start=now, end=now)
+        Appointment.objects.create(manager=self.manager, type=self.appt_type, name="Last week",
+                                   start=now - datetime.timedelta(weeks=1), end=now - datetime.timedelta(weeks=1))
+        self.assertEqual(["Checkup: Today"],
+                         [appt["title"] for appt in self.manager.todays_appointments])
+
+    def test_month_window(self):
+        for day in (1, 8, 9, 28):
+            Appointment.objects.create(manager=self.manager, type=self.appt_type, name="Student",
+                                       start=utc(2017, 2, day, 10), end=utc(2017, 2, day, 11))
+        TimeOff.objects.create(manager=self.manager, reason="Trip", start=utc(2017, 2, 4), end=utc(2017, 2, 6))
+        self.client.force_login(self.manager.user)
+
+        # The session, user and version lookups, then one query per table however many events there are
+        with self.assertNumQueries(5):
+            events = self.client.get("/time/month", {"start": "2017-02-05", "end": "2017-02-12"}).json()
+        self.assertEqual([("Checkup: Student", "2017/02/08 10:00"), ("Checkup: Student", "2017/02/09 10:00"),
+                          ("Time Off: Trip", "2017/02/04 00:00")], [(e["title"], e["start"]) for e in events])
+
+    def test_month_window_is_limited(self):
+        self.client.force_login(self.manager.user)
+        self.assertEqual(400, self.client.get("/time/month", {"start": "2017-01-01", "end": "2018-01-01"}).status_code)
+        self.assertEqual(400, self.client.get("/time/month", {"start": "soon", "end": "2017-02-12"}).status_code)
+        self.assertEqual(400, self.client.get("/time/month", {"start": "2017-02-30T10:00",
+                                                              "end": "2017-03-05"}).status_code)
+        self.assertEqual(200, self.client.get("/time/month").status_code)
+
+    def assertUsesIndex(self, queryset, index):
+        sql, params = queryset.query.sql_with_params()
+        with connection.cursor() as cursor:
+            cursor.execute("EXPLAIN QUERY PLAN " + sql, params)
+            plan = " ".join(str(row[-1]) for row in cursor.fetchall())
+        self.assertIn("USING INDEX %s" % index, plan)
+
+    def test_appointment_range_uses_index(self):
+        self.assertUsesIndex(self.manager.get_appts_for_range([utc(2017, 2, 5), utc(2017, 2, 12)]),
+                             "appointments_range_idx")
+
+    def test_time_off_range_uses_index(self):
+        self.assertUsesIndex(self.manager.get_time_off_for_range([utc(2017, 2, 5), utc(2017, 2, 12)]),
+                             "exceptions_range_idx")
+
+
+class RecurrenceTests(TestCase):
+    """
+    Time off every Friday at noon from February 3rd 2017, and repeating appointments.
+    """
+
+    def setUp(self):
+        self.user = create_coach()
+        self.manager = self.user.appt_manager
+        self.appt_type = AppointmentType.objects.create(manager=self.manager, minutes=30)
+        self.fridays = TimeOff.objects.create(manager=self.manager, reason="Lunch", start=utc(2017, 2, 3, 12),
+                                              end=utc(2017, 2, 3, 13), rrule="FREQ=WEEKLY")
+
+    def test_expands_in_window(self):
+        self.assertEqual([(utc(2017, 2, day, 12), utc(2017, 2, day, 13)) for day in (10, 17, 24)],
+                         list(self.fridays.occurrences(utc(2017, 2, 5), utc(2017, 3, 3))))
+        self.assertEqual([(utc(2017, 2, 3, 12), utc(2017, 2, 3, 13))],
+                         list(self.manager.exceptions.busy_times(utc(2017, 2, 3, 12, 30), utc(2017, 2, 3, 14))))
+        self.assertEqual([], list(self.manager.exceptions.busy_times(utc(2017, 1, 1), utc(2017, 2, 3))))
+
+    @override_settings(SCHEDULE_TIME_ZONE="America/New_York")
+    def test_keeps_wall_time(self):
+        # 10:00 EST, and 10:00 EDT after the clocks go forward on March 12th
+        meeting = Appointment.objects.create(manager=self.manager, type=self.appt_type, start=utc(2017, 3, 10, 15),
+                                             end=utc(2017, 3, 10, 16), rrule="FREQ=WEEKLY;COUNT=2")
+        self.assertEqual([utc(2017, 3, 10, 15), utc(2017, 3, 17, 14)],
+                         [start for start, _ in meeting.occurrences(utc(2017, 3, 1), utc(2017, 4, 1))])
+        self.assertEqual(utc(2017, 3, 17, 15), meeting.recurrence_end)
+
+    def test_skip_occurrence(self):
+        self.fridays.skip_occurrence(utc(2017, 2, 17, 12))
+        self.assertEqual([utc(2017, 2, 10, 12), utc(2017, 2, 24, 12)],
+                         [start for start, _ in self.fridays.occurrences(utc(2017, 2, 5), utc(2017, 3, 3))])
+
+    def test_series_end(self):
+        self.assertIsNone(self.fridays.recurrence_end)
+        self.fridays.rrule = "FREQ=WEEKLY;COUNT=3"
+        self.fridays.save()
+        self.assertEqual(utc(2017, 2, 17, 13), self.fridays.recurrence_end)
+        self.fridays.rrule = "FREQ=WEEKLY;UNTIL=20170224"
+        self.fridays.save()
+        self.assertEqual(utc(2017, 2, 24, 13), self.fridays.recurrence_end)
+        self.assertEqual([], list(self.manager.exceptions.busy_times(utc(2017, 2, 25), utc(2017, 4, 1))))
+
+    def test_availability(self):
+        def friday_noon():
+            available = self.manager.get_available_in_week(datetime.date(2017, 2, 8), self.appt_type)
+            return [slot["start"] for slot in available
+                    if slot["start"] < "2017/02/10 13:00" and slot["end"] > "2017/02/10 12:00"]
+
+        self.assertEqual([], friday_noon())
+        with override_settings(AVAILABILITY_MATERIALIZED=True):
+            free_time.rebuild(self.manager.id)
+            self.assertEqual([], friday_noon())
+        self.fridays.skip_occurrence(utc(2017, 2, 10, 12))
+        self.assertEqual(["2017/02/10 12:00", "2017/02/10 12:30"], friday_noon())
+
+    def test_booking_over_an_occurrence(self):
+        with self.assertRaisesMessage(BookingError, "no longer available"):
+            book_appointment(self.manager, self.appt_type, utc(2017, 2, 17, 12, 30), utc(2017, 2, 17, 13),
+                             "Student", "student@buffalo.edu")
+        book_appointment(self.manager, self.appt_type, utc(2017, 2, 17, 13), utc(2017, 2, 17, 13, 30),
+                         "Student", "student@buffalo.edu")
+
+    def test_month_view_and_skip(self):
+        self.client.force_login(self.user)
+        events = self.client.get("/time/month", {"start": "2017-02-05", "end": "2017-02-19"}).json()
+        self.assertEqual([("2017/02/10 12:00", "20170210T120000Z"), ("2017/02/17 12:00", "20170217T120000Z")],
+                         [(event["start"], event["occurrence"]) for event in events])
+
+        self.client.post("/time/%s/skip" % self.fridays.id, {"occurrence": "20170210T120000Z"})
+        self.client.post("/time/%s/skip" % self.fridays.id, {"occurrence": "20170210T123000Z"})
+        self.fridays.refresh_from_db()
+        self.assertEqual("20170210T120000Z", self.fridays.exdates)
+
+    def test_time_off_form(self):
+        self.client.force_login(self.user)
+        self.client.post("/time/create", {"reason": "Team meeting", "time": "02/06/2030 10:00 AM - 02/06/2030 11:00 AM",
+                                          "repeat": "FREQ=WEEKLY;INTERVAL=2", "until": "2030-03-06"})
+        time_off = self.manager.exceptions.get(reason="Team meeting")
+        self.assertEqual("FREQ=WEEKLY;INTERVAL=2;UNTIL=20300306", time_off.rrule)
+        self.assertEqual(utc(2030, 3, 6, 11), time_off.recurrence_end)
+
+    def test_feed_has_the_rule(self):
+        body = b"".join(self.client.get("/%s/schedule.ics" % self.user.id).streaming_content).decode()
+        self.assertIn("DTSTART:20170203T120000Z\r\nDTEND:20170203T130000Z\r\nSUMMARY:Time Off\r\n"
+                      "RRULE:FREQ=WEEKLY\r\n", body)
+
+    def test_purge_keeps_series(self):
+        standing = Appointment.objects.create(manager=self.manager, type=self.appt_type, start=utc(2017, 2, 6, 9),
+                                              end=utc(2017, 2, 6, 10), rrule="FREQ=WEEKLY")
+        finished = Appointment.objects.create(manager=self.manager, type=self.appt_type, start=utc(2017, 2, 7, 9),
+                                              end=utc(2017, 2, 7, 10), rrule="FREQ=WEEKLY;COUNT=4")
+        call_command("purge_appointments", stdout=StringIO())
+        self.assertEqual([standing.id], list(Appointment.objects.values_list("id", flat=True)))
+        self.assertFalse(Appointment.objects.filter(id=finished.id).exists())
+
+    def test_parse_rule(self):
+        from lib.recurrence import parse_rule
+
+        self.assertEqual(2, parse_rule("FREQ=WEEKLY;INTERVAL=2;BYDAY=MO,WE")["interval"])
+        for rule in ("FREQ=YEARLY", "FREQ=WEEKLY;BYSETPOS=1", "FREQ=DAILY;COUNT=2;UNTIL=20170101",
+                     "FREQ=WEEKLY;BYDAY=XX", "FREQ=DAILY;COUNT=0", "WEEKLY"):
+            with self.assertRaises(ValueError):
+                parse_rule(rule)
+
+
+class PurgeAppointmentsTests(TestCase):
+
+    def setUp(self):
+        self.manager = create_coach().appt_manager
+        self.appt_type = AppointmentType.objects.create(manager=self.manager, minutes=30)
+
+    def create(self, days_ago, count=1):
+        end = timezone.now() - datetime.timedelta(days=days_ago)
+        for _ in range(count):
+            Appointment.objects.create(manager=self.manager, type=self.appt_type, start=end, end=end)
+
+    def test_purges_in_batches(self):
+        self.create(30, count=7)
+        self.create(3, count=2)
+        out = StringIO()
+        call_command("purge_appointments", "--batch-size", "3", stdout=out)
+        self.assertIn("Deleted 7 appointments", out.getvalue())
+        self.assertEqual(2, Appointment.objects.count())
+
+    def test_retention_window(self):
+        self.create(30)
+        self.create(10)
+        call_command("purge_appointments", "--weeks", "1", stdout=StringIO())
+        self.assertEqual(0, Appointment.objects.count())
+
+    def test_manage_view_does_not_purge(self):
+        self.create(30)
+        self.client.force_login(self.manager.user)
+        self.client.get("/manage")
+        self.assertEqual(1, Appointment.objects.count())
+
+
+class BenchmarkTests(TestCase):
+
+    def test_generator_is_deterministic(self):
+        from benchmarks.data import ScheduleGenerator
+        self.assertEqual(ScheduleGenerator(seed=5).busy_dicts(), ScheduleGenerator(seed=5).busy_dicts())
+        self.assertNotEqual(ScheduleGenerator(seed=5).busy_dicts(), ScheduleGenerator(seed=6).busy_dicts())
+
+    def test_generator_builds_schedule(self):
+        from benchmarks.data import ScheduleGenerator
+        managers = ScheduleGenerator(coaches=2, appt_types=2, appointments_per_week=3, time_off_per_week=1,
+                                     weeks=2).build()
+        self.assertEqual(2, len(managers))
+        # Appointments that would overlap another one are time off
+        self.assertEqual(12 + 4, Appointment.objects.count() + TimeOff.objects.count())
+        self.assertLessEqual(4, TimeOff.objects.count())
+        for manager in managers:
+            appointments = list(manager.appointments.order_by("start"))
+            for first, second in zip(appointments, appointments[1:]):
+                self.assertLessEqual(first.end, second.start)
+
+
+class SQLiteProfileTests(SimpleTestCase):
+
+    databases = {"default"}
+
+    def test_pragmas(self):
+        connection.ensure_connection()
+        sqlite = connection.connection
+        self.assertEqual(1, sqlite.execute("PRAGMA synchronous").fetchone()[0])
+        self.assertEqual(5000, sqlite.execute("PRAGMA busy_timeout").fetchone()[0])
+        self.assertEqual(-64000, sqlite.execute("PRAGMA cache_size").fetchone()[0])
+
+    @override_settings(READ_DATABASE="read")
+    def test_read_only_views_read_from_the_read_connection(self):
+        router = ReadRouter()
+        where = read_only(lambda: router.db_for_read(Appointment))
+        self.assertEqual("read", where())
+        self.assertIsNone(router.db_for_read(Appointment))
+        self.assertFalse(router.allow_migrate("read", "appointments"))
+
+        @read_only
+        async def view():
+            return await sync_to_async(router.db_for_read)(Appointment)
+        self.assertEqual("read", async_to_sync(view)())
+
+    @override_settings(READ_DATABASE="read")
+    def test_reads_in_a_transaction_stay_on_default(self):
+        with transaction.atomic():
+            self.assertIsNone(read_only(lambda: ReadRouter().db_for_read(Appointment))())
+
+    def test_off_without_a_read_connection(self):
+        self.assertIsNone(read_only(lambda: ReadRouter().db_for_read(Appointment))())
+
+
+class AssetTests(SimpleTestCase):
+
+    @skipUnless(assets_lib.rjsmin, "Needs rjsmin")
+    def test_minify_js(self):
+        self.assertEqual("/*! License */\nvar b=1;", assets_lib.minify_js("/*! License */\nvar b = 1; // one\n"))
+
+    def test_build_needs_rjsmin(self):
+        rjsmin, assets_lib.rjsmin = assets_lib.rjsmin, None
+        try:
+            with self.assertRaisesMessage(CommandError, "rjsmin"):
+                call_command("build_assets", "--no-collect", stdout=StringIO())
+        finally:
+            assets_lib.rjsmin = rjsmin
+
+    def test_minify_css_and_rebase(self):
+        self.assertEqual('a>b{color: red;content: "  ;  "}',
+                         assets_lib.minify_css('/* x */ a > b {\n  color: red;\n  content: "  ;  ";\n}'))
+        self.assertEqual("url('../widgets/img/x.png?v=1') url(data:image/png;base64,AA)",
+                         assets_lib.rebase_css("url('img/x.png?v=1') url(data:image/png;base64,AA)",
+                                               "widgets/site.css", "bundles/site.css"))
+
+    def test_bundle_tag_while_developing(self):
+        template = Template('{% load static assets %}{% bundle "page.js" %}'
+                            '<script src="{% static \'a.js\' %}"></script>'
+                            '<!--<script src="{% static \'old.js\' %}"></script>-->'
+                            '<script src="{% static \'a.js\' %} "></script>'
+                            '<script src="{% static \'b.js\' %}"></script>{% endbundle %}')
+        self.assertEqual('<script type="text/javascript" src="/static/a.js"></script>\n'
+                         '<script type="text/javascript" src="/static/b.js"></script>', template.render(Context()))
+
+    def test_find_bundles(self):
+        bundles = assets.find_bundles()
+        self.assertEqual({"appointments.js", "core.js", "dashboard.css", "dashboard.js"}, set(bundles))
+        scripts = bundles["appointments.js"]
+        self.assertEqual(len(scripts), len(set(scripts)))
+        self.assertIn("widgets/interactions-ui/resizable.js", scripts)
+        self.assertNotIn("js-core/transition.js", bundles["core.js"])
+
+    def test_build_and_serve(self):
+        source, root = tempfile.mkdtemp(), tempfile.mkdtemp()
+        os.makedirs(os.path.join(source, "css", "img"))
+        with open(os.path.join(source, "css", "site.css"), "w") as f:
+            f.write("/* The dots */\nbody {\n  background: url('img/dot.png');\n}\n" * 50)
+        with open(os.path.join(source, "css", "img", "dot.png"), "wb") as f:
+            f.write(b"png")
+
+        with override_settings(STATICFILES_DIRS=[source], STATIC_ROOT=root, ASSET_BUNDLES=True, SERVE_ASSETS=True,
+                               ASSET_BUNDLE_DIR=os.path.join(source, "bundles"),
+                               STATICFILES_STORAGE="appointments.assets.CompressedManifestStorage"):
+            sizes = assets.write_bundles({"site.css": ["css/site.css"]})
+            self.assertLess(sizes["site.css"][1], sizes["site.css"][0])
+            call_command("collectstatic", interactive=False, verbosity=0)
+
+            html = Template('{% load static assets %}{% bundle "site.css" %}'
+                            '<link href="{% static \'css/site.css\' %}">{% endbundle %}').render(Context())
+            url = re.search(r'href="([^"]+)"', html).group(1)
+            self.assertRegex(url, r"^/static/bundles/site\.[0-9a-f]{12}\.css$")
+            with open(os.path.join(root, url[len("/static/"):])) as f:
+                self.assertRegex(f.read(), r"url\(\W\.\./css/img/dot\.[0-9a-f]{12}\.png\W\)")
+
+            response = self.client.get(url, HTTP_ACCEPT_ENCODING="gzip, deflate")
+            self.assertEqual("gzip", response["Content-Encoding"])
+            self.assertEqual("text/css", response["Content-Type"])
+            self.assertIn("immutable", response["Cache-Control"])
+            self.assertIn("Accept-Encoding", response["Vary"])
+            self.assertTrue(gzip.decompress(b"".join(response.streaming_content)).startswith(b"body{background:"))
+
+            response = self.client.get("/static/bundles/site.css")
+            self.assertIsNone(response.get("Content-Encoding"))
+            self.assertNotIn("immutable", response["Cache-Control"])
+            self.assertEqual(404, self.client.get("/static/nothing.js").status_code)
+
+        with override_settings(STATIC_ROOT=root):
+            self.assertEqual(404, self.client.get(url).status_code)
+
+class FragmentCacheTests(TestCase):
+
+    def setUp(self):
+        fragments.fragment_cache().clear()
+        self.user = create_coach()
+        self.manager = self.user.appt_manager
+        AppointmentType.objects.create(manager=self.manager, name="Pitch", minutes=30)
+
+    def index(self):
+        with CaptureQueriesContext(connection) as queries:
+            html = self.client.get("/?vc=%s" % self.user.id).content.decode()
+        return html, len(queries)
+
+    def test_repeat_renders_skip_the_lists(self):
+        html, first = self.index()
+        self.assertIn("Pitch: 30", html)
+        html, second = self.index()
+        self.assertIn("Pitch: 30", html)
+        self.assertIn("Venture Coach</option>", html)
+        # The coach list and the appointment types
+        self.assertEqual(first - 2, second)
+
+    def test_changes_show_up(self):
+        self.index()
+        AppointmentType.objects.create(manager=self.manager, name="Review", minutes=60)
+        self.user.first_name = "Renamed"
+        self.user.save()
+        html, _ = self.index()
+        self.assertIn("Review: 60", html)
+        self.assertIn("Renamed Coach</option>", html)
+
+        self.user.private = True
+        self.user.save()
+        self.assertNotIn("Renamed Coach</option>", self.index()[0])
+
+    def test_versions_are_shared_through_the_database(self):
+        self.index()
+        before = fragments.get_generations(fragments.types_group(self.manager.id))
+        AppointmentType.objects.create(manager=self.manager, name="Review", minutes=60)
+        # What another worker with its own cache reads
+        self.assertEqual([before[0] + 1], list(FragmentVersion.objects.filter(
+            name=fragments.types_group(self.manager.id)).values_list("version", flat=True)))
+
+    def test_logging_in_keeps_the_coach_list(self):
+        before = fragments.get_generations(fragments.COACHES)
+        self.client.login(email="coach@buffalo.edu", password="password")
+        self.assertEqual(before, fragments.get_generations(fragments.COACHES))
+
+class RequestTimingTests(TestCase):
+
+    def setUp(self):
+        timing.summary.clear()
+        self.user = create_coach()
+
+    def test_server_timing_header(self):
+        response = self.client.get("/")
+        header = response["Server-Timing"]
+        self.assertRegex(header, r'^db;dur=[\d.]+;desc="\d+ queries", tpl;dur=[\d.]+, view;dur=[\d.]+$')
+        self.assertNotIn('desc="0 queries"', header)
+        self.assertNotIn("tpl;dur=0.00,", header)
+
+    def test_summary_by_url_name(self):
+        self.client.get("/")
+        self.client.get("/")
+        self.assertEqual(2, timing.summary.summary()["index"]["requests"])
+
+    def test_unresolved_paths_share_an_entry(self):
+        self.client.get("/no/such/page")
+        self.client.get("/no/other/page")
+        summary = timing.summary.summary()
+        self.assertEqual(2, summary[UNRESOLVED]["requests"])
+        self.assertNotIn("/no/such/page", summary)
+
+    def test_summary_is_for_admins(self):
+        self.client.force_login(self.user)
+        self.assertEqual(302, self.client.get("/admin/timings").status_code)
+
+        self.user.is_admin = True
+        self.user.save()
+        self.client.get("/")
+        self.assertIn("index", self.client.get("/admin/timings").json())
+
+    @override_settings(QUERY_BUDGETS={"index": 1}, QUERY_BUDGET_STRICT=True)
+    def test_strict_query_budget(self):
+        with self.assertRaises(QueryBudgetExceeded):
+            self.client.get("/")
+
+    @override_settings(QUERY_BUDGETS={"index": 1})
+    def test_query_budget_only_logs_by_default(self):
+        with self.assertLogs("appointments.middleware", "WARNING"):
+            self.assertEqual(200, self.client.get("/").status_code)
+
+
+class IntervalIndexTests(TestCase):
+    """
+    Random busy times checked against flatten_time_array, the free time gaps and a plain scan.
+    """
+
+    START = utc(2017, 2, 5)
+
+    def random_intervals(self, rnd, count):
+        intervals = []
+        for _ in range(count):
+            start = self.START + datetime.timedelta(minutes=rnd.randrange(0, 7 * 24 * 60, rnd.choice((1, 15))))
+            intervals.append((start, start + datetime.timedelta(minutes=rnd.choice((0, 5, 15, 30, 60, 240, 3000)))))
+        return intervals
+
+    def assertMatchesLists(self, index, intervals, rnd):
+        busy = sorted(({"start": start, "end": end} for start, end in intervals), key=lambda x: x["start"])
+        end = self.START + datetime.timedelta(weeks=2)
+        self.assertEqual(free_time.gaps(flatten_time_array(busy), self.START, end), list(index.gaps(self.START, end)))
+        self.assertEqual(free_time.gaps(index.flattened(), self.START, end), list(index.gaps(self.START, end)))
+
+        for start, _ in self.random_intervals(rnd, 20):
+            end = start + datetime.timedelta(minutes=rnd.choice((1, 15, 30, 90)))
+            self.assertEqual(any(a < end and b > start for a, b in intervals), index.overlaps(start, end),
+                             "%s to %s" % (start, end))
+
+    def test_matches_lists(self):
+        rnd = random.Random(2101)
+        for _ in range(100):
+            intervals = self.random_intervals(rnd, rnd.randint(0, 60))
+            self.assertMatchesLists(IntervalIndex(intervals), intervals, rnd)
+
+    def test_insert_and_remove(self):
+        rnd = random.Random(2102)
+        for _ in range(20):
+            index, intervals = IntervalIndex(), []
+            for _ in range(60):
+                if intervals and rnd.random() < 0.4:
+                    interval = intervals.pop(rnd.randrange(len(intervals)))
+                    index.remove(*interval)
+                else:
+                    interval = self.random_intervals(rnd, 1)[0]
+                    intervals.append(interval)
+                    index.insert(*interval)
+                fresh = IntervalIndex(intervals)
+                self.assertEqual((fresh.starts, fresh.ends), (index.starts, index.ends))
+            self.assertMatchesLists(index, intervals, rnd)
+
+    def test_touching_and_empty(self):
+        index = IntervalIndex([(1, 3), (3, 5), (7, 7)])
+        self.assertEqual([1, 5, 7, 7], index.flattened())
+        self.assertFalse(index.overlaps(5, 6))
+        self.assertTrue(index.overlaps(6, 8))
+        self.assertFalse(index.overlaps(7, 8))
+        self.assertEqual([(0, 1), (5, 7), (7, 9)], list(index.gaps(0, 9)))
+        with self.assertRaises(ValueError):
+            index.remove(1, 5)
+
+
+class WeeklyHoursTests(TestCase):
+
+    def hours(self, breaks=()):
+        # 9 to 5 every day
+        return WeeklyHours([9 * 60, 17 * 60] * 7, breaks)
+
+    def test_breaks_split_the_day(self):
+        hours = self.hours([(1, 12 * 60, 13 * 60), (1, 15 * 60, 18 * 60)])
+        self.assertEqual(((9 * 60, 12 * 60), (13 * 60, 15 * 60)), hours.windows[1])
+        self.assertEqual(((9 * 60, 17 * 60),), hours.windows[2])
+
+    def test_allows(self):
+        hours = self.hours([(1, 12 * 60, 13 * 60)])
+        # Monday the 6th of February 2017
+        self.assertTrue(hours.allows(utc(2017, 2, 6, 10), utc(2017, 2, 6, 11)))
+        self.assertFalse(hours.allows(utc(2017, 2, 6, 9), utc(2017, 2, 6, 10)))
+        self.assertFalse(hours.allows(utc(2017, 2, 6, 11, 30), utc(2017, 2, 6, 12, 30)))
+        self.assertTrue(hours.allows(utc(2017, 2, 6, 13, 15), utc(2017, 2, 6, 14)))
+        self.assertFalse(hours.allows(utc(2017, 2, 6, 16, 30), utc(2017, 2, 6, 17)))
+
+    def test_parse_and_labels(self):
+        values = {}
+        for day, _ in UserAppointmentManager.DAYS:
+            values[day + "_start"] = "08:30 AM"
+            values[day + "_end"] = "12:00 PM"
+        hours = WeeklyHours.parse(values)
+        self.assertEqual("08:30 AM", hours.label("tue_start"))
+        self.assertEqual("12:00 PM", hours.label("tue_end"))
+        self.assertEqual(datetime.time(8, 30), hours.time("sat_start"))
+
+        values["wed_end"] = "noon"
+        with self.assertRaises(ValueError):
+            WeeklyHours.parse(values)
+
+    def test_save_normal_hours(self):
+        user = create_coach()
+        data = {}
+        for day, _ in UserAppointmentManager.DAYS:
+            data[day + "_start"] = "10:00 AM"
+            data[day + "_end"] = "02:15 PM"
+        self.client.force_login(user)
+        self.client.post("/hours/save", data)
+
+        manager = UserAppointmentManager.objects.get(user=user)
+        self.assertEqual(datetime.time(14, 15), manager.fri_end)
+        self.assertEqual("10:00:00", manager.get_min_time)
+        self.assertEqual("14:00:00", manager.get_max_time)
+
+    def test_manager_caches_hours(self):
+        manager = create_coach().appt_manager
+        manager.weekly_hours
+        with self.assertNumQueries(0):
+            manager.weekly_hours
+        WorkingBreak.objects.create(manager=manager, day="mon", start=datetime.time(12), end=datetime.time(13))
+        manager.save()
+        self.assertEqual(2, len(manager.weekly_hours.windows[1]))
+
+
+@override_settings(AVAILABILITY_MATERIALIZED=True)
+class FreeIntervalTests(TestCase):
+
+    DATE = datetime.date(2017, 2, 8)
+
+    def setUp(self):
+        self.manager = create_coach().appt_manager
+        self.types = [AppointmentType.objects.create(manager=self.manager, minutes=minutes) for minutes in (15, 45)]
+
+    def assertMatchesComputed(self):
+        self.assertTrue(free_time.is_consistent(self.manager.id))
+        for appt_type in self.types:
+            for weeks in (-1, 0, 1):
+                date = self.DATE + datetime.timedelta(weeks=weeks)
+                materialized = self.manager.get_available_in_week(date, appt_type)
+                with override_settings(AVAILABILITY_MATERIALIZED=False):
+                    self.assertEqual(self.manager.get_available_in_week(date, appt_type), materialized)
+
+    def test_incremental_updates(self):
+        free_time.rebuild(self.manager.id)
+        rnd = random.Random(8)
+        rows = []
+        appointments = IntervalIndex()
+        for _ in range(60):
+            if rows and rnd.random() < 0.35:
+                row = rows.pop(rnd.randrange(len(rows)))
+                if isinstance(row, Appointment):
+                    appointments.remove(row.start, row.end)
+                row.delete()
+            else:
+                start = utc(2017, 2, 1) + datetime.timedelta(minutes=rnd.randrange(0, 20 * 24 * 60, 5))
+                end = start + datetime.timedelta(minutes=rnd.choice((0, 15, 45, 60, 240, 3000)))
+                # Appointments can't overlap each other on PostgreSQL
+                if rnd.random() < 0.6 and not appointments.overlaps(start, end):
+                    appointments.insert(start, end)
+                    rows.append(Appointment.objects.create(manager=self.manager, type=self.types[0], start=start,
+                                                           end=end))
+                else:
+                    rows.append(TimeOff.objects.create(manager=self.manager, start=start, end=end))
+            self.assertTrue(free_time.is_consistent(self.manager.id))
+        self.assertMatchesComputed()
+
+    def test_builds_on_first_read(self):
+        TimeOff.objects.create(manager=self.manager, start=utc(2017, 2, 8, 10), end=utc(2017, 2, 8, 12))
+        self.manager.free_intervals.all().delete()
+        self.manager.get_available_in_week(self.DATE, self.types[0])
+        self.assertMatchesComputed()
+
+    def test_one_range_query(self):
+        free_time.rebuild(self.manager.id)
+        self.manager.refresh_from_db()
+        self.manager.weekly_hours
+        with self.assertNumQueries(1):
+            self.manager.get_available_in_week(self.DATE, self.types[0])
+
+    def test_changes_before_the_first_build(self):
+        appointment = Appointment.objects.create(manager=self.manager, type=self.types[0], start=utc(2017, 2, 8, 10),
+                                                 end=utc(2017, 2, 8, 11))
+        UserAppointmentManager.objects.filter(id=self.manager.id).update(free_time_built=False)
+        self.manager.free_intervals.all().delete()
+        appointment.delete()
+        self.assertTrue(free_time.is_consistent(self.manager.id))
+        self.assertMatchesComputed()
+
+    def test_edits_move_the_busy_span(self):
+        free_time.rebuild(self.manager.id)
+        appointment = Appointment.objects.create(manager=self.manager, type=self.types[0], start=utc(2017, 2, 8, 10),
+                                                 end=utc(2017, 2, 8, 11))
+        time_off = TimeOff.objects.create(manager=self.manager, start=utc(2017, 2, 9, 10), end=utc(2017, 2, 9, 12))
+        appointment.start, appointment.end = utc(2017, 2, 8, 14), utc(2017, 2, 8, 15)
+        appointment.save()
+        time_off.rrule = "FREQ=WEEKLY"
+        time_off.save()
+        self.assertTrue(free_time.is_consistent(self.manager.id))
+        self.assertMatchesComputed()
+
+    def test_purge_keeps_intervals_current(self):
+        free_time.rebuild(self.manager.id)
+        ended = timezone.now() - datetime.timedelta(weeks=5)
+        Appointment.objects.create(manager=self.manager, type=self.types[0], start=ended - datetime.timedelta(hours=1),
+                                   end=ended)
+        call_command("purge_appointments", stdout=StringIO())
+        self.assertTrue(free_time.is_consistent(self.manager.id))
+
+    def test_rebuild_command(self):
+        TimeOff.objects.bulk_create([TimeOff(manager=self.manager, start=utc(2017, 2, 8, 10), end=utc(2017, 2, 8, 12))])
+        with self.assertRaises(CommandError):
+            call_command("rebuild_free_slots", "--check", stdout=StringIO())
+        call_command("rebuild_free_slots", stdout=StringIO())
+        call_command("rebuild_free_slots", "--check", stdout=StringIO())
+
+
+class BookingTests(TestCase):
+
+    def setUp(self):
+        self.user = create_coach()
+        self.manager = self.user.appt_manager
+        self.appt_type = AppointmentType.objects.create(manager=self.manager, minutes=30)
+
+    def book(self, start, end):
+        return book_appointment(self.manager, self.appt_type, start, end, "Student", "student@buffalo.edu")
+
+    def test_books_free_slot(self):
+        self.book(utc(2017, 2, 8, 10), utc(2017, 2, 8, 10, 30))
+        self.assertGreater(UserAppointmentManager.objects.get(pk=self.manager.pk).version, 0)
+
+    def test_rejects_overlaps(self):
+        self.book(utc(2017, 2, 8, 10), utc(2017, 2, 8, 10, 30))
+        with self.assertRaisesMessage(BookingError, "no longer available"):
+            self.book(utc(2017, 2, 8, 10, 15), utc(2017, 2, 8, 10, 45))
+        TimeOff.objects.create(manager=self.manager, start=utc(2017, 2, 8, 12), end=utc(2017, 2, 8, 14))
+        with self.assertRaises(BookingError):
+            self.book(utc(2017, 2, 8, 13), utc(2017, 2, 8, 13, 30))
+
+    def test_rejects_outside_hours(self):
+        with self.assertRaisesMessage(BookingError, "working hours"):
+            self.book(utc(2017, 2, 8, 7), utc(2017, 2, 8, 7, 30))
+
+    def test_other_integrity_errors_are_not_overlaps(self):
+        with self.assertRaises(IntegrityError):
+            book_appointment(self.manager, self.appt_type, utc(2017, 2, 8, 10), utc(2017, 2, 8, 10, 30), None,
+                             "student@buffalo.edu")
+
+    def test_standing_appointments_check_every_occurrence(self):
+        # Wednesdays, the third one is taken
+        Appointment.objects.create(manager=self.manager, type=self.appt_type, start=utc(2017, 2, 22, 10),
+                                   end=utc(2017, 2, 22, 10, 30))
+        with self.assertRaisesMessage(BookingError, "02/22/2017"):
+            book_appointment(self.manager, self.appt_type, utc(2017, 2, 8, 10), utc(2017, 2, 8, 10, 30), "Student",
+                             "student@buffalo.edu", rrule="FREQ=WEEKLY")
+        with self.assertRaisesMessage(BookingError, "no longer available"):
+            book_appointment(self.manager, self.appt_type, utc(2017, 2, 8, 10, 15), utc(2017, 2, 8, 10, 45),
+                             "Student", "student@buffalo.edu", rrule="FREQ=WEEKLY")
+        with self.assertRaises(BookingError):
+            book_appointment(self.manager, self.appt_type, utc(2017, 2, 8, 10), utc(2017, 2, 8, 10, 30), "Student",
+                             "student@buffalo.edu", rrule="FREQ=HOURLY")
+        book_appointment(self.manager, self.appt_type, utc(2017, 2, 8, 10), utc(2017, 2, 8, 10, 30), "Student",
+                         "student@buffalo.edu", rrule="FREQ=WEEKLY;COUNT=2")
+        self.assertEqual(2, Appointment.objects.count())
+
+    def test_booking_page_reports_conflicts(self):
+        body = {"user_id": self.user.id, "type_id": self.appt_type.id, "name": "Student",
+                "email": "student@buffalo.edu", "start": "Feb 8th 10:00 AM", "end": "Feb 8th 10:30 AM"}
+        self.assertEqual({"response": "ok"}, self.client.post("/", json.dumps(body), content_type="json").json())
+        self.assertEqual("error", self.client.post("/", json.dumps(body), content_type="json").json()["response"])
+        self.assertEqual(1, Appointment.objects.count())
+
+
+class BookingStressTests(TransactionTestCase):
+
+    def test_no_double_booking(self):
+        from benchmarks.bench_booking import stress_booking, contested_slots
+
+        managers = [create_coach("coach%s@buffalo.edu" % i).appt_manager for i in range(2)]
+        types = [AppointmentType.objects.create(manager=manager, minutes=30) for manager in managers]
+        booked, seconds = stress_booking(managers, types, contested_slots())
+
+        self.assertTrue(booked)
+        self.assertEqual(len(booked), Appointment.objects.count())
+        for manager in managers:
+            appointments = list(manager.appointments.order_by("start"))
+            for first, second in zip(appointments, appointments[1:]):
+                self.assertLessEqual(first.end, second.start)
+
+
+@skipUnless(connection.vendor == "postgresql", "Needs PostgreSQL (POSTGRES_DB)")
+class PostgresPeriodTests(TestCase):
+
+    def setUp(self):
+        self.manager = create_coach().appt_manager
+        self.appt_type = AppointmentType.objects.create(manager=self.manager, minutes=30)
+
+    def create(self, start, end, **kwargs):
+        return Appointment.objects.create(manager=self.manager, type=self.appt_type, start=start, end=end, **kwargs)
+
+    def test_refuses_overlapping_appointments(self):
+        self.create(utc(2017, 2, 8, 10), utc(2017, 2, 8, 11))
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            self.create(utc(2017, 2, 8, 10, 30), utc(2017, 2, 8, 11, 30))
+
+        # Touching isn't overlapping, and repeating rows and other coaches aren't constrained
+        self.create(utc(2017, 2, 8, 11), utc(2017, 2, 8, 11, 30))
+        self.create(utc(2017, 2, 8, 10), utc(2017, 2, 8, 11), rrule="FREQ=WEEKLY")
+        other = create_coach("other@buffalo.edu").appt_manager
+        Appointment.objects.create(manager=other, type=self.appt_type, start=utc(2017, 2, 8, 10),
+                                   end=utc(2017, 2, 8, 11))
+
+    def test_time_off_may_overlap(self):
+        self.create(utc(2017, 2, 8, 10), utc(2017, 2, 8, 11))
+        TimeOff.objects.create(manager=self.manager, start=utc(2017, 2, 8, 9), end=utc(2017, 2, 8, 12))
+        TimeOff.objects.create(manager=self.manager, start=utc(2017, 2, 8, 10), end=utc(2017, 2, 8, 11))
+        self.assertEqual(2, self.manager.exceptions.overlapping(utc(2017, 2, 8, 10), utc(2017, 2, 8, 10, 30)).count())
+
+    def test_overlap_queries_use_the_period(self):
+        inside = self.create(utc(2017, 2, 8, 10), utc(2017, 2, 8, 11))
+        self.create(utc(2017, 2, 8, 12), utc(2017, 2, 8, 13))
+        found = self.manager.appointments.overlapping(utc(2017, 2, 8, 10, 30), utc(2017, 2, 8, 12))
+        self.assertIn("&&", str(found.query))
+        self.assertEqual([inside], list(found))
+
+
+class ImportScheduleTests(TestCase):
+
+    def setUp(self):
+        self.user = create_coach()
+        self.manager = self.user.appt_manager
+        self.appt_type = AppointmentType.objects.create(manager=self.manager, minutes=30)
+
+    def write(self, text, suffix=".csv"):
+        handle, path = tempfile.mkstemp(suffix=suffix)
+        with os.fdopen(handle, "w") as f:
+            f.write(text)
+        self.addCleanup(os.remove, path)
+        return path
+
+    def version(self):
+        return UserAppointmentManager.objects.get(id=self.manager.id).version
+
+    def csv(self, *rows):
+        header = "kind,manager,type,name,email,reason,start,end\n"
+        return header + "".join(",".join(str(value) for value in row) + "\n" for row in rows)
+
+    def appointment(self, start, end, manager=None):
+        return ("appointment", manager or self.manager.id, self.appt_type.id, "Student", "student@buffalo.edu", "",
+                start, end)
+
+    def test_imports_and_reports_bad_rows(self):
+        Appointment.objects.create(manager=self.manager, type=self.appt_type,
+                                   start=utc(2017, 2, 8, 12), end=utc(2017, 2, 8, 13))
+        path = self.write(self.csv(
+            self.appointment("2017-02-08T10:00:00", "2017-02-08T10:30:00"),
+            ("timeoff", "coach@buffalo.edu", "", "", "", "Conference", "2017-02-09T00:00:00Z", "2017-02-10T00:00:00Z"),
+            self.appointment("2017-02-08T10:15:00", "2017-02-08T10:45:00"),  # overlaps line 2
+            self.appointment("2017-02-08T12:30:00", "2017-02-08T13:30:00"),  # overlaps what is booked
+            self.appointment("2017-02-08T11:30:00", "2017-02-08T12:15:00"),  # runs into what is booked
+            self.appointment("2017-02-09T10:00:00", "2017-02-09T10:30:00"),  # in the time off
+            self.appointment("not a date", "2017-02-08T10:30:00"),
+            self.appointment("2017-02-08T15:00:00", "2017-02-08T15:30:00", manager=999),
+            ("timeoff", self.manager.id, "", "", "", "Lunch", "2017-02-09T12:00:00Z", "2017-02-09T13:00:00Z"),
+        ))
+        out = StringIO()
+        call_command("import_schedule", path, "--batch-size", "1", stdout=out)
+
+        self.assertEqual(["Line 4: Overlaps another appointment or time off.",
+                          "Line 5: Overlaps another appointment or time off.",
+                          "Line 6: Overlaps another appointment or time off.",
+                          "Line 7: Overlaps another appointment or time off.",
+                          "Line 8: Invalid start time.",
+                          "Line 9: Could not find the manager 999."], out.getvalue().splitlines()[:-1])
+        self.assertIn("Imported 1 appointments and 2 time off", out.getvalue())
+        self.assertEqual(2, Appointment.objects.count())
+        self.assertEqual(2, TimeOff.objects.count())
+
+    def test_jsonl_dry_run(self):
+        rows = [{"kind": "timeoff", "manager": self.manager.id, "start": "2017-02-08T10:00:00Z",
+                 "end": "2017-02-08T11:00:00Z"}, "not an object", {"kind": "holiday"}]
+        path = self.write("\n".join(json.dumps(row) for row in rows) + "\n", suffix=".jsonl")
+        version = self.version()
+        out = StringIO()
+        call_command("import_schedule", path, "--dry-run", stdout=out)
+        self.assertIn("Line 2: Could not read the row.", out.getvalue())
+        self.assertIn("Checked 0 appointments and 1 time off", out.getvalue())
+        self.assertEqual(0, TimeOff.objects.count())
+        self.assertEqual(version, self.version())
+
+    def test_nothing_imported_keeps_the_version(self):
+        text = self.csv(self.appointment("not a date", "2017-02-08T10:30:00"))
+        version = self.version()
+        self.client.force_login(self.user)
+        self.client.post("/import", {"file": SimpleUploadedFile("semester.csv", text.encode())})
+        self.assertEqual(version, self.version())
+
+    def test_command_closes_the_file(self):
+        path = self.write(self.csv(self.appointment("2017-02-08T10:00:00", "2017-02-08T10:30:00")))
+        with warnings.catch_warnings(record=True) as caught:
+            warnings.simplefilter("always", ResourceWarning)
+            call_command("import_schedule", path, stdout=StringIO())
+            gc.collect()
+        self.assertEqual([], [str(warning.message) for warning in caught if warning.category is ResourceWarning])
+
+    def test_clears_cached_availability(self):
+        day = datetime.date(2017, 2, 8)
+        before = cache.get_available_in_week(self.manager, day, self.appt_type)
+        path = self.write(self.csv(self.appointment("2017-02-08T10:00:00", "2017-02-08T10:30:00")))
+        call_command("import_schedule", path, stdout=StringIO())
+        self.assertNotEqual(before, cache.get_available_in_week(self.manager, day, self.appt_type))
+
+    def test_upload_only_into_own_schedule(self):
+        other = create_coach("other@buffalo.edu").appt_manager
+        text = self.csv(self.appointment("2017-02-08T10:00:00", "2017-02-08T10:30:00"),
+                        self.appointment("2017-02-08T11:00:00", "2017-02-08T11:30:00", manager=other.id))
+        self.client.force_login(self.user)
+        response = self.client.post("/import", {"file": SimpleUploadedFile("semester.csv", text.encode())}).json()
+        self.assertEqual(1, response["appointments"])
+        self.assertEqual([{"line": 3, "message": "You can only import into your own schedule."}], response["errors"])
+        self.assertEqual(0, other.appointments.count())
+
+
+class ScheduleFeedTests(TestCase):
+
+    def setUp(self):
+        self.user = create_coach()
+        self.manager = self.user.appt_manager
+        self.appt_type = AppointmentType.objects.create(manager=self.manager, name="Checkup", minutes=30)
+        Appointment.objects.create(manager=self.manager, type=self.appt_type, name="Student, Jr.",
+                                   email="student@buffalo.edu", start=utc(2017, 2, 8, 10), end=utc(2017, 2, 8, 10, 30))
+        TimeOff.objects.create(manager=self.manager, reason="Dentist", start=utc(2017, 2, 9, 12), end=utc(2017, 2, 9, 13))
+        self.url = "/%s/schedule.ics" % self.user.id
+
+    def get(self, **headers):
+        response = self.client.get(self.url, **headers)
+        return response, b"".join(response.streaming_content).decode() if response.streaming else ""
+
+    def test_streams_events(self):
+        response, body = self.get()
+        self.assertEqual("text/calendar; charset=utf-8", response["Content-Type"])
+        self.assertTrue(body.startswith("BEGIN:VCALENDAR\r\n"))
+        self.assertTrue(body.endswith("END:VCALENDAR\r\n"))
+        self.assertIn("DTSTART:20170208T100000Z\r\nDTEND:20170208T103000Z\r\nSUMMARY:Booked\r\n", body)
+        self.assertIn("SUMMARY:Time Off\r\n", body)
+        self.assertNotIn("Student", body)
+
+    def test_owner_sees_details(self):
+        self.client.force_login(self.user)
+        _, body = self.get()
+        self.assertIn("SUMMARY:Checkup: Student\\, Jr.\r\n", body)
+        self.assertIn("SUMMARY:Time Off: Dentist\r\n", body)
+
+    def test_not_modified(self):
+        response, _ = self.get()
+        with self.assertNumQueries(1):
+            self.assertEqual(304, self.client.get(self.url, HTTP_IF_NONE_MATCH=response["ETag"]).status_code)
+        self.assertEqual(304, self.client.get(self.url, HTTP_IF_MODIFIED_SINCE=response["Last-Modified"]).status_code)
+
+    def test_changes_end_the_etag(self):
+        response, _ = self.get()
+        TimeOff.objects.filter(manager=self.manager).delete()
+        changed, body = self.get(HTTP_IF_NONE_MATCH=response["ETag"])
+        self.assertEqual(200, changed.status_code)
+        self.assertNotIn("Time Off", body)
+
+    def test_unknown_coach(self):
+        self.assertEqual(404, self.client.get("/999/schedule.ics").status_code)
+
+    def test_folds_long_lines(self):
+        from lib.ical import fold
+        folded = fold("SUMMARY:" + "é" * 80)
+        self.assertTrue(all(len(line.encode()) <= 75 for line in folded.split("\r\n")))
+        self.assertEqual("SUMMARY:" + "é" * 80, folded.replace("\r\n ", "")[:-2])
+
+
+class SerializerTests(TestCase):
+
+    def test_formatter_matches_strftime(self):
+        from lib.time import format_fc_datetime
+        rnd = random.Random(3)
+        for _ in range(500):
+            value = utc(2017, 1, 1) + datetime.timedelta(minutes=rnd.randrange(10 ** 6), seconds=rnd.randrange(60))
+            self.assertEqual(value.strftime("%Y/%m/%d %H:%M"), format_fc_datetime(value))
+
+    def test_events(self):
+        from appointments import serializers
+        row = (7, utc(2017, 2, 8, 10), utc(2017, 2, 8, 10, 30), "Student", "Checkup")
+        self.assertEqual([{"id": "appointment-7", "title": "Checkup: Student", "start": "2017/02/08 10:00",
+                           "end": "2017/02/08 10:30"}], serializers.appointment_events([row]))
+        self.assertEqual({"id": "timeoff-7", "title": "Time Off: Trip", "start": "2017/02/08 10:00",
+                          "end": "2017/02/08 10:30"}, serializers.time_off_events([row[:3] + ("Trip",)])[0])
+
+    def test_encoders_agree(self):
+        from appointments.serializers import JsonResponse
+        data = {"response": "ok", "date": datetime.date(2017, 2, 8), "events": [{"title": "Café"}]}
+        with override_settings(JSON_ENCODER="json"):
+            expected = json.loads(JsonResponse(data).content)
+        with override_settings(JSON_ENCODER="auto"):
+            self.assertEqual(expected, json.loads(JsonResponse(data).content))
+        with self.assertRaises(TypeError):
+            JsonResponse([1, 2])
+
+
+class ScheduleETagTests(TestCase):
+
+    def setUp(self):
+        self.user = create_coach()
+        self.manager = self.user.appt_manager
+        self.appt_type = AppointmentType.objects.create(manager=self.manager, minutes=30)
+        self.client.force_login(self.user)
+        self.appts_url = "/load/appts/%s?date=02/08/2017&appt_id=%s" % (self.user.id, self.appt_type.id)
+
+    def assertRevalidates(self, url, private=True, queries=3):
+        response = self.client.get(url)
+        self.assertEqual(200, response.status_code)
+        self.assertIn("no-cache", response["Cache-Control"])
+        self.assertIn("private" if private else "public", response["Cache-Control"])
+        # The version lookup, after the session and user for the logged in views
+        with self.assertNumQueries(queries):
+            self.assertEqual(304, self.client.get(url, HTTP_IF_NONE_MATCH=response["ETag"]).status_code)
+        return response["ETag"]
+
+    def test_endpoints_answer_304(self):
+        for url in ("/%s/today" % self.user.id, "/time/%s/today" % self.user.id, "/time/month",
+                    "/time/month?start=2017-02-05&end=2017-02-12"):
+            self.assertRevalidates(url)
+        self.assertRevalidates(self.appts_url, private=False, queries=1)
+
+    def test_available_appts_by_get(self):
+        response = self.client.get(self.appts_url).json()
+        self.assertEqual("ok", response["response"])
+        self.assertTrue(response["available"])
+
+    def test_every_change_ends_the_etag(self):
+        changes = [
+            lambda: Appointment.objects.create(manager=self.manager, type=self.appt_type, start=utc(2017, 2, 8, 10),
+                                               end=utc(2017, 2, 8, 10, 30)),
+            lambda: TimeOff.objects.create(manager=self.manager, start=utc(2017, 2, 9), end=utc(2017, 2, 10)),
+            lambda: AppointmentType.objects.create(manager=self.manager, minutes=60),
+            lambda: WorkingBreak.objects.create(manager=self.manager, day="wed", start=datetime.time(12),
+                                                end=datetime.time(13)),
+            lambda: self.client.post("/hours/save", dict(("%s_%s" % (day, edge), time) for day, _ in
+                                                         UserAppointmentManager.DAYS for edge, time in
+                                                         (("start", "08:00 AM"), ("end", "04:00 PM")))),
+        ]
+        etag = self.client.get(self.appts_url)["ETag"]
+        for change in changes:
+            change()
+            response = self.client.get(self.appts_url, HTTP_IF_NONE_MATCH=etag)
+            self.assertEqual(200, response.status_code)
+            etag = response["ETag"]
+
+    def test_errors_have_no_etag(self):
+        response = self.client.get("/time/month?start=2017-02-05&end=2018-02-12")
+        self.assertEqual(400, response.status_code)
+        self.assertFalse(response.has_header("ETag"))
+
+    def test_new_manager_with_an_id(self):
+        other = User.objects.create_user("other@buffalo.edu", "Other", "Coach", password="password")
+        UserAppointmentManager(id=self.manager.id + 100, user=other).save()
+        self.assertTrue(UserAppointmentManager.objects.filter(id=self.manager.id + 100).exists())
+
+    def test_saving_a_stale_copy_keeps_the_version(self):
+        stale = UserAppointmentManager.objects.get(pk=self.manager.pk)
+        UserAppointmentManager.bump_version(self.manager.pk)
+        version = UserAppointmentManager.objects.get(pk=self.manager.pk).version
+        stale.save()
+        self.assertGreater(UserAppointmentManager.objects.get(pk=self.manager.pk).version, version)
+
+
+class ASGIDeploymentTests(SimpleTestCase):
+
+    def request(self, path):
+        from venture_schedule.asgi import application
+
+        async def send():
+            communicator = ApplicationCommunicator(application, {
+                "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1", "method": "GET",
+                "scheme": "http", "path": path, "raw_path": path.encode(), "query_string": b"", "root_path": "",
+                "headers": [(b"host", b"testserver")], "client": ("127.0.0.1", 1), "server": ("testserver", 80)})
+            await communicator.send_input({"type": "http.request", "body": b"", "more_body": False})
+            start = await communicator.receive_output(5)
+            body = await communicator.receive_output(5)
+            await communicator.wait(5)
+            return start["status"], body["body"]
+        # A loop of its own like uvicorn's, async_to_sync would run the sync code on the test's thread
+        return asyncio.run(send())
+
+    def test_streaming_views_are_not_served(self):
+        # No queries either, the test has no database
+        for path in ("/1/schedule.ics", "/1/events"):
+            self.assertEqual((404, b"Served by the WSGI deployment."), self.request(path))
+
+    def test_every_request_gets_its_own_sync_thread(self):
+        threads = []
+
+        async def application(scope, receive, send):
+            threads.append(await sync_to_async(threading.get_ident)())
+
+        async def requests():
+            middleware = aio.ThreadSensitiveMiddleware(application)
+            await asyncio.gather(middleware({}, None, None), middleware({}, None, None))
+            threads.append(await sync_to_async(threading.get_ident)())
+        asyncio.run(requests())
+        self.assertEqual(3, len(set(threads)))
+
+class AsyncViewTests(TestCase):
+
+    def setUp(self):
+        self.user = create_coach()
+        self.appt_type = AppointmentType.objects.create(manager=self.user.appt_manager, minutes=30)
+        self.appts_url = "/load/appts/%s?date=02/08/2017&appt_id=%s" % (self.user.id, self.appt_type.id)
+        self.async_client = AsyncClient()
+        self.client.force_login(self.user)
+
+    async def test_available_appts(self):
+        response = await self.async_client.get(self.appts_url)
+        self.assertEqual("ok", json.loads(response.content)["response"])
+        # AsyncClient takes header names as they're sent
+        response = await self.async_client.get(self.appts_url, **{"if-none-match": response["ETag"]})
+        self.assertEqual(304, response.status_code)
+
+        other = await sync_to_async(create_coach)("other@buffalo.edu")
+        response = await self.async_client.get("/load/appts/%s?date=02/08/2017&appt_id=%s" %
+                                               (other.id, self.appt_type.id))
+        self.assertEqual("error", json.loads(response.content)["response"])
+
+    async def test_today_needs_login(self):
+        url = "/%s/today" % self.user.id
+        self.assertEqual(302, (await self.async_client.get(url)).status_code)
+
+        self.async_client.cookies = self.client.cookies
+        response = await self.async_client.get(url)
+        self.assertEqual(200, response.status_code)
+        self.assertEqual([], json.loads(response.content))
+
+
+@override_settings(SCHEDULE_EVENTS_KEEPALIVE=0.01, SCHEDULE_EVENTS_MAX_SECONDS=5)
+class ScheduleEventsTests(TestCase):
+
+    def setUp(self):
+        self.user = create_coach()
+        self.manager = self.user.appt_manager
+
+    def open_stream(self):
+        response = self.client.get("/%s/events" % self.user.id)
+        self.assertEqual("text/event-stream", response["Content-Type"])
+        stream = iter(response.streaming_content)
+        self.addCleanup(response.close)
+        self.assertIn(b"event: ready", next(stream))
+        return stream
+
+    def next_change(self, stream):
+        for chunk in stream:
+            if chunk.startswith(b"event: change"):
+                return json.loads(chunk.decode().split("data: ", 1)[1])
+
+    def test_streams_changes(self):
+        stream = self.open_stream()
+        self.assertEqual(b": keepalive\n\n", next(stream))
+        events.get_broker().publish(events.channel_name(self.manager.id),
+                                    {"kind": "appointment", "action": "created", "id": "appointment-1",
+                                     "title": "Checkup: Student", "start": "2017/02/08 10:00", "end": "2017/02/08 10:30"})
+        # Students only see that the time is taken
+        self.assertEqual({"kind": "appointment", "action": "created", "id": "appointment-1",
+                          "start": "2017/02/08 10:00", "end": "2017/02/08 10:30"}, self.next_change(stream))
+
+    def test_owner_sees_details(self):
+        self.client.force_login(self.user)
+        stream = self.open_stream()
+        events.get_broker().publish(events.channel_name(self.manager.id), {"kind": "timeoff", "title": "Time Off: Trip"})
+        self.assertEqual("Time Off: Trip", self.next_change(stream)["title"])
+
+    def test_overflow_asks_for_a_reload(self):
+        with override_settings(SCHEDULE_EVENTS_QUEUE_SIZE=1):
+            stream = self.open_stream()
+            for number in range(3):
+                events.get_broker().publish(events.channel_name(self.manager.id), {"kind": "hours", "number": number})
+        self.assertEqual({"kind": "schedule", "action": "changed"}, self.next_change(stream))
+
+    def test_unknown_coach(self):
+        self.assertEqual(404, self.client.get("/999/events").status_code)
+
+    def test_pages_poll_unless_live(self):
+        self.assertContains(self.client.get("/?vc=%s" % self.user.id), "{live: false, pollSeconds: 60}")
+        with override_settings(SCHEDULE_EVENTS_LIVE=True):
+            self.assertContains(self.client.get("/?vc=%s" % self.user.id), "{live: true, pollSeconds: 60}")
+
+
+class ScheduleEventsCommitTests(TransactionTestCase):
+
+    def test_signals_publish_after_commit(self):
+        manager = create_coach().appt_manager
+        appt_type = AppointmentType.objects.create(manager=manager, name="Checkup", minutes=30)
+        subscription = events.get_broker().subscribe(events.channel_name(manager.id))
+        self.addCleanup(subscription.close)
+
+        appointment = Appointment.objects.create(manager=manager, type=appt_type, name="Student",
+                                                 start=utc(2017, 2, 8, 10), end=utc(2017, 2, 8, 10, 30))
+        self.assertEqual({"kind": "appointment", "action": "created", "id": "appointment-%s" % appointment.id,
+                          "title": "Checkup: Student", "start": "2017/02/08 10:00", "end": "2017/02/08 10:30"},
+                         subscription.get(timeout=0))
+        appointment.delete()
+        self.assertEqual("deleted", subscription.get(timeout=0)["action"])
+
+        with transaction.atomic():
+            manager.save()
+            self.assertIsNone(subscription.get(timeout=0))
+        self.assertEqual({"kind": "hours", "action": "changed"}, subscription.get(timeout=0))
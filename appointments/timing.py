@@ -0,0 +1,98 @@
+import threading
+import time
+from collections import OrderedDict, deque
+from contextvars import ContextVar
+
+from django.conf import settings
+
+# The RequestStats of the request being handled, set by RequestTimingMiddleware
+current_stats = ContextVar("current_stats", default=None)
+
+
+class RequestStats(object):
+
+    __slots__ = ("queries", "db_time", "template_time", "view_time")
+
+    def __init__(self):
+        self.queries = 0
+        self.db_time = 0.0
+        self.template_time = 0.0
+        self.view_time = 0.0
+
+    def server_timing(self):
+        return 'db;dur=%.2f;desc="%s queries", tpl;dur=%.2f, view;dur=%.2f' % (
+            self.db_time * 1000, self.queries, self.template_time * 1000, self.view_time * 1000)
+
+
+def record_query(execute, sql, params, many, context):
+    """
+    Execute wrapper that counts and times the queries of the current request.
+    """
+    stats = current_stats.get()
+    began = time.time()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        if stats is not None:
+            stats.queries += 1
+            stats.db_time += time.time() - began
+
+
+def install_query_hook(sender, connection, **kwargs):
+    """
+    connection_created receiver that puts record_query on every new connection. The async views query
+    from other threads than the middleware runs on, so it can't wrap the connections itself.
+    """
+    if record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(record_query)
+
+
+def record_template(seconds):
+    stats = current_stats.get()
+    if stats is not None:
+        stats.template_time += seconds
+
+
+class TimingSummary(object):
+    """
+    The last `size` requests per URL name, kept in memory for the admin summary.
+    """
+
+    def __init__(self, size=200):
+        self.size = size
+        self.samples = {}
+        self.lock = threading.Lock()
+
+    def add(self, url_name, stats):
+        sample = (stats.queries, stats.db_time, stats.template_time, stats.view_time)
+        with self.lock:
+            if url_name not in self.samples:
+                self.samples[url_name] = deque(maxlen=self.size)
+            self.samples[url_name].append(sample)
+
+    def clear(self):
+        with self.lock:
+            self.samples.clear()
+
+    def summary(self):
+        with self.lock:
+            samples = {name: list(values) for name, values in self.samples.items()}
+
+        summary = OrderedDict()
+        for name in sorted(samples):
+            values = samples[name]
+            count = len(values)
+            views = sorted(value[3] for value in values)
+            summary[name] = {
+                "requests": count,
+                "avg_queries": sum(value[0] for value in values) / count,
+                "max_queries": max(value[0] for value in values),
+                "avg_db_ms": sum(value[1] for value in values) / count * 1000,
+                "avg_template_ms": sum(value[2] for value in values) / count * 1000,
+                "avg_view_ms": sum(views) / count * 1000,
+                "p95_view_ms": views[min(count - 1, int(count * 0.95))] * 1000,
+            }
+        return summary
+
+
+summary = TimingSummary(getattr(settings, "REQUEST_TIMING_SAMPLES", 200))
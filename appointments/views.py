@@ -1,17 +1,33 @@
+import codecs
 import datetime
+import functools
 import json
+import time
 import urllib
 
-import pytz
 from django.utils import timezone
-from appointments.models import User, TimeOff, AppointmentType, Appointment
+from asgiref.sync import sync_to_async
+from appointments import aio, assets, cache, events, fragments, timing, serializers
+from appointments.database import read_only
+from appointments.booking import book_appointment, BookingError
+from appointments.importer import import_schedule, guess_format, ScheduleImportError
+from appointments.serializers import JsonResponse
+from appointments.models import User, TimeOff, AppointmentType, Appointment, UserAppointmentManager
+from django.conf import settings
 from django.contrib import messages
+from django.contrib.admin.views.decorators import staff_member_required
 from django.contrib.auth import logout, authenticate, login
 from django.contrib.auth.decorators import login_required
 from django.db.models import Q
-from django.http import JsonResponse
+from django.http import FileResponse, StreamingHttpResponse, Http404
 from django.shortcuts import render, redirect
-from lib.time import get_post, check_dictionary, get_time, parse_bootstrap_datetimepicker, get_month_day_range
+from django.utils.cache import patch_cache_control, patch_vary_headers
+from django.views.decorators import http
+from lib import ical, recurrence
+from lib.hours import WeeklyHours
+from lib.time import get_post, check_dictionary, parse_bootstrap_datetimepicker, get_month_day_range, parse_slot, \
+    parse_calendar_window
+from lib.zones import schedule_zone
 
 
 def index(request):
@@ -35,12 +51,10 @@ def index(request):
         if not user:
             return JsonResponse({"response": "error", "message": "Could not find the user."})
 
-        start_unaware = datetime.datetime.strptime(data["start"].replace("th", "").replace("nd", "").replace("rd", ""),
-                                                   "%b %d %I:%M %p")
-        start_unaware = start_unaware.replace(year=2017)
-        end_unaware = datetime.datetime.strptime(data["end"].replace("th", "").replace("nd", "").replace("rd", ""),
-                                                 "%b %d %I:%M %p")
-        end_unaware = end_unaware.replace(year=2017)
+        try:
+            start, end = parse_slot(data["start"], schedule_zone()), parse_slot(data["end"], schedule_zone())
+        except (KeyError, ValueError):
+            return JsonResponse({"response": "error", "message": "Could not read the time of the appointment."})
 
         type_id = data["type_id"]
         type = user.appt_manager.appt_types.filter(id=int(type_id)).first()
@@ -48,13 +62,11 @@ def index(request):
         if not type:
             return JsonResponse({"response": "error", "message": "Could not find the type."})
 
-        time = pytz.utc
-        start = time.localize(start_unaware)
-        end = time.localize(end_unaware)
+        try:
+            book_appointment(user.appt_manager, type, start, end, name, email)
+        except BookingError as e:
+            return JsonResponse({"response": "error", "message": str(e)})
 
-        appointment = Appointment.objects.create(manager=user.appt_manager, type=type, start=start, end=end,
-                                                 name=name, email=email)
-        appointment.save()
         messages.success(request, "Created the appointment successfully.")
         return JsonResponse({"response": "ok"})
 
@@ -63,13 +75,18 @@ def index(request):
     except:
         return redirect("index")
 
+    coaches = User.objects.filter(type__contains="h__").select_related("appt_manager")
     if user_id == 0:
-        user = User.objects.filter(type__contains="h__").first()
+        user = coaches.first()
     else:
-        user = User.objects.filter(type__contains="h__", id=user_id).first()
+        user = coaches.filter(id=user_id).first()
+    manager = getattr(user, "appt_manager", None)
 
-    return render(request, "dashboard/appt/index.html", {"fc_user": user,
-                                                         "users": User.objects.filter(type__contains="h__", private=False).all()})
+    # The coach dropdown and the type list are cached fragments, the querysets only run when they miss
+    context = {"fc_user": user, "users": User.objects.filter(type__contains="h__", private=False).all()}
+    context.update(fragments.index_context(manager.id if manager else None))
+    context.update(schedule_events_context())
+    return render(request, "dashboard/appt/index.html", context)
 
 
 @login_required
@@ -82,14 +99,20 @@ def logout_view(request):
 def add_time_off(request):
 
     if request.method == "POST":
-        data = get_post(request, params=["reason", "time"])
-        if check_dictionary(data):
-            datetimes = parse_bootstrap_datetimepicker(data["time"])
+        data = get_post(request, params=["reason", "time", "repeat", "until"])
+        if check_dictionary(data, exclude=["repeat", "until"]):
+            datetimes = parse_bootstrap_datetimepicker(data["time"], schedule_zone())
 
             if not datetimes:
                 messages.error(request, "Please make sure the date range input is filled out correctly.")
                 return redirect("manage")
 
+            try:
+                rule = recurrence.form_rule(data["repeat"], data["until"])
+            except ValueError as e:
+                messages.error(request, str(e))
+                return redirect("manage")
+
             if datetimes["start"] < timezone.now():
                 print(datetimes["start"])
                 print(timezone.now())
@@ -97,7 +120,7 @@ def add_time_off(request):
                 return redirect("manage")
 
             time_off = TimeOff.objects.create(manager=request.user.appt_manager, reason=data["reason"],
-                                              start=datetimes["start"], end=datetimes["end"])
+                                              start=datetimes["start"], end=datetimes["end"], rrule=rule)
             time_off.save()
             messages.success(request, "Successfully added the time off.")
         else:
@@ -115,6 +138,28 @@ def delete_time_off(request, time_id):
     return redirect("manage")
 
 
+@login_required
+def skip_time_off(request, time_id):
+
+    if request.method == "POST":
+        time_off = request.user.appt_manager.exceptions.exclude(rrule="").filter(id=int(time_id)).first()
+        try:
+            start = next(iter(recurrence.parse_exdates(request.POST.get("occurrence", ""))))
+        except (StopIteration, ValueError):
+            start = None
+
+        # Only an occurrence the series really has
+        if not time_off or not start or (start, start + (time_off.end - time_off.start)) not in \
+                time_off.occurrences(start, start + datetime.timedelta(seconds=1)):
+            messages.error(request, "Could not find that time off.")
+            return redirect("manage")
+
+        time_off.skip_occurrence(start)
+        messages.success(request, "Skipped that time off.")
+
+    return redirect("manage")
+
+
 @login_required
 def save_normal_hours(request):
 
@@ -125,11 +170,15 @@ def save_normal_hours(request):
             messages.error(request, "Please make sure that everything is filled out correctly.")
             return redirect("manage")
 
+        try:
+            hours = WeeklyHours.parse(data)
+        except ValueError:
+            messages.error(request, "Please make sure that everything is filled out correctly.")
+            return redirect("manage")
+
         appt_manager = request.user.appt_manager
         # Run through list of days and update
-        for key, value in data.items():
-            time = get_time(value)
-            setattr(appt_manager, key, time)
+        hours.apply(appt_manager)
         appt_manager.save()
         messages.success(request, "Successfully updated your saved times!")
 
@@ -139,10 +188,6 @@ def save_normal_hours(request):
 @login_required
 def manage(request):
 
-    time_before = timezone.now() - datetime.timedelta(weeks=2)
-    for appointment in Appointment.objects.filter(end__lt=time_before):
-        appointment.delete()
-
     if request.method == "POST":
         json_str = request.body.decode(encoding='UTF-8')
         data = json.loads(json_str)
@@ -153,12 +198,10 @@ def manage(request):
         if len(name) < 3 or len(email) < 3:
             return JsonResponse({"response": "error", "message": "Make sure everything is filled out."})
 
-        start_unaware = datetime.datetime.strptime(data["start"].replace("th", "").replace("nd", "").replace("rd", ""),
-                                                   "%b %d %I:%M %p")
-        start_unaware = start_unaware.replace(year=2017)
-        end_unaware = datetime.datetime.strptime(data["end"].replace("th", "").replace("nd", "").replace("rd", ""),
-                                                 "%b %d %I:%M %p")
-        end_unaware = end_unaware.replace(year=2017)
+        try:
+            start, end = parse_slot(data["start"], schedule_zone()), parse_slot(data["end"], schedule_zone())
+        except (KeyError, ValueError):
+            return JsonResponse({"response": "error", "message": "Could not read the time of the appointment."})
 
         type_id = data["type_id"]
         type = request.user.appt_manager.appt_types.filter(id=int(type_id)).first()
@@ -166,17 +209,21 @@ def manage(request):
         if not type:
             return JsonResponse({"response": "error", "message": "Could not find the type."})
 
-        time = pytz.utc
-        start = time.localize(start_unaware)
-        end = time.localize(end_unaware)
+        # Coaches can book standing appointments
+        try:
+            rule = recurrence.form_rule(data.get("repeat", ""), data.get("until", ""))
+        except ValueError as e:
+            return JsonResponse({"response": "error", "message": str(e)})
+
+        try:
+            book_appointment(request.user.appt_manager, type, start, end, name, email, rrule=rule)
+        except BookingError as e:
+            return JsonResponse({"response": "error", "message": str(e)})
 
-        appointment = Appointment.objects.create(manager=request.user.appt_manager, type=type, start=start, end=end,
-                                                 name=name, email=email)
-        appointment.save()
         messages.success(request, "Created the appointment successfully.")
         return JsonResponse({"response": "ok"})
 
-    return render(request, "dashboard/appt/manage.html")
+    return render(request, "dashboard/appt/manage.html", schedule_events_context())
 
 
 @login_required
@@ -209,33 +256,148 @@ def delete_appt_type(request, type_id):
 
 
 @login_required
-def get_todays_appt_for_user(request, user_id):
+def import_schedule_upload(request):
 
-    user = User.objects.filter(id=int(user_id)).first()
+    if request.method != "POST":
+        return JsonResponse({"response": "error", "message": "The call must be a POST."})
+
+    upload = request.FILES.get("file")
+    if not upload:
+        return JsonResponse({"response": "error", "message": "Please choose a file to import."})
+
+    def open_lines():
+        upload.seek(0)
+        return codecs.iterdecode(upload, "utf-8")
+
+    try:
+        result = import_schedule(open_lines, guess_format(upload.name), manager=request.user.appt_manager,
+                                 dry_run=bool(request.POST.get("dry_run")))
+    except (ScheduleImportError, UnicodeDecodeError) as e:
+        return JsonResponse({"response": "error", "message": str(e)})
+
+    return JsonResponse({"response": "ok", "appointments": result["appointments"], "time_off": result["time_off"],
+                         "errors": [{"line": line, "message": message} for line, message in result["errors"]]})
+
+
+def get_schedule_state(request, user_id):
+    """
+    The one query needed to answer a conditional GET for a user's schedule, kept on the request for the view.
+    """
+    if not hasattr(request, "schedule_state"):
+        request.schedule_state = UserAppointmentManager.objects.filter(user_id=int(user_id)) \
+            .values("id", "version", "schedule_updated", "user__type", "user__first_name", "user__last_name").first()
+    return request.schedule_state
+
+
+def schedule_etag(request, user_id, *extra):
+    """
+    :return: The manager's schedule version with anything else the response depends on, or None for no ETag
+    """
+    state = get_schedule_state(request, user_id)
+    if not state or request.method not in ("GET", "HEAD"):
+        return None
+    return "-".join(str(part) for part in (state["id"], state["version"]) + extra)
+
+
+def todays_etag(request, user_id):
+    # "Today" moves on at midnight without the schedule changing
+    return schedule_etag(request, user_id, timezone.localtime(timezone.now()).date().isoformat())
+
+
+def month_etag(request):
+    if "start" in request.GET or "end" in request.GET:
+        return schedule_etag(request, request.user.id)
+    return schedule_etag(request, request.user.id, timezone.now().date().isoformat()[:7])
+
+
+def condition(etag_func=None, last_modified_func=None):
+    """
+    django.views.decorators.http.condition that leaves the ETag and Last-Modified off error responses.
+    """
+    def decorator(view):
+        conditional = http.condition(etag_func=etag_func, last_modified_func=last_modified_func)(view)
+
+        @functools.wraps(view)
+        def wrapper(request, *args, **kwargs):
+            response = conditional(request, *args, **kwargs)
+            if not aio.has_validators(response):
+                for header in ("ETag", "Last-Modified"):
+                    if response.has_header(header):
+                        del response[header]
+            return response
+        return wrapper
+    return decorator
+
+
+def revalidate(response, private=False):
+    """
+    Lets browsers keep the response, as long as they check the ETag before using it again.
+    """
+    if private:
+        patch_cache_control(response, no_cache=True, private=True)
+    else:
+        patch_cache_control(response, no_cache=True, public=True)
+    patch_vary_headers(response, ["Cookie"])
+    return response
+
+
+def get_todays_events(user_id, time_off=False):
+    """
+    :return: Today's appointments (or time off) of the user, None if there's no such user
+    """
+    user = User.objects.filter(id=int(user_id)).select_related("appt_manager").first()
     if not user:
+        return None
+    return user.appt_manager.todays_timeoff if time_off else user.appt_manager.todays_appointments
+
+
+@read_only
+@aio.login_required
+@aio.condition(etag_func=todays_etag)
+async def get_todays_appt_for_user(request, user_id):
+
+    todays = await sync_to_async(get_todays_events)(user_id)
+    if todays is None:
         return JsonResponse({"response": "error", "message": "Could not find user."})
 
-    return JsonResponse(user.appt_manager.todays_appointments, safe=False)
+    return revalidate(JsonResponse(todays, safe=False), private=True)
 
 
-@login_required
-def get_todays_timeoff_for_user(request, user_id):
+@read_only
+@aio.login_required
+@aio.condition(etag_func=todays_etag)
+async def get_todays_timeoff_for_user(request, user_id):
 
-    user = User.objects.filter(id=int(user_id)).first()
-    if not user:
+    todays = await sync_to_async(get_todays_events)(user_id, time_off=True)
+    if todays is None:
         return JsonResponse({"response": "error", "message": "Could not find user."})
 
-    return JsonResponse(user.appt_manager.todays_timeoff, safe=False)
+    return revalidate(JsonResponse(todays, safe=False), private=True)
 
 
-def get_available_appts(request, user_id):
+def get_appt_type(user_id, type_id):
+    """
+    :return: The appointment type with its manager, if the user is a coach and the type is theirs
+    """
+    try:
+        return AppointmentType.objects.select_related("manager").filter(
+            id=int(type_id), manager__user__id=int(user_id), manager__user__type__contains="h__").first()
+    except (TypeError, ValueError):
+        return None
 
-    if request.method != "POST":
-        return JsonResponse({"response": "error", "message": "The call must be a POST."})
 
-    json_str = request.body.decode(encoding='UTF-8')
-    data = json.loads(json_str)
-    print(data)
+@read_only
+@aio.condition(etag_func=schedule_etag)
+async def get_available_appts(request, user_id):
+
+    # GET so browsers can revalidate it, the JSON body POST is still taken for older pages
+    if request.method == "GET":
+        data = request.GET
+    elif request.method == "POST":
+        json_str = request.body.decode(encoding='UTF-8')
+        data = json.loads(json_str)
+    else:
+        return JsonResponse({"response": "error", "message": "The call must be a GET or POST."})
 
     date = data.get("date", None)
     if not date or len(date.split("/")) != 3:
@@ -243,22 +405,13 @@ def get_available_appts(request, user_id):
     date = date.split("/")
     date = date[2] + "-" + date[0] + "-" + date[1]
 
-    user = User.objects.filter(type__contains="h__", id=int(user_id)).first()
-    if not user:
-        return JsonResponse({"response": "error", "message": "Invalid user."})
-
-    appt_type = None
-
-    try:
-        appt_type = user.appt_manager.appt_types.filter(id=int(data["appt_id"])).first()
-    except:
-        pass
+    appt_type = await sync_to_async(get_appt_type)(user_id, data.get("appt_id"))
     if not appt_type:
         return JsonResponse({"response": "error", "message": "Invalid appointment type."})
 
     date_in_week = datetime.datetime.strptime(date, "%Y-%m-%d").date()
 
-    available = user.appt_manager.get_available_in_week(date_in_week, appt_type)
+    available = await cache.aget_available_in_week(appt_type.manager, date_in_week, appt_type)
 
     interval = 10
 
@@ -269,22 +422,179 @@ def get_available_appts(request, user_id):
     elif appt_type.minutes > 50:
         interval = 30
 
-    return JsonResponse({"response": "ok", "date": date, "available": available, "interval": interval})
+    return revalidate(JsonResponse({"response": "ok", "date": date, "available": available, "interval": interval}))
 
 
-@login_required
-def get_appointments_for_month(request):
+def next_quarter_hour():
+    """
+    :return: Where /load/next starts looking when it isn't given a start. It stays the same for a quarter of
+             an hour, like the responses and their ETag.
+    """
+    now = timezone.now().replace(second=0, microsecond=0)
+    return now + datetime.timedelta(minutes=-now.minute % 15 or 15)
+
+
+def next_etag(request, user_id):
+    return schedule_etag(request, user_id, next_quarter_hour().strftime("%Y%m%d%H%M"), request.GET.urlencode())
+
+
+def next_available(user_id, type_id, start, limit):
+    appt_type = get_appt_type(user_id, type_id)
+    if not appt_type:
+        return None
+    return list(appt_type.manager.iter_available(start, appt_type, limit=limit))
+
 
-    events = []
-    appointments = request.user.appt_manager.appointments.all()
-    exceptions = request.user.appt_manager.exceptions.all()
+@read_only
+@aio.condition(etag_func=next_etag)
+async def get_next_available(request, user_id):
 
-    for appt in appointments:
-        events.append(appt.fc_serialize)
-    for appt in exceptions:
-        events.append(appt.fc_serialize)
+    try:
+        limit = int(request.GET.get("limit", 5))
+    except ValueError:
+        limit = 0
+    if not 0 < limit <= settings.NEXT_AVAILABLE_MAX:
+        return JsonResponse({"response": "error", "message": "'limit' has to be between 1 and %s."
+                             % settings.NEXT_AVAILABLE_MAX}, status=400)
+
+    start = next_quarter_hour()
+    if "start" in request.GET:
+        try:
+            start = max(parse_slot(request.GET["start"], schedule_zone()), start)
+        except ValueError:
+            return JsonResponse({"response": "error", "message": "Invalid 'start' argument."}, status=400)
+
+    available = await sync_to_async(next_available)(user_id, request.GET.get("appt_id"), start, limit)
+    if available is None:
+        return JsonResponse({"response": "error", "message": "Invalid appointment type."})
+
+    return revalidate(JsonResponse({"response": "ok", "available": available}))
 
-    return JsonResponse(events, safe=False)
+
+@read_only
+@login_required
+@condition(etag_func=month_etag)
+def get_appointments_for_month(request):
+
+    if "start" in request.GET or "end" in request.GET:
+        window = parse_calendar_window(request.GET.get("start"), request.GET.get("end"), schedule_zone())
+        if not window or window[1] <= window[0]:
+            return JsonResponse({"response": "error", "message": "Invalid 'start' or 'end' argument."}, status=400)
+    else:
+        first_day, last_day = get_month_day_range(timezone.now().date())
+        window = parse_calendar_window(first_day.isoformat(), (last_day + datetime.timedelta(days=1)).isoformat(),
+                                       schedule_zone())
+
+    if window[1] - window[0] > datetime.timedelta(days=settings.CALENDAR_MAX_WINDOW_DAYS):
+        return JsonResponse({"response": "error", "message": "Ask for at most %s days at a time."
+                             % settings.CALENDAR_MAX_WINDOW_DAYS}, status=400)
+
+    # values_list() joins the type name in the same query instead of loading each appointment's type.
+    # The repeating rows are expanded for just this window.
+    appointments = Appointment.objects.filter(manager__user=request.user)
+    time_off = TimeOff.objects.filter(manager__user=request.user)
+    events = serializers.appointment_events(appointments.window_values(*window, *serializers.APPOINTMENT_FIELDS,
+                                                                       "rrule"), repeats=True) + \
+        serializers.time_off_events(time_off.window_values(*window, *serializers.TIME_OFF_FIELDS, "rrule"),
+                                    repeats=True)
+
+    return revalidate(JsonResponse(events, safe=False), private=True)
+
+
+def is_feed_owner(request, user_id):
+    return request.user.is_authenticated and request.user.id == int(user_id)
+
+
+def feed_etag(request, user_id):
+    # The coach's own feed has the students' names in it, so it gets its own tag
+    return schedule_etag(request, user_id, *["owner"] if is_feed_owner(request, user_id) else [])
+
+
+def feed_last_modified(request, user_id):
+    state = get_schedule_state(request, user_id)
+    return state["schedule_updated"] if state else None
+
+
+@aio.wsgi_only
+@condition(etag_func=feed_etag, last_modified_func=feed_last_modified)
+def schedule_feed(request, user_id):
+
+    state = get_schedule_state(request, user_id)
+    if not state or "h__" not in state["user__type"]:
+        raise Http404("Could not find the user.")
+
+    owner = is_feed_owner(request, user_id)
+    stamp = state["schedule_updated"] or timezone.now()
+    host = request.get_host().split(":")[0]
+    zone = schedule_zone().zone
+
+    def lines():
+        yield ical.calendar_start("%s %s" % (state["user__first_name"], state["user__last_name"]))
+
+        # Repeating rows go out as one event with their RRULE, the calendar app expands them
+        appointments = Appointment.objects.filter(manager_id=state["id"]) \
+            .values_list("id", "start", "end", "type__name", "name", "email", "rrule", "exdates")
+        for appt_id, start, end, type_name, name, email, rule, exdates in appointments.iterator():
+            if owner:
+                yield ical.event("appointment-%s@%s" % (appt_id, host), stamp, start, end,
+                                 "%s: %s" % (type_name, name), email, rrule=rule, exdates=exdates, zone=zone)
+            else:
+                yield ical.event("appointment-%s@%s" % (appt_id, host), stamp, start, end, "Booked",
+                                 rrule=rule, exdates=exdates, zone=zone)
+
+        for time_id, start, end, reason, rule, exdates in TimeOff.objects.filter(manager_id=state["id"]) \
+                .values_list("id", "start", "end", "reason", "rrule", "exdates").iterator():
+            yield ical.event("timeoff-%s@%s" % (time_id, host), stamp, start, end,
+                             "Time Off: %s" % reason if owner else "Time Off", rrule=rule, exdates=exdates,
+                             zone=zone)
+
+        yield ical.calendar_end()
+
+    # Calendar apps should come back with If-None-Match rather than keep an old copy
+    return revalidate(StreamingHttpResponse(lines(), content_type="text/calendar; charset=utf-8"), private=owner)
+
+
+def schedule_events_context():
+    """
+    :return: If the pages open /<user_id>/events or poll, and how often they poll
+    """
+    return {"schedule_events_live": settings.SCHEDULE_EVENTS_LIVE,
+            "schedule_poll_seconds": settings.SCHEDULE_POLL_SECONDS}
+
+
+@aio.wsgi_only
+def schedule_events(request, user_id):
+
+    state = get_schedule_state(request, user_id)
+    if not state or "h__" not in state["user__type"]:
+        raise Http404("Could not find the user.")
+
+    owner = is_feed_owner(request, user_id)
+
+    def stream():
+        subscription = events.get_broker().subscribe(events.channel_name(state["id"]))
+        try:
+            # Pages reload everything when they get "ready" on a reconnect, in case they missed something
+            yield "retry: 5000\nevent: ready\ndata: {}\n\n"
+            closes = time.time() + settings.SCHEDULE_EVENTS_MAX_SECONDS
+            while time.time() < closes:
+                event = subscription.get(timeout=settings.SCHEDULE_EVENTS_KEEPALIVE)
+                if subscription.overflowed:
+                    subscription.overflowed = False
+                    event = {"kind": "schedule", "action": "changed"}
+                if event is None:
+                    yield ": keepalive\n\n"
+                    continue
+                data = serializers.dumps(event if owner else events.public_event(event)).decode("utf-8")
+                yield "event: change\ndata: %s\n\n" % data
+        finally:
+            subscription.close()
+
+    response = StreamingHttpResponse(stream(), content_type="text/event-stream")
+    response["Cache-Control"] = "no-cache"
+    # Don't let nginx hold the events back in its buffer
+    response["X-Accel-Buffering"] = "no"
+    return response
 
 
 def login_view(request):
@@ -305,3 +615,31 @@ def login_view(request):
         messages.error(request, "Invalid credentials.")
 
     return render(request, "dashboard/session/login.html")
+
+
+@staff_member_required
+def timing_summary(request):
+
+    return JsonResponse(timing.summary.summary())
+
+
+def static_asset(request, path):
+
+    if not settings.SERVE_ASSETS:
+        raise Http404("Static files are served by the web server.")
+
+    found = assets.find_asset(path, request.META.get("HTTP_ACCEPT_ENCODING", ""))
+    if not found:
+        raise Http404("Could not find the file.")
+    file_path, content_type, encoding = found
+
+    response = FileResponse(open(file_path, "rb"), content_type=content_type)
+    if encoding:
+        response["Content-Encoding"] = encoding
+    patch_vary_headers(response, ["Accept-Encoding"])
+    # A hashed name is a new file every time it changes, so it never has to be asked for again
+    if assets.HASHED.search(path):
+        patch_cache_control(response, public=True, max_age=settings.ASSET_MAX_AGE, immutable=True)
+    else:
+        patch_cache_control(response, public=True, no_cache=True)
+    return response
@@ -0,0 +1,16 @@
+"""
+Timing suites for the scheduling code.
+
+Run them with `python manage.py benchmark`, which builds a throwaway database, fills it with
+benchmarks.data.ScheduleGenerator and writes the timings to benchmarks/results/ as JSON.
+"""
+
+# Modules that register benchmarks, imported by the runner in this order
+SUITES = [
+    "benchmarks.bench_time",
+    "benchmarks.bench_models",
+    "benchmarks.bench_views",
+    "benchmarks.bench_booking",
+    "benchmarks.bench_sqlite",
+    "benchmarks.bench_serializers",
+]
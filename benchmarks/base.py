@@ -0,0 +1,50 @@
+import statistics
+import timeit
+from collections import OrderedDict
+
+# name -> Benchmark, filled in by the @benchmark decorator
+BENCHMARKS = OrderedDict()
+
+
+class Benchmark(object):
+
+    def __init__(self, name, setup, number, repeat, items):
+        self.name = name
+        self.setup = setup
+        self.number = number
+        self.repeat = repeat
+        self.items = items
+
+    def run(self):
+        """
+        Calls setup() once and times the callable it gives back. If the callable returns a dict, the
+        one from the last call is added to the results (for numbers like bookings/sec).
+        :return: dict of seconds per call (best and median of the repeats)
+        """
+        func = self.setup()
+        extra = {}
+
+        def call():
+            value = func()
+            if isinstance(value, dict):
+                extra.update(value)
+
+        runs = timeit.Timer(call).repeat(repeat=self.repeat, number=self.number)
+        per_call = [seconds / self.number for seconds in runs]
+        result = {"best": min(per_call), "median": statistics.median(per_call),
+                  "number": self.number, "repeat": self.repeat}
+        if self.items:
+            result["per_item"] = result["best"] / self.items
+        result.update(extra)
+        return result
+
+
+def benchmark(name, number=10, repeat=5, items=None):
+    """
+    Registers a benchmark. The decorated function does the setup and returns the callable to time.
+    :param items: How many things one call handles, to also report the cost per item
+    """
+    def decorator(setup):
+        BENCHMARKS[name] = Benchmark(name, setup, number, repeat, items)
+        return setup
+    return decorator
@@ -0,0 +1,76 @@
+import datetime
+import random
+import threading
+import time
+
+import pytz
+from django.db import connections
+
+from appointments.booking import book_appointment, BookingError
+from appointments.models import AppointmentType
+from benchmarks.base import benchmark
+from benchmarks.data import ScheduleGenerator
+
+THREADS = 8
+ATTEMPTS = 10
+
+
+def contested_slots(count=6, minutes=30):
+    """
+    Overlapping slots a quarter hour apart on a weekday morning, so most attempts collide.
+    """
+    first = pytz.utc.localize(datetime.datetime(2017, 3, 8, 10))
+    return [(first + datetime.timedelta(minutes=15 * i), first + datetime.timedelta(minutes=15 * i + minutes))
+            for i in range(count)]
+
+
+def stress_booking(managers, types, slots, threads=THREADS, attempts=ATTEMPTS):
+    """
+    Every thread tries `attempts` random (manager, slot) bookings at the same time.
+    :return: (list of the manager indexes booked, seconds taken)
+    """
+    booked = []
+    lock = threading.Lock()
+
+    def student(number):
+        rnd = random.Random(number)
+        try:
+            for _ in range(attempts):
+                index = rnd.randrange(len(managers))
+                start, end = rnd.choice(slots)
+                try:
+                    book_appointment(managers[index], types[index], start, end, "Student", "student@buffalo.edu")
+                    with lock:
+                        booked.append(index)
+                except BookingError:
+                    pass
+        finally:
+            connections.close_all()
+
+    began = time.time()
+    workers = [threading.Thread(target=student, args=(i,)) for i in range(threads)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    return booked, time.time() - began
+
+
+@benchmark("booking.concurrent", number=1, repeat=3)
+def concurrent():
+    managers = ScheduleGenerator(seed=9, coaches=4, appointments_per_week=0, time_off_per_week=0).build()
+    for manager in managers:
+        for day, _ in manager.DAYS:
+            setattr(manager, day + "_start", datetime.time(0, 0))
+            setattr(manager, day + "_end", datetime.time(23, 59))
+        manager.save()
+    types = [AppointmentType.objects.create(manager=manager, minutes=30) for manager in managers]
+    # Many slots so the threads mostly race each other rather than run out of room
+    slots = contested_slots(count=40)
+
+    def run():
+        for manager in managers:
+            manager.appointments.all().delete()
+        booked, seconds = stress_booking(managers, types, slots)
+        return {"bookings": len(booked), "bookings_per_sec": len(booked) / seconds}
+    return run
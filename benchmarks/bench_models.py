@@ -0,0 +1,108 @@
+import datetime
+
+import pytz
+from django.test import override_settings
+
+from appointments import cache, free_time
+from appointments.models import TimeOff
+from benchmarks.base import benchmark
+from benchmarks.data import get_schedule, FIRST_WEEK
+
+# Middle of the second generated week
+DATE = FIRST_WEEK + datetime.timedelta(days=10)
+
+
+def busiest():
+    manager = get_schedule()[0]
+    return manager, manager.appt_types.order_by("minutes").first()
+
+
+def available_in_week(engine):
+    manager, appt_type = busiest()
+
+    def run():
+        with override_settings(AVAILABILITY_ENGINE=engine):
+            manager.get_available_in_week(DATE, appt_type)
+    return run
+
+
+@benchmark("models.get_available_in_week.python", number=20)
+def available_python():
+    return available_in_week("python")
+
+
+@benchmark("models.get_available_in_week.bitmap", number=20)
+def available_bitmap():
+    return available_in_week("bitmap")
+
+
+@benchmark("models.get_available_in_week.epoch", number=20)
+def available_epoch():
+    return available_in_week("epoch")
+
+
+@benchmark("models.get_available_in_week.materialized", number=20)
+def available_materialized():
+    manager, appt_type = busiest()
+    free_time.rebuild(manager.id)
+
+    def run():
+        with override_settings(AVAILABILITY_MATERIALIZED=True):
+            manager.get_available_in_week(DATE, appt_type)
+    return run
+
+
+@benchmark("models.get_available_in_week.cached", number=200)
+def available_cached():
+    manager, appt_type = busiest()
+    cache.get_available_in_week(manager, DATE, appt_type)
+    return lambda: cache.get_available_in_week(manager, DATE, appt_type)
+
+
+@benchmark("models.todays_appointments", number=50)
+def todays_appointments():
+    manager, _ = busiest()
+    return lambda: manager.todays_appointments
+
+
+def weekly_time_off(repeating):
+    """
+    A coach with an hour off every weekday for two years, as one repeating row per day or as a row per
+    occurrence, asked for a week in the middle.
+    """
+    manager, appt_type = busiest()
+    manager.exceptions.filter(reason="Standing").delete()
+    first = pytz.utc.localize(datetime.datetime.combine(FIRST_WEEK - datetime.timedelta(weeks=52),
+                                                        datetime.time(12)))
+    for day in range(1, 6):
+        start = first + datetime.timedelta(days=day)
+        if repeating:
+            TimeOff.objects.create(manager=manager, reason="Standing", start=start,
+                                   end=start + datetime.timedelta(hours=1), rrule="FREQ=WEEKLY;COUNT=104")
+        else:
+            TimeOff.objects.bulk_create([TimeOff(manager=manager, reason="Standing",
+                                                 start=start + datetime.timedelta(weeks=week),
+                                                 end=start + datetime.timedelta(weeks=week, hours=1))
+                                         for week in range(104)])
+
+    def run():
+        with override_settings(AVAILABILITY_ENGINE="epoch"):
+            manager.get_available_in_week(DATE, appt_type)
+    return run
+
+
+@benchmark("models.get_available_in_week.recurring", number=20)
+def available_recurring():
+    return weekly_time_off(True)
+
+
+@benchmark("models.get_available_in_week.recurring_materialized", number=20)
+def available_recurring_materialized():
+    return weekly_time_off(False)
+
+
+@benchmark("models.iter_available.next5", number=50)
+def next_available():
+    manager, appt_type = busiest()
+    start = pytz.utc.localize(datetime.datetime.combine(DATE, datetime.time.min))
+    return lambda: list(manager.iter_available(start, appt_type, limit=5))
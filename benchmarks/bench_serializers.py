@@ -0,0 +1,58 @@
+import datetime
+import json
+import random
+
+import pytz
+from django.core.serializers.json import DjangoJSONEncoder
+from django.test import override_settings
+
+from appointments import serializers
+from appointments.models import Appointment, AppointmentType
+from benchmarks.base import benchmark
+from benchmarks.data import FIRST_WEEK
+
+EVENTS = 10000
+
+
+def appointment_rows(count=EVENTS):
+    """
+    (id, start, end, name, type name) tuples like APPOINTMENT_FIELDS gives back, spread over a few months.
+    """
+    rnd = random.Random(13)
+    first = pytz.utc.localize(datetime.datetime.combine(FIRST_WEEK, datetime.time(8)))
+    rows = []
+    for appt_id in range(count):
+        start = first + datetime.timedelta(days=rnd.randrange(120), minutes=15 * rnd.randrange(40))
+        rows.append((appt_id, start, start + datetime.timedelta(minutes=30), "Student %s" % rnd.randrange(500),
+                     "Checkup"))
+    return rows
+
+
+@benchmark("serialize.fc_serialize", number=5, items=EVENTS)
+def fc_serialize():
+    appt_type = AppointmentType(name="Checkup", minutes=30)
+    appointments = [Appointment(id=appt_id, type=appt_type, name=name, start=start, end=end)
+                    for appt_id, start, end, name, _ in appointment_rows()]
+    # The old way: strftime per instance and Django's JsonResponse encoder
+    return lambda: json.dumps([appt.fc_serialize for appt in appointments], cls=DjangoJSONEncoder)
+
+
+@benchmark("serialize.values_list.json", number=5, items=EVENTS)
+def values_list_json():
+    rows = appointment_rows()
+
+    def run():
+        with override_settings(JSON_ENCODER="json"):
+            serializers.dumps(serializers.appointment_events(rows))
+    return run
+
+
+@benchmark("serialize.values_list.orjson", number=5, items=EVENTS)
+def values_list_orjson():
+    rows = appointment_rows()
+
+    def run():
+        # Falls back to the standard library when orjson isn't installed
+        with override_settings(JSON_ENCODER="auto"):
+            serializers.dumps(serializers.appointment_events(rows))
+    return run
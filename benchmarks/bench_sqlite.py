@@ -0,0 +1,122 @@
+"""
+SQLite with pages reading while bookings write, with the default rollback journal and with the production
+profile (settings.SQLITE_PRAGMAS, readers on query_only connections like READ_DATABASE).
+
+The threads use their own sqlite3 connections to a file copy of the benchmark database, since the
+in-memory test database locks whole tables and has no journal to compare.
+"""
+import datetime
+import os
+import shutil
+import sqlite3
+import tempfile
+import threading
+import time
+
+import pytz
+from django.conf import settings
+from django.db import connection
+
+from appointments.database import apply_pragmas
+from appointments.models import Appointment
+from benchmarks.base import benchmark
+from benchmarks.data import get_schedule, FIRST_WEEK
+
+READERS = 6
+WRITERS = 2
+READS = 150
+WRITES = 40
+
+# Django's own settings for a SQLite connection
+DEFAULT_PRAGMAS = {"journal_mode": "DELETE", "synchronous": "FULL"}
+
+BOOK = 'INSERT INTO appointments (manager_id, type_id, name, email, start, "end", rrule, exdates) ' \
+       'VALUES (?, ?, ?, ?, ?, ?, \'\', \'\')'
+
+
+def copy_database(directory):
+    path = os.path.join(directory, "schedule.sqlite3")
+    connection.ensure_connection()
+    target = sqlite3.connect(path)
+    connection.connection.backup(target)
+    target.close()
+    return path
+
+
+def week_query(manager):
+    """
+    :return: (sql, params) of the busy times query the availability pages run
+    """
+    start = pytz.utc.localize(datetime.datetime.combine(FIRST_WEEK, datetime.time.min))
+    rows = Appointment.objects.filter(manager=manager).overlapping(start, start + datetime.timedelta(weeks=1)) \
+        .values_list("start", "end")
+    sql, params = rows.query.sql_with_params()
+    return sql.replace("%s", "?"), params
+
+
+def read_write(pragmas, read_pragmas):
+    """
+    READERS threads run the week query READS times each while WRITERS threads book WRITES appointments each,
+    every booking a transaction that bumps the manager's version like book_appointment.
+    :return: dict of reads and writes per second, and the writes that gave up on a locked database
+    """
+    managers = get_schedule()
+    manager = managers[0]
+    appt_type = manager.appt_types.first()
+    sql, params = week_query(manager)
+    directory = tempfile.mkdtemp()
+    path = copy_database(directory)
+    # The journal mode is kept in the file
+    setup = sqlite3.connect(path)
+    apply_pragmas(setup, pragmas)
+    setup.close()
+
+    def connect(extra):
+        opened = sqlite3.connect(path, timeout=5, check_same_thread=False)
+        apply_pragmas(opened, dict(pragmas, **extra))
+        return opened
+
+    failed = []
+
+    def reader():
+        db = connect(read_pragmas)
+        for _ in range(READS):
+            db.execute(sql, params).fetchall()
+        db.close()
+
+    def writer(number):
+        db = connect({})
+        # Weeks after the one being read
+        first = datetime.datetime.combine(FIRST_WEEK, datetime.time(9)) + datetime.timedelta(weeks=10 + number)
+        for i in range(WRITES):
+            start = first + datetime.timedelta(minutes=30 * i)
+            try:
+                with db:
+                    db.execute("UPDATE user_appointment_managers SET version = version + 1 WHERE id = ?", (manager.id,))
+                    db.execute(BOOK, (manager.id, appt_type.id, "Student", "student@buffalo.edu", str(start),
+                                      str(start + datetime.timedelta(minutes=30))))
+            except sqlite3.OperationalError:
+                failed.append(start)
+        db.close()
+
+    workers = [threading.Thread(target=reader) for _ in range(READERS)] + \
+              [threading.Thread(target=writer, args=(i,)) for i in range(WRITERS)]
+    began = time.time()
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    seconds = time.time() - began
+    shutil.rmtree(directory)
+    return {"reads_per_sec": READERS * READS / seconds, "writes_per_sec": (WRITERS * WRITES - len(failed)) / seconds,
+            "failed_writes": len(failed)}
+
+
+@benchmark("sqlite.read_write.rollback_journal", number=1, repeat=3)
+def rollback_journal():
+    return lambda: read_write(DEFAULT_PRAGMAS, {})
+
+
+@benchmark("sqlite.read_write.production", number=1, repeat=3)
+def production():
+    return lambda: read_write(settings.SQLITE_PRAGMAS, {"query_only": "ON"})
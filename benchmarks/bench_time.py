@@ -0,0 +1,133 @@
+import datetime
+import random
+
+import pytz
+
+from appointments.models import UserAppointmentManager
+from benchmarks.base import benchmark
+from benchmarks.data import ScheduleGenerator, FIRST_WEEK
+from lib.intervals import IntervalIndex
+from lib.slots import epoch_available_times
+from lib.time import flatten_time_array, break_into_free_time, get_sun_sat
+
+
+def week_of_busy_times(count=200):
+    return ScheduleGenerator().busy_dicts(count=count)
+
+
+@benchmark("time.flatten_time_array", number=200)
+def flatten():
+    busy = week_of_busy_times()
+    return lambda: flatten_time_array(busy)
+
+
+@benchmark("time.break_into_free_time", number=200)
+def break_free():
+    times = flatten_time_array(week_of_busy_times())
+    week = get_sun_sat(FIRST_WEEK)
+    return lambda: break_into_free_time(times, week["start"], week["end"])
+
+
+@benchmark("time.bitmap_available_times", number=200)
+def bitmap():
+    from lib.bitmap import bitmap_available_times
+
+    times = flatten_time_array(week_of_busy_times())
+    hours = UserAppointmentManager(**ScheduleGenerator().hours(random.Random(1))).weekly_hours
+    return lambda: bitmap_available_times(times, FIRST_WEEK, hours, 30)
+
+
+# The week New York moves its clocks forward in
+DST_WEEK = datetime.date(2017, 3, 12)
+NEW_YORK = pytz.timezone("America/New_York")
+
+
+def localized_slot_loop(times, sunday, hours, minutes, zone):
+    """
+    What the slot loop costs when every slot is moved into the zone with astimezone and labelled with
+    strftime, the baseline for lib/slots.py.
+    """
+    week_start = NEW_YORK.localize(datetime.datetime.combine(sunday, datetime.time.min))
+    free_times = break_into_free_time(times, sunday, sunday + datetime.timedelta(days=6))
+    slots = []
+    for block in free_times:
+        cur_time = block["start"]
+        cur_end = cur_time + datetime.timedelta(minutes=minutes)
+        while cur_end <= block["end"]:
+            local_start, local_end = cur_time.astimezone(zone), cur_end.astimezone(zone)
+            if local_start >= week_start and hours.allows(local_start, local_end):
+                slots.append({"title": "Available", "start": local_start.strftime("%Y/%m/%d %H:%M"),
+                              "end": local_end.strftime("%Y/%m/%d %H:%M")})
+            cur_time = cur_end
+            cur_end = cur_time + datetime.timedelta(minutes=minutes)
+    return slots
+
+
+def dst_week():
+    generator = ScheduleGenerator(first_week=DST_WEEK)
+    times = flatten_time_array(generator.busy_dicts(count=200))
+    hours = UserAppointmentManager(**generator.hours(random.Random(1))).weekly_hours
+    return times, hours
+
+
+@benchmark("time.epoch_available_times", number=200)
+def epoch():
+    times = flatten_time_array(week_of_busy_times())
+    hours = UserAppointmentManager(**ScheduleGenerator().hours(random.Random(1))).weekly_hours
+    return lambda: epoch_available_times(times, FIRST_WEEK, hours, 30, pytz.utc)
+
+
+@benchmark("time.epoch_available_times.dst", number=200)
+def epoch_dst():
+    times, hours = dst_week()
+    return lambda: epoch_available_times(times, DST_WEEK, hours, 30, NEW_YORK)
+
+
+@benchmark("time.localized_slot_loop.dst", number=200)
+def localized_dst():
+    times, hours = dst_week()
+    return lambda: localized_slot_loop(times, DST_WEEK, hours, 30, NEW_YORK)
+
+
+def conflict_checks(count=2000, checks=200):
+    """
+    A busy schedule over a year, and slots to check against it
+    """
+    rnd = random.Random(21)
+    start = pytz.utc.localize(datetime.datetime.combine(FIRST_WEEK, datetime.time.min))
+    intervals = []
+    for _ in range(count):
+        busy_start = start + datetime.timedelta(minutes=rnd.randrange(0, 52 * 7 * 24 * 60, 15))
+        intervals.append((busy_start, busy_start + datetime.timedelta(minutes=rnd.choice((15, 30, 60)))))
+    slots = []
+    for _ in range(checks):
+        slot_start = start + datetime.timedelta(minutes=rnd.randrange(0, 52 * 7 * 24 * 60, 15))
+        slots.append((slot_start, slot_start + datetime.timedelta(minutes=30)))
+    return intervals, slots
+
+
+@benchmark("time.conflicts.linear", number=5, items=200)
+def conflicts_linear():
+    intervals, slots = conflict_checks()
+    busy = sorted(({"start": start, "end": end} for start, end in intervals), key=lambda x: x["start"])
+    return lambda: [any(b["start"] < end and b["end"] > start for b in busy) for start, end in slots]
+
+
+@benchmark("time.conflicts.interval_index", number=5, items=200)
+def conflicts_index():
+    intervals, slots = conflict_checks()
+    index = IntervalIndex(intervals)
+    return lambda: [index.overlaps(start, end) for start, end in slots]
+
+
+@benchmark("time.interval_index.build", number=20)
+def interval_index_build():
+    intervals, _ = conflict_checks()
+    return lambda: IntervalIndex(intervals).flattened()
+
+
+@benchmark("time.flatten_time_array.sorted", number=20)
+def flatten_sorted():
+    intervals, _ = conflict_checks()
+    return lambda: flatten_time_array(sorted(({"start": start, "end": end} for start, end in intervals),
+                                             key=lambda x: x["start"]))
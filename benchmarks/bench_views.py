@@ -0,0 +1,76 @@
+import datetime
+import json
+
+from django.test import Client
+
+from appointments import cache, fragments
+from benchmarks.base import benchmark
+from benchmarks.bench_models import busiest, DATE
+from benchmarks.data import FIRST_WEEK
+
+
+def logged_in_client():
+    manager, _ = busiest()
+    client = Client()
+    client.force_login(manager.user)
+    return client, manager
+
+
+def load_appts(clear):
+    manager, appt_type = busiest()
+    client = Client()
+    url = "/load/appts/%s" % manager.user_id
+    body = json.dumps({"date": DATE.strftime("%m/%d/%Y"), "appt_id": appt_type.id})
+
+    def run():
+        if clear:
+            cache.availability_cache().clear()
+        client.post(url, body, content_type="application/json")
+    return run
+
+
+@benchmark("views.get_available_appts", number=20)
+def available_appts():
+    return load_appts(clear=True)
+
+
+@benchmark("views.get_available_appts.cached", number=50)
+def available_appts_cached():
+    return load_appts(clear=False)
+
+
+def load_index(clear):
+    manager, _ = busiest()
+    client = Client()
+    url = "/?vc=%s" % manager.user_id
+
+    def run():
+        if clear:
+            fragments.fragment_cache().clear()
+        client.get(url)
+    return run
+
+
+@benchmark("views.index", number=20)
+def index():
+    return load_index(clear=False)
+
+
+@benchmark("views.index.no_fragment_cache", number=20)
+def index_uncached():
+    return load_index(clear=True)
+
+
+@benchmark("views.get_todays_appt_for_user", number=50)
+def todays_appts():
+    client, manager = logged_in_client()
+    url = "/%s/today" % manager.user_id
+    return lambda: client.get(url)
+
+
+@benchmark("views.get_appointments_for_month", number=20)
+def month():
+    client, _ = logged_in_client()
+    # The month view FullCalendar asks for around the generated weeks
+    window = {"start": FIRST_WEEK.isoformat(), "end": (FIRST_WEEK + datetime.timedelta(weeks=5)).isoformat()}
+    return lambda: client.get("/time/month", window)
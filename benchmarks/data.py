@@ -0,0 +1,111 @@
+import datetime
+import random
+
+import pytz
+
+from appointments.models import User, UserAppointmentManager, AppointmentType, Appointment, TimeOff
+from lib.intervals import IntervalIndex
+
+# A Sunday, the first week that gets filled in
+FIRST_WEEK = datetime.date(2017, 2, 5)
+
+
+class ScheduleGenerator(object):
+    """
+    Builds the same set of coaches, appointment types, appointments and time off for a given seed.
+    Everything lands on a five minute boundary inside the coach's working hours, and appointments don't
+    overlap each other.
+    """
+
+    def __init__(self, seed=2017, coaches=5, appt_types=3, appointments_per_week=25, time_off_per_week=2,
+                 weeks=4, first_week=FIRST_WEEK):
+        self.seed = seed
+        self.coaches = coaches
+        self.appt_types = appt_types
+        self.appointments_per_week = appointments_per_week
+        self.time_off_per_week = time_off_per_week
+        self.weeks = weeks
+        self.first_week = first_week
+
+    def hours(self, rnd):
+        hours = {}
+        for day, _ in UserAppointmentManager.DAYS:
+            if day in ("sun", "sat"):
+                hours[day + "_start"] = hours[day + "_end"] = datetime.time(0, 0)
+            else:
+                hours[day + "_start"] = datetime.time(rnd.randint(7, 10), rnd.choice((0, 30)))
+                hours[day + "_end"] = datetime.time(rnd.randint(15, 19), rnd.choice((0, 30)))
+        return hours
+
+    def busy_times(self, rnd, count, minutes, week):
+        """
+        :return: count (start, end) pairs in the week, sorted by start
+        """
+        week_start = pytz.utc.localize(datetime.datetime.combine(week, datetime.time.min))
+        times = []
+        for _ in range(count):
+            day = rnd.randint(1, 5)
+            start = week_start + datetime.timedelta(days=day, hours=rnd.randint(8, 16), minutes=rnd.randrange(0, 60, 5))
+            times.append((start, start + datetime.timedelta(minutes=rnd.choice(minutes))))
+        return sorted(times)
+
+    def busy_dicts(self, count=None):
+        """
+        Busy times for one week as the {"start", "end"} dicts that lib/time.py works with.
+        """
+        rnd = random.Random(self.seed)
+        count = self.appointments_per_week + self.time_off_per_week if count is None else count
+        return [{"start": start, "end": end}
+                for start, end in self.busy_times(rnd, count, (15, 30, 45, 60, 120), self.first_week)]
+
+    def build(self):
+        """
+        Saves the schedule to the database.
+        :return: list of the UserAppointmentManagers created
+        """
+        rnd = random.Random(self.seed)
+        managers = []
+        for number in range(self.coaches):
+            user = User.objects.create_user("coach%s-%s@buffalo.edu" % (number, self.seed), "Coach", str(number),
+                                            password="benchmark")
+            user.type = "h__co"
+            user.save()
+            manager = UserAppointmentManager.objects.create(user=user, **self.hours(rnd))
+            types = [AppointmentType.objects.create(manager=manager, name="Type %s" % i,
+                                                    minutes=rnd.choice((15, 30, 45, 60)))
+                     for i in range(self.appt_types)]
+
+            appointments = []
+            time_off = []
+            for week in range(self.weeks):
+                sunday = self.first_week + datetime.timedelta(weeks=week)
+                booked = IntervalIndex()
+                for start, end in self.busy_times(rnd, self.appointments_per_week, [t.minutes for t in types], sunday):
+                    appt_type = rnd.choice(types)
+                    # PostgreSQL refuses appointments that overlap, those are held as time off instead
+                    if booked.overlaps(start, end):
+                        time_off.append(TimeOff(manager=manager, reason="Hold", start=start, end=end))
+                        continue
+                    booked.insert(start, end)
+                    appointments.append(Appointment(manager=manager, type=appt_type, start=start, end=end,
+                                                    name="Student", email="student@buffalo.edu"))
+                for start, end in self.busy_times(rnd, self.time_off_per_week, (60, 180, 480), sunday):
+                    time_off.append(TimeOff(manager=manager, reason="Meeting", start=start, end=end))
+
+            Appointment.objects.bulk_create(appointments)
+            TimeOff.objects.bulk_create(time_off)
+            managers.append(manager)
+        return managers
+
+
+_schedule = None
+
+
+def get_schedule():
+    """
+    The default schedule, built on first use and shared by the model and view suites.
+    """
+    global _schedule
+    if _schedule is None:
+        _schedule = ScheduleGenerator().build()
+    return _schedule
@@ -0,0 +1,74 @@
+import datetime
+import importlib
+import json
+import os
+import platform
+import subprocess
+import sys
+from collections import OrderedDict
+
+from benchmarks import SUITES
+from benchmarks.base import BENCHMARKS
+
+RESULTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "results")
+
+
+def current_commit():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], stderr=subprocess.DEVNULL,
+                                       cwd=os.path.dirname(RESULTS_DIR)).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def run(filters=None, progress=None):
+    """
+    Runs every registered benchmark whose name contains one of the filters (all of them without).
+    :param progress: Called with (name, result) after each benchmark
+    :return: OrderedDict of name -> timings
+    """
+    for suite in SUITES:
+        importlib.import_module(suite)
+
+    results = OrderedDict()
+    for name, bench in BENCHMARKS.items():
+        if filters and not any(f in name for f in filters):
+            continue
+        # The views and get_sun_sat print as they go, keep that out of the report
+        with open(os.devnull, "w") as devnull:
+            stdout, sys.stdout = sys.stdout, devnull
+            try:
+                results[name] = bench.run()
+            finally:
+                sys.stdout = stdout
+        if progress:
+            progress(name, results[name])
+    return results
+
+
+def save(results, path=None):
+    """
+    Writes the results with the commit they came from, by default to benchmarks/results/<time>-<commit>.json.
+    :return: The path written
+    """
+    commit = current_commit()
+    created = datetime.datetime.now()
+    if not path:
+        if not os.path.isdir(RESULTS_DIR):
+            os.makedirs(RESULTS_DIR)
+        path = os.path.join(RESULTS_DIR, "%s-%s.json" % (created.strftime("%Y%m%d-%H%M%S"), commit))
+
+    with open(path, "w") as f:
+        json.dump({"commit": commit, "created": created.isoformat(), "python": platform.python_version(),
+                   "results": results}, f, indent=2)
+    return path
+
+
+def compare(results, path):
+    """
+    :return: (name, old best, new best, new/old) for every benchmark that is in both runs
+    """
+    with open(path) as f:
+        previous = json.load(f)["results"]
+    return [(name, previous[name]["best"], result["best"], result["best"] / previous[name]["best"])
+            for name, result in results.items() if name in previous and previous[name]["best"]]
@@ -0,0 +1,114 @@
+"""
+Minifying and compressing the static bundles (see appointments/assets.py).
+
+Scripts are minified by rjsmin, which the build needs (requirements.txt). The stylesheet minifier is
+conservative: comments and whitespace go, strings are kept as written. brotli is used for the .br files
+when it is installed.
+"""
+import gzip
+import posixpath
+import re
+
+try:
+    import rjsmin
+except ImportError:
+    rjsmin = None
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+CSS_URL = re.compile(r"""url\(\s*(['"]?)([^'")]+)\1\s*\)""")
+
+CSS_SPACE = re.compile(r"\s*([{};,>])\s*")
+
+# Worth a compressed copy
+COMPRESSIBLE = (".js", ".css", ".svg", ".html", ".json", ".txt", ".map", ".ttf", ".eot", ".otf", ".ico")
+
+
+def read_quoted(text, start):
+    """
+    :return: Where the string starting at `start` ends (past its close quote), -1 if it never closes
+    """
+    quote = text[start]
+    position = start + 1
+    while position < len(text):
+        char = text[position]
+        if char == "\\":
+            position += 2
+            continue
+        if char == quote:
+            return position + 1
+        position += 1
+    return -1
+
+
+def minify_js(text):
+    """
+    :return: The script minified by rjsmin, /*! comments (licenses) kept
+    """
+    if rjsmin is None:
+        raise ImportError("Minifying scripts needs rjsmin (pip install -r requirements.txt).")
+    return rjsmin.jsmin(text, keep_bang_comments=True)
+
+
+def minify_css(text):
+    """
+    :return: The stylesheet without comments (but /*! ones) and with whitespace collapsed around { } ; , >
+    """
+    out = []
+    position, length = 0, len(text)
+    chunk = []
+
+    def flush():
+        if chunk:
+            out.append(CSS_SPACE.sub(r"\1", re.sub(r"\s+", " ", "".join(chunk))).replace(";}", "}"))
+            del chunk[:]
+
+    while position < length:
+        char = text[position]
+        if text.startswith("/*", position):
+            end = text.find("*/", position + 2)
+            end = length if end < 0 else end + 2
+            if text.startswith("/*!", position):
+                flush()
+                out.append(text[position:end] + "\n")
+            else:
+                chunk.append(" ")
+            position = end
+        elif char in "'\"":
+            flush()
+            end = read_quoted(text, position)
+            out.append(text[position:end if end > 0 else length])
+            position = end if end > 0 else length
+        else:
+            chunk.append(char)
+            position += 1
+    flush()
+    return "".join(out).strip()
+
+
+def rebase_css(text, source, target):
+    """
+    Points the relative url()s of a stylesheet moved from `source` to `target` (both static paths) back at
+    the same files.
+    """
+    def rebase(match):
+        quote, url = match.group(1), match.group(2).strip()
+        if url.startswith(("data:", "http:", "https:", "//", "/", "#")):
+            return match.group(0)
+        path, suffix = re.match(r"([^?#]*)(.*)", url).groups()
+        moved = posixpath.normpath(posixpath.join(posixpath.dirname(source), path))
+        return "url(%s%s%s%s)" % (quote, posixpath.relpath(moved, posixpath.dirname(target) or "."), suffix, quote)
+    return CSS_URL.sub(rebase, text)
+
+
+def compress(data):
+    """
+    :return: dict of file suffix -> compressed bytes, for the encodings available that make it smaller
+    """
+    variants = {".gz": gzip.compress(data, 9, mtime=0)}
+    if brotli is not None:
+        variants[".br"] = brotli.compress(data, quality=11)
+    return dict((suffix, value) for suffix, value in variants.items() if len(value) < len(data))
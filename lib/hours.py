@@ -0,0 +1,131 @@
+import datetime
+from array import array
+
+# Days in the order they are stored, the week starts on Sunday
+DAYS = ("sun", "mon", "tue", "wed", "thu", "fri", "sat")
+
+
+def to_minutes(time):
+    """
+    :return: Whole minutes since midnight (seconds are dropped)
+    """
+    return time.hour * 60 + time.minute
+
+
+def exact_minutes(value):
+    """
+    :return: Minutes since midnight of a time or datetime, with the seconds as a fraction
+    """
+    return value.hour * 60 + value.minute + (value.second + value.microsecond / 1000000.0) / 60.0
+
+
+def day_index(value):
+    """
+    :return: 0 for Sunday through 6 for Saturday
+    """
+    return (value.weekday() + 1) % 7
+
+
+class WeeklyHours(object):
+    """
+    A coach's working hours as minutes since midnight.
+
+    `bounds` holds the opening and closing minute of every day as a flat 7x2 array (sun_start, sun_end,
+    mon_start, ...). `windows` holds the stretches of each day that can be booked, which are the bounds
+    with any breaks (like lunch) taken out.
+    """
+
+    __slots__ = ("bounds", "windows")
+
+    def __init__(self, bounds, breaks=()):
+        """
+        :param bounds: 14 minutes, the start and end of every day from Sunday on
+        :param breaks: (day index, start minute, end minute) to take out of the day
+        """
+        self.bounds = array("i", bounds)
+        windows = []
+        for day in range(7):
+            day_windows = [(self.bounds[day * 2], self.bounds[day * 2 + 1])]
+            for break_day, break_start, break_end in sorted(breaks):
+                if break_day != day:
+                    continue
+                split = []
+                for start, end in day_windows:
+                    if break_end <= start or break_start >= end:
+                        split.append((start, end))
+                        continue
+                    if start < break_start:
+                        split.append((start, break_start))
+                    if break_end < end:
+                        split.append((break_end, end))
+                day_windows = split
+            windows.append(tuple(day_windows))
+        self.windows = tuple(windows)
+
+    @classmethod
+    def from_manager(cls, manager, breaks=()):
+        bounds = []
+        for day in DAYS:
+            bounds.append(to_minutes(getattr(manager, day + "_start")))
+            bounds.append(to_minutes(getattr(manager, day + "_end")))
+        return cls(bounds, [(DAYS.index(b.day), to_minutes(b.start), to_minutes(b.end)) for b in breaks])
+
+    @classmethod
+    def parse(cls, values, breaks=()):
+        """
+        :param values: dict of "<day>_start"/"<day>_end" -> "09:00 AM" style strings, as the hours form posts
+        :raises ValueError: If a time is missing or can't be read
+        """
+        bounds = []
+        for day in DAYS:
+            for edge in ("_start", "_end"):
+                time = datetime.datetime.strptime(values[day + edge].strip(), "%I:%M %p").time()
+                bounds.append(to_minutes(time))
+        return cls(bounds, breaks)
+
+    def minutes(self, field):
+        """
+        :param field: "<day>_start" or "<day>_end"
+        """
+        day, edge = field.split("_")
+        return self.bounds[DAYS.index(day) * 2 + (edge == "end")]
+
+    def time(self, field):
+        minutes = self.minutes(field)
+        return datetime.time(minutes // 60, minutes % 60)
+
+    def label(self, field):
+        """
+        :return: The time of the field as "09:00 AM"
+        """
+        minutes = self.minutes(field)
+        hour = minutes // 60
+        return "%02d:%02d %s" % (hour % 12 or 12, minutes % 60, "AM" if hour < 12 else "PM")
+
+    def apply(self, manager):
+        """
+        Copies the bounds back onto the manager's *_start/*_end fields (without saving).
+        """
+        for day in DAYS:
+            setattr(manager, day + "_start", self.time(day + "_start"))
+            setattr(manager, day + "_end", self.time(day + "_end"))
+
+    @property
+    def earliest(self):
+        return min(self.bounds[0::2])
+
+    @property
+    def latest(self):
+        return max(self.bounds[1::2])
+
+    def allows(self, start, end):
+        """
+        If an appointment from start to end (datetimes) is inside the working hours. An appointment has
+        to fit in one window of its day. One that runs past midnight only has to start after the first
+        day opens and end before the second day closes.
+        """
+        start_minute = exact_minutes(start)
+        end_minute = exact_minutes(end)
+        if start.date() == end.date():
+            return any(opens < start_minute and end_minute < closes for opens, closes in self.windows[day_index(start)])
+        return self.bounds[day_index(start) * 2] < start_minute and end_minute < self.bounds[day_index(end) * 2 + 1]
@@ -0,0 +1,81 @@
+import pytz
+
+# Every line of an iCalendar file ends with CRLF (RFC 5545 section 3.1)
+CRLF = "\r\n"
+
+
+def escape_text(value):
+    """
+    Escapes a TEXT value, backslashes first so the others aren't escaped twice.
+    """
+    return value.replace("\\", "\\\\").replace(";", "\\;").replace(",", "\\,").replace("\r\n", "\\n") \
+        .replace("\n", "\\n")
+
+
+def fold(line):
+    """
+    Splits a content line into lines of at most 75 octets, each one after the first starting with a space.
+    """
+    encoded = line.encode("utf-8")
+    if len(encoded) <= 75:
+        return line + CRLF
+
+    lines = []
+    limit = 75
+    while encoded:
+        cut = min(limit, len(encoded))
+        # Don't cut a multi-byte character in half
+        while cut < len(encoded) and (encoded[cut] & 0xC0) == 0x80:
+            cut -= 1
+        lines.append(encoded[:cut].decode("utf-8"))
+        encoded = encoded[cut:]
+        limit = 74
+    return (CRLF + " ").join(lines) + CRLF
+
+
+def format_utc(value):
+    """
+    :return: The aware datetime as a UTC DATE-TIME, like 20170208T100000Z
+    """
+    return value.astimezone(pytz.utc).strftime("%Y%m%dT%H%M%SZ")
+
+
+def format_local(value, zone):
+    """
+    :return: The wall time of the aware datetime in the zone, like 20170208T100000
+    """
+    return value.astimezone(pytz.timezone(zone)).strftime("%Y%m%dT%H%M%S")
+
+
+def calendar_start(name):
+    return "".join(fold(line) for line in ("BEGIN:VCALENDAR", "VERSION:2.0", "PRODID:-//Venture Schedule//EN",
+                                           "CALSCALE:GREGORIAN", "X-WR-CALNAME:" + escape_text(name)))
+
+
+def calendar_end():
+    return "END:VCALENDAR" + CRLF
+
+
+def event(uid, stamp, start, end, summary, description=None, rrule=None, exdates=None, zone=None):
+    """
+    :param rrule: RRULE value of a repeating event, start and end are its first occurrence
+    :param exdates: Comma separated UTC starts of the occurrences taken out
+    :param zone: Name of the zone the event repeats in. Without it calendar apps repeat it in UTC.
+    :return: The VEVENT as text, ready to be written out
+    """
+    if rrule and zone and zone != "UTC":
+        # Floating times would be the reader's zone, so the ones in the zone are named with TZID
+        times = ["DTSTART;TZID=%s:%s" % (zone, format_local(start, zone)),
+                 "DTEND;TZID=%s:%s" % (zone, format_local(end, zone))]
+    else:
+        times = ["DTSTART:" + format_utc(start), "DTEND:" + format_utc(end)]
+    lines = ["BEGIN:VEVENT", "UID:" + uid, "DTSTAMP:" + format_utc(stamp)] + times + \
+            ["SUMMARY:" + escape_text(summary)]
+    if description:
+        lines.append("DESCRIPTION:" + escape_text(description))
+    if rrule:
+        lines.append("RRULE:" + rrule)
+    if exdates:
+        lines.append("EXDATE:" + exdates)
+    lines.append("END:VEVENT")
+    return "".join(fold(line) for line in lines)
@@ -0,0 +1,111 @@
+"""
+A manager's busy times as a sorted index, so overlap and gap questions are a bisect instead of a scan.
+
+IntervalIndex keeps the intervals it was given (sorted by start, duplicates allowed) and their union as
+disjoint blocks in two parallel arrays of starts and ends. Blocks that touch are joined, so the gaps
+between blocks always have a length. Looking something up is O(log n); inserting and removing are a
+bisect plus the list shift and the blocks around the change.
+
+Intervals are (start, end) pairs of anything ordered (aware datetimes, epoch minutes). Like the database
+queries (ScheduleQuerySet.overlapping), [start, end) overlaps [a, b) when a < end and b > start.
+"""
+import bisect
+
+
+def merge_sorted(intervals):
+    """
+    :param intervals: (start, end) pairs sorted by start
+    :return: ([block starts], [block ends]) of their union, touching blocks joined
+    """
+    starts, ends = [], []
+    for start, end in intervals:
+        if ends and start <= ends[-1]:
+            if end > ends[-1]:
+                ends[-1] = end
+        else:
+            starts.append(start)
+            ends.append(end)
+    return starts, ends
+
+
+class IntervalIndex(object):
+
+    __slots__ = ("intervals", "starts", "ends")
+
+    def __init__(self, intervals=()):
+        self.intervals = sorted(intervals)
+        self.starts, self.ends = merge_sorted(self.intervals)
+
+    def __len__(self):
+        return len(self.intervals)
+
+    def __iter__(self):
+        return iter(self.intervals)
+
+    def insert(self, start, end):
+        bisect.insort(self.intervals, (start, end))
+
+        # The blocks it overlaps or touches become one
+        first = bisect.bisect_left(self.ends, start)
+        last = bisect.bisect_right(self.starts, end)
+        if first < last:
+            start = min(start, self.starts[first])
+            end = max(end, self.ends[last - 1])
+        self.starts[first:last] = [start]
+        self.ends[first:last] = [end]
+
+    def remove(self, start, end):
+        """
+        :raises ValueError: If the interval isn't in the index
+        """
+        position = bisect.bisect_left(self.intervals, (start, end))
+        if position == len(self.intervals) or self.intervals[position] != (start, end):
+            raise ValueError("(%s, %s) is not in the index." % (start, end))
+        del self.intervals[position]
+
+        # Only the block it was in can change, merge what is left of that block again
+        block = bisect.bisect_right(self.starts, start) - 1
+        block_start, block_end = self.starts[block], self.ends[block]
+        first = last = bisect.bisect_left(self.intervals, (block_start,))
+        while last < len(self.intervals) and self.intervals[last][0] <= block_end:
+            last += 1
+        self.starts[block:block + 1], self.ends[block:block + 1] = merge_sorted(self.intervals[first:last])
+
+    def overlaps(self, start, end):
+        """
+        :return: If anything in the index overlaps [start, end)
+        """
+        block = bisect.bisect_right(self.ends, start)
+        return block < len(self.starts) and self.starts[block] < end
+
+    def blocks(self, start, end):
+        """
+        Generator of the (start, end) blocks of the union that overlap [start, end), not clipped
+        """
+        for block in range(bisect.bisect_right(self.ends, start), len(self.starts)):
+            if self.starts[block] >= end:
+                return
+            yield self.starts[block], self.ends[block]
+
+    def gaps(self, start, end):
+        """
+        Generator of the free (start, end) stretches between the blocks, clipped to [start, end)
+        """
+        cursor = start
+        for block_start, block_end in self.blocks(start, end):
+            if block_start > cursor:
+                yield cursor, block_start
+            cursor = max(cursor, block_end)
+        if cursor < end:
+            yield cursor, end
+
+    def flattened(self, start=None, end=None):
+        """
+        :return: The union as flattened busy times (see flatten_time_array), all of it or the blocks
+                 that overlap [start, end)
+        """
+        if start is None:
+            pairs = zip(self.starts, self.ends)
+        else:
+            pairs = self.blocks(start, end)
+        return [edge for pair in pairs for edge in pair]
@@ -0,0 +1,193 @@
+"""
+Repeating appointments and time off, a subset of the RFC 5545 RRULE expanded with dateutil.
+
+Rules look like "FREQ=WEEKLY;BYDAY=FR;UNTIL=20170601": FREQ (DAILY, WEEKLY or MONTHLY), INTERVAL, BYDAY
+(MO through SU), and COUNT or UNTIL. Occurrences are worked out in the schedule's wall time, so a meeting
+every Friday at 10:00 stays at 10:00 when the clocks change, and only for the window that is asked for.
+Single occurrences are taken out of a series with EXDATE style exdates (their UTC starts).
+"""
+import datetime
+import functools
+
+import pytz
+from dateutil import rrule
+
+from lib.ical import format_utc
+from lib.zones import localize
+
+FREQUENCIES = {"DAILY": rrule.DAILY, "WEEKLY": rrule.WEEKLY, "MONTHLY": rrule.MONTHLY}
+
+WEEKDAYS = {"MO": rrule.MO, "TU": rrule.TU, "WE": rrule.WE, "TH": rrule.TH, "FR": rrule.FR, "SA": rrule.SA,
+            "SU": rrule.SU}
+
+# What the time off form offers
+REPEAT_CHOICES = (
+    ("", "Never"),
+    ("FREQ=DAILY", "Every day"),
+    ("FREQ=WEEKLY", "Every week"),
+    ("FREQ=WEEKLY;INTERVAL=2", "Every other week"),
+    ("FREQ=MONTHLY", "Every month"),
+)
+
+DAY = datetime.timedelta(days=1)
+
+
+def parse_until(value):
+    """
+    :return: Aware UTC datetime for "20170601T150000Z", the wall time for "20170601T150000" and the end
+             of the day for "20170601"
+    """
+    try:
+        if value.endswith("Z"):
+            return pytz.utc.localize(datetime.datetime.strptime(value, "%Y%m%dT%H%M%SZ"))
+        if "T" in value:
+            return datetime.datetime.strptime(value, "%Y%m%dT%H%M%S")
+        return datetime.datetime.combine(datetime.datetime.strptime(value, "%Y%m%d").date(), datetime.time.max)
+    except ValueError:
+        raise ValueError("Could not read UNTIL=%s." % value)
+
+
+@functools.lru_cache(maxsize=1024)
+def parse_rule(value):
+    """
+    :raises ValueError: If the rule can't be read or isn't in the supported subset
+    :return: dict of dateutil.rrule.rrule arguments without dtstart (shared, don't change it)
+    """
+    parts = {}
+    for part in value.upper().strip().strip(";").split(";"):
+        name, _, part_value = part.strip().partition("=")
+        if not part_value:
+            raise ValueError("Could not read %s." % part)
+        parts[name] = part_value
+
+    unknown = set(parts) - {"FREQ", "INTERVAL", "BYDAY", "COUNT", "UNTIL"}
+    if unknown:
+        raise ValueError("Repeating rules can't use %s." % ", ".join(sorted(unknown)))
+    if parts.get("FREQ") not in FREQUENCIES:
+        raise ValueError("FREQ has to be DAILY, WEEKLY or MONTHLY.")
+    if "COUNT" in parts and "UNTIL" in parts:
+        raise ValueError("Use COUNT or UNTIL, not both.")
+
+    arguments = {"freq": FREQUENCIES[parts["FREQ"]]}
+    for name in ("INTERVAL", "COUNT"):
+        if name in parts:
+            if not parts[name].isdigit() or int(parts[name]) < 1:
+                raise ValueError("%s has to be a whole number above 0." % name)
+            arguments[name.lower()] = int(parts[name])
+    if "BYDAY" in parts:
+        try:
+            arguments["byweekday"] = tuple(WEEKDAYS[day] for day in parts["BYDAY"].split(","))
+        except KeyError:
+            raise ValueError("BYDAY takes MO, TU, WE, TH, FR, SA and SU.")
+    if "UNTIL" in parts:
+        arguments["until"] = parse_until(parts["UNTIL"])
+    return arguments
+
+
+@functools.lru_cache(maxsize=1024)
+def parse_exdates(value):
+    """
+    :param value: Comma separated UTC times, like "20170210T150000Z,20170217T150000Z"
+    :return: frozenset of aware datetimes
+    """
+    return frozenset(pytz.utc.localize(datetime.datetime.strptime(item.strip(), "%Y%m%dT%H%M%SZ"))
+                     for item in value.split(",") if item.strip())
+
+
+def add_exdate(value, start):
+    """
+    :return: The exdates with the occurrence starting at start added
+    """
+    return ",".join(sorted(set(item for item in value.split(",") if item) | {format_utc(start)}))
+
+
+def form_rule(repeat, until=""):
+    """
+    :param repeat: One of REPEAT_CHOICES
+    :param until: Last day as YYYY-MM-DD, blank to repeat forever
+    :raises ValueError: If either can't be used
+    :return: The RRULE value, blank for a one-off
+    """
+    if repeat not in dict(REPEAT_CHOICES):
+        raise ValueError("Choose how often it repeats.")
+    if not repeat or not until:
+        return repeat
+    try:
+        last_day = datetime.datetime.strptime(until, "%Y-%m-%d")
+    except ValueError:
+        raise ValueError("Could not read the last day, use YYYY-MM-DD.")
+    return "%s;UNTIL=%s" % (repeat, last_day.strftime("%Y%m%d"))
+
+
+def wall(value, zone):
+    return value.astimezone(zone).replace(tzinfo=None)
+
+
+def build(start, rule, zone, after=None):
+    """
+    :param after: Wall time the caller only needs occurrences from. Daily and weekly series then start at
+                  the last whole period before it instead of at the first occurrence, so they aren't walked
+                  from the very beginning. A COUNT is only moved along with them without BYDAY, when
+                  every period has one occurrence.
+    :return: The dateutil rrule of the series in wall time
+    """
+    arguments = dict(parse_rule(rule))
+    if getattr(arguments.get("until"), "tzinfo", None) is not None:
+        arguments["until"] = wall(arguments["until"], zone)
+
+    dtstart = wall(start, zone)
+    if after is not None and after > dtstart and arguments["freq"] in (rrule.DAILY, rrule.WEEKLY) \
+            and ("count" not in arguments or "byweekday" not in arguments):
+        period = datetime.timedelta(days=arguments.get("interval", 1) * (7 if arguments["freq"] == rrule.WEEKLY else 1))
+        skipped = (after - dtstart) // period
+        if "count" in arguments:
+            skipped = min(skipped, arguments["count"] - 1)
+            arguments["count"] -= skipped
+        dtstart += period * skipped
+    return rrule.rrule(dtstart=dtstart, **arguments)
+
+
+def occurrences(start, end, rule, exdates, window_start, window_end, zone):
+    """
+    Generator of the (start, end) of the series' occurrences that overlap [window_start, window_end).
+    :param start: Start of the first occurrence (aware)
+    :param end: End of the first occurrence, every occurrence is as long
+    :param rule: RRULE value
+    :param exdates: Starts of the occurrences taken out (see parse_exdates)
+    :param zone: The zone whose wall time the series repeats in
+    """
+    duration = end - start
+
+    # A day either side, around a clock change the wall time of the window is an hour off
+    first = wall(window_start - duration, zone) - DAY
+    last = wall(window_end, zone) + DAY
+
+    for naive in build(start, rule, zone, after=first).xafter(first, inc=True):
+        if naive >= last:
+            break
+        occurrence_start = localize(zone, naive)
+        occurrence_end = occurrence_start + duration
+        if occurrence_start < window_end and occurrence_end > window_start and occurrence_start not in exdates:
+            yield occurrence_start, occurrence_end
+
+
+def expand(rows, window_start, window_end, zone):
+    """
+    Generator of the (start, end) of every occurrence of (start, end, rrule, exdates) rows in the window
+    """
+    for start, end, rule, exdates in rows:
+        for occurrence in occurrences(start, end, rule, parse_exdates(exdates), window_start, window_end, zone):
+            yield occurrence
+
+
+def series_end(start, end, rule, zone):
+    """
+    :return: When the last occurrence ends, None if the series never stops
+    """
+    arguments = parse_rule(rule)
+    if "count" not in arguments and "until" not in arguments:
+        return None
+    last = None
+    for last in build(start, rule, zone):
+        pass
+    return localize(zone, last) + (end - start) if last else start
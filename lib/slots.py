@@ -0,0 +1,140 @@
+"""
+The slot engine in whole epoch minutes (see lib/zones.py), as a pipeline of generators:
+
+    busy_minutes -> merge -> free_blocks -> iter_slots
+
+Each stage only pulls what the next one asks for, so taking the first few slots of a week stops the
+work there. epoch_available_times runs the whole pipeline for a week.
+"""
+import datetime
+
+from lib.time import CLOCK_LABELS, date_label
+from lib.zones import MINUTES_IN_DAY, to_epoch_minutes, week_clock
+
+
+def busy_minutes(times):
+    """
+    :param times: Flattened busy times (see flatten_time_array)
+    :return: Generator of (start, end) epoch minutes, seconds rounded outwards
+    """
+    for index in range(0, len(times) - 1, 2):
+        yield to_epoch_minutes(times[index]), to_epoch_minutes(times[index + 1], round_up=True)
+
+
+def merge(intervals):
+    """
+    :param intervals: (start, end) pairs sorted by start
+    :return: Generator of the pairs with the ones that overlap or touch joined
+    """
+    current = None
+    for start, end in intervals:
+        if current and start <= current[1]:
+            current[1] = max(current[1], end)
+            continue
+        if current:
+            yield tuple(current)
+        current = [start, end]
+    if current:
+        yield tuple(current)
+
+
+def free_blocks(busy, start, end):
+    """
+    :param busy: Merged (start, end) pairs sorted by start
+    :return: Generator of the gaps between them from start to end
+    """
+    cursor = start
+    for busy_start, busy_end in busy:
+        if busy_start > cursor:
+            yield cursor, min(busy_start, end)
+        cursor = max(cursor, busy_end)
+        if cursor >= end:
+            return
+    if cursor < end:
+        yield cursor, end
+
+
+def iter_slots(blocks, clock, hours, minutes, after=None, before=None):
+    """
+    Cuts the free blocks of a week into slots. Slots are `minutes` of real time, the working hours, the
+    quarter hours blocks start on and the labels are in the week's wall time.
+    :param blocks: Free (start, end) epoch minutes in the week, in order
+    :param clock: WeekClock of the week
+    :param hours: WeeklyHours
+    :param after: Leave out slots that start before this epoch minute
+    :param before: Stop at the first slot that starts at or after this epoch minute
+    :return: Generator of FullCalendar "Available" events
+    """
+    wall = (lambda minute, shift=clock.offsets[0] - clock.local_start: minute + shift) if clock.fixed else clock.wall
+    windows, bounds = hours.windows, hours.bounds
+    after = float("-inf") if after is None else after
+    before = float("inf") if before is None else before
+    dates = [date_label(clock.sunday + datetime.timedelta(days=day)) for day in range(8)]
+
+    for start, end in blocks:
+        # Start on a quarter hour of the wall clock
+        start += -wall(start) % 15
+        if end - start <= minutes:
+            continue
+
+        slot_end = start + minutes
+        while slot_end <= end:
+            if start >= before:
+                return
+            start_day, start_minute = divmod(wall(start), MINUTES_IN_DAY)
+            end_day, end_minute = divmod(wall(slot_end), MINUTES_IN_DAY)
+
+            # Same rules as WeeklyHours.allows
+            if start_day == end_day:
+                allowed = any(opens < start_minute and end_minute < closes for opens, closes in windows[start_day % 7])
+            else:
+                allowed = bounds[start_day % 7 * 2] < start_minute and end_minute < bounds[end_day % 7 * 2 + 1]
+
+            if allowed:
+                if start >= after:
+                    yield {"title": "Available", "start": dates[start_day] + CLOCK_LABELS[start_minute],
+                           "end": dates[end_day] + CLOCK_LABELS[end_minute]}
+            else:
+                # Nothing that starts before the day opens, or after it closes and ends the same day, can be
+                # booked. Jump whole slots over that so the slots after it still start where they would.
+                opens, closes = bounds[start_day % 7 * 2], bounds[start_day % 7 * 2 + 1]
+                if start_minute <= opens:
+                    skip = opens - start_minute
+                elif start_minute >= closes:
+                    skip = MINUTES_IN_DAY - 1 - minutes - start_minute
+                else:
+                    skip = 0
+                # The wall clock can run an hour ahead when the clocks change
+                skip = (skip - (0 if clock.fixed else 60)) // minutes * minutes
+                if skip > 0:
+                    start += skip
+                    slot_end += skip
+
+            start = slot_end
+            slot_end += minutes
+
+
+def iter_week(times, sunday, hours, minutes, zone, after=None, before=None):
+    """
+    Generator of the week's slots, see iter_slots.
+    :param times: Flattened busy times (see flatten_time_array)
+    :param sunday: The (local) Sunday of the week
+    """
+    clock = week_clock(zone, sunday)
+    # The week runs to 23:59:59.999 on Saturday like break_into_free_time, not to midnight
+    blocks = free_blocks(merge(busy_minutes(times)), clock.start, clock.end - 0.5)
+    return iter_slots(blocks, clock, hours, minutes, after=after, before=before)
+
+
+def epoch_available_times(times, sunday, hours, minutes, zone):
+    """
+    The slot loop of UserAppointmentManager.get_slots_in_week in whole epoch minutes, for any zone. Gives
+    the same slots as the loop when the zone is UTC.
+    :param times: Flattened busy times (see flatten_time_array), seconds are rounded outwards
+    :param sunday: The (local) Sunday of the week
+    :param hours: WeeklyHours
+    :param minutes: Length of the appointment type
+    :param zone: A pytz zone
+    :return: list of FullCalendar "Available" events
+    """
+    return list(iter_week(times, sunday, hours, minutes, zone))
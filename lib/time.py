@@ -1,9 +1,14 @@
 from django.utils.dateparse import parse_datetime
 from django.utils.timezone import is_aware, make_aware
 import datetime
+import functools
+import re
 import pytz
 from dateutil.relativedelta import relativedelta
 
+# "HH:MM" for every minute of the day, so times are formatted without strftime
+CLOCK_LABELS = ["%02d:%02d" % (minute // 60, minute % 60) for minute in range(24 * 60)]
+
 
 def get_post(request, params=[], files=[]):
     data = {}
@@ -37,7 +42,7 @@ def get_time(time_str):
     return time
 
 
-def parse_bootstrap_datetimepicker(time_str):
+def parse_bootstrap_datetimepicker(time_str, zone=pytz.utc):
     divided = time_str.split("-")
     divided = [x.strip() for x in divided]
 
@@ -52,8 +57,8 @@ def parse_bootstrap_datetimepicker(time_str):
         unaware_start_date = datetime.datetime.strptime(divided[0], datetime_format)
         unaware_end_date = datetime.datetime.strptime(divided[1], datetime_format)
 
-        aware_start_date = pytz.utc.localize(unaware_start_date)
-        aware_end_date = pytz.utc.localize(unaware_end_date)
+        aware_start_date = zone.normalize(zone.localize(unaware_start_date))
+        aware_end_date = zone.normalize(zone.localize(unaware_end_date))
 
         data = {"start": aware_start_date, "end": aware_end_date}
 
@@ -63,6 +68,70 @@ def parse_bootstrap_datetimepicker(time_str):
     return data
 
 
+def parse_slot(time_str, zone=pytz.utc, today=None):
+    """
+    :param time_str: A slot time as the events give it, like "2017/02/05 09:00". Older booking dialogs send
+                     it as they show it, like "Feb 5th 9:00 AM", and get the year that puts it closest to today.
+    :param zone: The zone of the wall time
+    :param today: The date to pick the year from (default: today in the zone)
+    :raises ValueError: If the time can't be read
+    :return: Aware datetime
+    """
+    time_str = time_str.strip()
+    try:
+        unaware = datetime.datetime.strptime(time_str, "%Y/%m/%d %H:%M")
+    except ValueError:
+        today = today or datetime.datetime.now(zone).date()
+        time_str = re.sub(r"(?<=\d)(st|nd|rd|th)\b", "", time_str)
+        candidates = []
+        for year in (today.year - 1, today.year, today.year + 1):
+            try:
+                # With the year in the string so that Feb 29th parses in leap years
+                candidates.append(datetime.datetime.strptime("%s %s" % (year, time_str), "%Y %b %d %I:%M %p"))
+            except ValueError:
+                pass
+        if not candidates:
+            raise ValueError("Could not read the time %s." % time_str)
+        unaware = min(candidates, key=lambda candidate: abs(candidate.date() - today))
+    return zone.normalize(zone.localize(unaware))
+
+
+def parse_calendar_window(start_str, end_str, zone=pytz.utc):
+    """
+    :param start_str: FullCalendar's `start` parameter, a date ("2017-02-05") or an ISO datetime
+    :param end_str: FullCalendar's `end` parameter (exclusive)
+    :param zone: The zone of dates and datetimes without an offset
+    :return: (start, end) as aware UTC datetimes, or None if either can't be read
+    """
+    window = []
+    for value in (start_str, end_str):
+        value = (value or "").strip()
+        try:
+            # Well formed but impossible, like 2017-02-30T10:00, raises rather than giving None
+            parsed = parse_datetime(value) if "T" in value else None
+        except ValueError:
+            return None
+        if parsed is None:
+            try:
+                parsed = datetime.datetime.strptime(value, "%Y-%m-%d")
+            except ValueError:
+                return None
+        window.append((parsed if is_aware(parsed) else zone.localize(parsed)).astimezone(pytz.utc))
+    return tuple(window)
+
+
+@functools.lru_cache(maxsize=1024)
+def date_label(date):
+    return date.strftime("%Y/%m/%d ")
+
+
+def format_fc_datetime(value):
+    """
+    Same as value.strftime("%Y/%m/%d %H:%M"), the format the FullCalendar events use, without strftime.
+    """
+    return date_label(value.date()) + CLOCK_LABELS[value.hour * 60 + value.minute]
+
+
 def abstract_datetime_ranges(objects):
     data = []
     for object in objects:
@@ -71,21 +140,26 @@ def abstract_datetime_ranges(objects):
 
 
 def flatten_time_array(time_array):
+    """
+    :param time_array: Busy times as {"start", "end"} dicts sorted by start
+    :return: Flat [start, end, start, end...] list with the overlapping times merged
+    """
     interval_times = []
-    skip_next = False
-    for i, event in enumerate(time_array):
-        if not skip_next:
-            interval_times.append(event["start"])
-        skip_next = False
-
-        if len(time_array) > i+1 and event["end"] > time_array[i+1]["start"]:
-            skip_next = True
+    for event in time_array:
+        if interval_times and event["start"] < interval_times[-1]:
+            # Overlaps (or sits inside) the previous block, so just stretch it
+            interval_times[-1] = max(interval_times[-1], event["end"])
         else:
+            interval_times.append(event["start"])
             interval_times.append(event["end"])
 
     return interval_times
 
 
+def is_minute_aligned(times):
+    return all(not time.second and not time.microsecond for time in times)
+
+
 def get_sun_sat(date):
     """
     :param date: A date anywhere in the week that you want
@@ -110,47 +184,37 @@ def within_range_date(date, start, end):
     return start <= time <= end
 
 
+def get_day_range(date):
+    """
+    :param date: A local date
+    :return: Aware datetimes for midnight at the start of that day and of the next one
+    """
+    start = make_aware(datetime.datetime.combine(date, datetime.datetime.min.time()))
+    end = make_aware(datetime.datetime.combine(date + datetime.timedelta(days=1), datetime.datetime.min.time()))
+    return start, end
+
+
 def break_into_free_time(times, start, end):
-    free_times = []
+    """
+    :param times: Flattened busy times (see flatten_time_array)
+    :param start: First date of the range
+    :param end: Last date of the range
+    :return: The gaps between the busy times as {"start", "end"} dicts, clipped to the range
+    """
+    range_start = pytz.utc.localize(datetime.datetime.combine(start, datetime.datetime.min.time()))
+    range_end = pytz.utc.localize(datetime.datetime.combine(end, datetime.datetime.max.time()))
 
-    if len(times) == 0:
-        return [{"start": pytz.utc.localize(datetime.datetime.combine(start, datetime.datetime.min.time())),
-                 "end": pytz.utc.localize(datetime.datetime.combine(end, datetime.datetime.max.time()))}]
+    free_times = []
 
-    # Get the correct start and end of the range
-    if len(times) > 0:
+    # Every other edge starts a gap: [range start, busy start], [busy end, busy start], ..., [busy end, range end]
+    edges = [range_start] + times + [range_end]
+    for index in range(0, len(edges), 2):
+        start = max(edges[index], range_start)
+        end = min(edges[index + 1], range_end)
+        if end <= start:
+            continue
 
-        # Pick to either start at start of week or end of overlapping event
-        if within_range_date(start, times[0], times[1]):
-            where_to_start = times[1]
-            times.pop(0)
-        else:
-            where_to_start = pytz.utc.localize(datetime.datetime.combine(start, datetime.datetime.min.time()))
-            times = [where_to_start] + times
+        offset = (15 - ((15+start.minute) % 15)) if (15 - ((15+start.minute) % 15)) != 15 else 0
+        free_times.append({"start": start + datetime.timedelta(minutes=offset), "end": end})
 
-        # Pick to either end at end of week or start of overlapping event
-        if within_range_date(end, times[-2], times[-1]):
-            where_to_end = times[-2]
-            times.pop(len(times)-1)
-        else:
-            where_to_end = pytz.utc.localize(datetime.datetime.combine(end, datetime.datetime.max.time()))
-            times = times + [where_to_end]
-
-    # Remove any that don't exist outside of range
-    ranges = [x for x in times if where_to_start <= x <= where_to_end]
-
-    # Iterate over everything and get the free time blocks
-    index = 1
-    busy = False
-    while index < len(times):
-        if not busy:
-            start = times[index-1]
-            end = times[index]
-            offset = (15 - ((15+start.minute) % 15)) if (15 - ((15+start.minute) % 15)) != 15 else 0
-            data = {"start": start + datetime.timedelta(minutes=offset), "end": end}
-            free_times.append(data)
-
-        busy = not busy
-        index += 1
-
-    return free_times
\ No newline at end of file
+    return free_times
@@ -0,0 +1,132 @@
+"""
+Wall-clock time of a zone for the slot engine (lib/slots.py), without a timezone object per slot.
+
+Instants are whole minutes since 1970-01-01 00:00 UTC ("epoch minutes"). A local week keeps the few
+(first epoch minute, UTC offset) pairs it spans, one pair normally and two on the weeks the clocks
+change, so turning an instant into wall time is a bisect and an addition.
+"""
+import bisect
+import datetime
+import functools
+
+import pytz
+from django.conf import settings
+
+EPOCH = pytz.utc.localize(datetime.datetime(1970, 1, 1))
+MINUTE = datetime.timedelta(minutes=1)
+MINUTES_IN_DAY = 24 * 60
+MINUTES_IN_WEEK = 7 * MINUTES_IN_DAY
+
+
+def schedule_zone():
+    """
+    :return: The zone working hours and slot times are in (SCHEDULE_TIME_ZONE)
+    """
+    return pytz.timezone(getattr(settings, "SCHEDULE_TIME_ZONE", "UTC"))
+
+
+def localize(zone, naive):
+    """
+    :return: The wall time as an aware datetime. Times the clocks skip or repeat get the standard time offset.
+    """
+    return zone.normalize(zone.localize(naive)) if hasattr(zone, "localize") else naive.replace(tzinfo=zone)
+
+
+def to_epoch_minutes(value, round_up=False):
+    """
+    :param value: Aware datetime
+    :return: Whole minutes since the epoch, seconds rounded down (or up)
+    """
+    if round_up:
+        return -((EPOCH - value) // MINUTE)
+    return (value - EPOCH) // MINUTE
+
+
+def from_epoch_minutes(minute):
+    return EPOCH + datetime.timedelta(minutes=minute)
+
+
+def utc_offset(zone, minute):
+    """
+    :return: The zone's UTC offset in minutes at the epoch minute
+    """
+    return from_epoch_minutes(minute).astimezone(zone).utcoffset() // MINUTE
+
+
+def transitions(zone, start, end):
+    """
+    Finds the offset changes between two epoch minutes, checking once a day and bisecting to the minute
+    where the offset differs. Assumes the offset changes at most once a day, which every zone does.
+    :return: [(epoch minute, offset)], the offset at start and then every change up to end
+    """
+    table = [(start, utc_offset(zone, start))]
+    day_start, offset = table[0]
+    while day_start < end:
+        day_end = min(day_start + MINUTES_IN_DAY, end)
+        end_offset = utc_offset(zone, day_end)
+        if end_offset != offset:
+            # The first minute with the new offset is in (day_start, day_end]
+            low, high = day_start, day_end
+            while high - low > 1:
+                middle = (low + high) // 2
+                if utc_offset(zone, middle) == offset:
+                    low = middle
+                else:
+                    high = middle
+            table.append((high, end_offset))
+            offset = end_offset
+        day_start = day_end
+    return table
+
+
+class WeekClock(object):
+    """
+    One week of a zone from Sunday 00:00 to the next Sunday 00:00 wall time.
+
+    `start` and `end` are the epoch minutes of those two midnights, so a week the clocks change in is an
+    hour shorter or longer than MINUTES_IN_WEEK. `wall()` gives the wall time of an epoch minute as
+    minutes since the week's Sunday 00:00.
+    """
+
+    __slots__ = ("sunday", "start", "end", "local_start", "changes", "offsets")
+
+    def __init__(self, zone, sunday):
+        midnight = datetime.datetime.combine(sunday, datetime.time.min)
+        self.sunday = sunday
+        self.start = to_epoch_minutes(localize(zone, midnight))
+        self.end = to_epoch_minutes(localize(zone, midnight + datetime.timedelta(weeks=1)))
+        self.local_start = (midnight - EPOCH.replace(tzinfo=None)) // MINUTE
+
+        # A day either side for busy times and slots that run over the ends of the week
+        table = transitions(zone, self.start - MINUTES_IN_DAY, self.end + MINUTES_IN_DAY)
+        self.changes = tuple(minute for minute, _ in table)
+        self.offsets = tuple(offset for _, offset in table)
+
+    @property
+    def fixed(self):
+        """
+        If the offset is the same all week (the clocks don't change)
+        """
+        return len(self.offsets) == 1
+
+    def offset(self, minute):
+        return self.offsets[max(bisect.bisect_right(self.changes, minute) - 1, 0)]
+
+    def wall(self, minute):
+        """
+        :return: Wall-clock minutes from the week's Sunday 00:00 to the epoch minute
+        """
+        return minute + self.offset(minute) - self.local_start
+
+
+@functools.lru_cache(maxsize=1024)
+def get_week_clock(zone_name, sunday):
+    """
+    :param zone_name: Name of the zone, like "America/New_York"
+    :param sunday: The (local) Sunday the week starts on
+    """
+    return WeekClock(pytz.timezone(zone_name), sunday)
+
+
+def week_clock(zone, sunday):
+    return get_week_clock(zone.zone if hasattr(zone, "zone") else str(zone), sunday)
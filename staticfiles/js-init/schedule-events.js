@@ -0,0 +1,79 @@
+/*
+ * Live schedule changes pushed by the server (server-sent events from /<user_id>/events).
+ *
+ * scheduleEvents(userId, onChange, onReload) calls onChange(change) for every appointment or time off
+ * created or deleted, and onReload() when the page should load everything again: the hours or types
+ * changed, or the stream reconnected and may have missed something. Every page part listening to the
+ * same coach shares one connection.
+ *
+ * The stream holds a server worker for as long as the tab is open, so it is only opened when the page sets
+ * scheduleEventsOptions.live (SCHEDULE_EVENTS_LIVE). Otherwise, or without EventSource, onReload() runs every
+ * scheduleEventsOptions.pollSeconds while the tab is visible, and the ETags keep those loads to a 304.
+ */
+var scheduleEvents = (function () {
+    var streams = {};
+
+    function poll(stream) {
+        var options = window.scheduleEventsOptions || {};
+        setInterval(function () {
+            if (!document.hidden) {
+                $.each(stream.listeners, function (i, listener) { listener.onReload(); });
+            }
+        }, (options.pollSeconds || 60) * 1000);
+        return stream;
+    }
+
+    function connect(userId) {
+        var stream = {listeners: []};
+        var options = window.scheduleEventsOptions || {};
+        if (!options.live || !window.EventSource) {
+            return poll(stream);
+        }
+
+        var source = new EventSource("/" + userId + "/events");
+        var connected = false;
+
+        source.addEventListener("ready", function () {
+            if (connected) {
+                $.each(stream.listeners, function (i, listener) { listener.onReload(); });
+            }
+            connected = true;
+        });
+
+        source.addEventListener("change", function (message) {
+            var change = JSON.parse(message.data);
+            var reload = change.action === "changed";
+            $.each(stream.listeners, function (i, listener) {
+                if (reload) {
+                    listener.onReload(change);
+                } else {
+                    listener.onChange(change);
+                }
+            });
+        });
+
+        return stream;
+    }
+
+    var listen = function (userId, onChange, onReload) {
+        if (!streams[userId]) {
+            streams[userId] = connect(userId);
+        }
+        streams[userId].listeners.push({onChange: onChange, onReload: onReload});
+    };
+
+    // Start and end of a change as moments, in the same local time the calendars show
+    listen.range = function (change) {
+        return [moment(change.start, "YYYY/MM/DD HH:mm"), moment(change.end, "YYYY/MM/DD HH:mm")];
+    };
+
+    // Takes the open slots a new appointment or time off overlaps off an availability calendar
+    listen.removeTakenSlots = function (calendar, change) {
+        var range = listen.range(change);
+        calendar.fullCalendar('removeEvents', function (slot) {
+            return slot.start < range[1] && slot.end > range[0];
+        });
+    };
+
+    return listen;
+})();
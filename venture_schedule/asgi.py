@@ -0,0 +1,25 @@
+"""
+ASGI config for venture_schedule project.
+
+It exposes the ASGI callable as a module-level variable named ``application``, to be served with an ASGI
+server such as uvicorn (``uvicorn venture_schedule.asgi:application``).
+
+Every request gets its own thread for the ORM (appointments.aio.ThreadSensitiveMiddleware). Django 3.2
+reads streaming responses on the event loop, so the calendar feed and the schedule event streams answer
+404 here; route /<id>/schedule.ics and /<id>/events to the WSGI deployment.
+
+For more information on this file, see
+https://docs.djangoproject.com/en/3.2/howto/deployment/asgi/
+"""
+
+import os
+
+from django.core.asgi import get_asgi_application
+
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "venture_schedule.settings")
+
+application = get_asgi_application()
+
+from appointments.aio import ThreadSensitiveMiddleware  # noqa: E402 (needs the apps loaded)
+
+application = ThreadSensitiveMiddleware(application)
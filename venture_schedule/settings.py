@@ -43,6 +43,7 @@ INSTALLED_APPS = [
 AUTH_USER_MODEL = 'appointments.User'
 
 MIDDLEWARE = [
+    'appointments.middleware.RequestTimingMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -54,12 +55,16 @@ MIDDLEWARE = [
 
 ROOT_URLCONF = 'venture_schedule.urls'
 
+TEMPLATE_LOADERS = [
+    'django.template.loaders.filesystem.Loader',
+    'django.template.loaders.app_directories.Loader',
+]
+
 TEMPLATES = [
     {
-        'BACKEND': 'django.template.backends.django.DjangoTemplates',
+        'BACKEND': 'appointments.templating.TimedDjangoTemplates',
         'DIRS': [os.path.join(BASE_DIR, 'templates')]
         ,
-        'APP_DIRS': True,
         'OPTIONS': {
             'context_processors': [
                 'django.template.context_processors.debug',
@@ -67,12 +72,16 @@ TEMPLATES = [
                 'django.contrib.auth.context_processors.auth',
                 'django.contrib.messages.context_processors.messages',
             ],
+            # In production every template is read and compiled once per process instead of on every render
+            'loaders': TEMPLATE_LOADERS if DEBUG else [('django.template.loaders.cached.Loader', TEMPLATE_LOADERS)],
         },
     },
 ]
 
 WSGI_APPLICATION = 'venture_schedule.wsgi.application'
 
+ASGI_APPLICATION = 'venture_schedule.asgi.application'
+
 
 # Database
 # https://docs.djangoproject.com/en/1.10/ref/settings/#databases
@@ -84,6 +93,110 @@ DATABASES = {
     }
 }
 
+# PostgreSQL when POSTGRES_DB is set (needs psycopg2 and PostgreSQL 12+). Appointments and time off then
+# get a tstzrange `period` column with GiST indexes, overlap queries use `&&` and the database itself
+# refuses overlapping appointments (migration 0012). `POSTGRES_DB=schedule python manage.py test`
+# runs the suite against it.
+if os.environ.get('POSTGRES_DB'):
+    DATABASES['default'] = {
+        'ENGINE': 'django.db.backends.postgresql',
+        'NAME': os.environ['POSTGRES_DB'],
+        'USER': os.environ.get('POSTGRES_USER', ''),
+        'PASSWORD': os.environ.get('POSTGRES_PASSWORD', ''),
+        'HOST': os.environ.get('POSTGRES_HOST', ''),
+        'PORT': os.environ.get('POSTGRES_PORT', ''),
+        # Seconds to keep a connection open between requests instead of connecting for every one
+        'CONN_MAX_AGE': int(os.environ.get('CONN_MAX_AGE', 60)),
+    }
+
+# Run on every new SQLite connection (appointments/database.py). WAL lets the pages keep reading while a
+# booking writes, and synchronous=NORMAL only waits for the disk at checkpoints in WAL mode.
+SQLITE_PRAGMAS = {
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',
+    # Milliseconds a writer waits for another one before giving up with "database is locked"
+    'busy_timeout': 5000,
+    'mmap_size': 256 * 1024 * 1024,
+    # Negative is KiB, 64MB of page cache per connection
+    'cache_size': -64000,
+}
+
+# SQLITE_READ_CONNECTION=1 gives the read-only views (availability, today and month) their own connection
+# to the database file, see appointments.database.ReadRouter. It stays off for the tests, where a
+# second connection can't see the rows of the test's transaction.
+if DATABASES['default']['ENGINE'] == 'django.db.backends.sqlite3' and os.environ.get('SQLITE_READ_CONNECTION'):
+    DATABASES['read'] = dict(DATABASES['default'], TEST={'MIRROR': 'default'})
+
+READ_DATABASE = 'read' if 'read' in DATABASES else None
+
+DATABASE_ROUTERS = ['appointments.database.ReadRouter']
+
+
+# Keep the integer ids the tables already have
+DEFAULT_AUTO_FIELD = 'django.db.models.AutoField'
+
+
+# Caches
+# https://docs.djangoproject.com/en/1.10/topics/cache/
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    # Open appointment slots per (manager, version, week, appointment type), see appointments/cache.py. The
+    # version comes from the database, so a worker never serves weeks older than the schedule
+    'availability': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'availability',
+        'TIMEOUT': 60 * 60 * 24,
+        'OPTIONS': {
+            'MAX_ENTRIES': 5000,
+        },
+    },
+    # Template fragments, see appointments/fragments.py. Their versions are in the database, so a worker
+    # never serves an old one, but the cache has to be shared (memcached, Redis) for the workers to share
+    # the renders.
+    'fragments': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'fragments',
+        'OPTIONS': {
+            'MAX_ENTRIES': 2000,
+        },
+    },
+}
+
+AVAILABILITY_CACHE = 'availability'
+
+# The {% cache %} fragments of the pages. Their keys change with every edit to what they show, so they can
+# be kept until they are pushed out (None is forever).
+FRAGMENT_CACHE = 'fragments'
+
+FRAGMENT_CACHE_TIMEOUT = 60 * 60 * 24 * 7
+
+# Weeks ahead that `manage.py warm_availability` fills in. The availability cache has to be shared
+# (memcached, Redis, a database table) for the servers to see what the command writes, it refuses to run
+# otherwise unless given --force.
+WARM_AVAILABILITY_WEEKS = 4
+
+# How far /load/next/<user_id> looks for open slots, and the most it gives back at once
+NEXT_AVAILABLE_HORIZON_WEEKS = 8
+
+NEXT_AVAILABLE_MAX = 50
+
+
+# Request timing (appointments/middleware.py)
+
+# Send the query count and db/template/view times back in a Server-Timing header
+SERVER_TIMING = True
+
+# Requests per URL name kept for the summary at /admin/timings
+REQUEST_TIMING_SAMPLES = 200
+
+# URL name -> most queries a request may run. Over budget is logged, or raises when strict.
+QUERY_BUDGETS = {}
+
+QUERY_BUDGET_STRICT = False
+
 
 # Password validation
 # https://docs.djangoproject.com/en/1.10/ref/settings/#auth-password-validators
@@ -115,6 +228,10 @@ USE_L10N = True
 
 USE_TZ = True
 
+# The zone working hours, slots and the times people book are wall-clock times of (lib/zones.py).
+# Schedules so far were entered as UTC, moving to TIME_ZONE means shifting the stored times first.
+SCHEDULE_TIME_ZONE = 'UTC'
+
 # Static files (CSS, JavaScript, Images)
 # https://docs.djangoproject.com/en/1.10/howto/static-files/
 
@@ -124,5 +241,77 @@ STATICFILES_DIRS = [
 
 STATIC_URL = '/static/'
 
+# Where collectstatic puts the files (`manage.py build_assets` runs it)
+STATIC_ROOT = os.path.join(BASE_DIR, 'static')
+
+# ASSET_BUNDLES=1 makes the templates load one minified file per {% bundle %} tag instead of its scripts
+# or stylesheets one by one (appointments/assets.py). Only turn it on where `manage.py build_assets` has
+# run with it on: every {% static %} then needs the manifest that writes, or the page fails.
+ASSET_BUNDLES = bool(os.environ.get('ASSET_BUNDLES'))
+
+ASSET_BUNDLE_DIR = os.path.join(BASE_DIR, 'staticfiles', 'bundles')
+
+# Content hashed names, and .gz/.br copies of them, for the collected files
+if ASSET_BUNDLES:
+    STATICFILES_STORAGE = 'appointments.assets.CompressedManifestStorage'
+
+# Serve STATIC_ROOT from Django (appointments.views.static_asset), with the compressed copies and far-future
+# caching for the hashed names. Leave it off when the web server in front serves /static/ itself.
+SERVE_ASSETS = False
+
+# Seconds browsers keep a file with a hashed name
+ASSET_MAX_AGE = 365 * 24 * 60 * 60
+
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
+
+# Engine used to find open appointment slots: "python" (the original loop), "bitmap" (NumPy) or "epoch"
+# (integer minutes, lib/slots.py). Any SCHEDULE_TIME_ZONE other than UTC always uses "epoch".
+AVAILABILITY_ENGINE = 'epoch'
+
+# Read availability from the free_intervals table kept up to date on every booking change
+# (backfill with `manage.py rebuild_free_slots` before turning it on)
+AVAILABILITY_MATERIALIZED = False
+
+
+# How far ahead a standing appointment that never ends is checked against the schedule when it is booked
+STANDING_APPOINTMENT_HORIZON_WEEKS = 52
+
+# Appointments that ended more than this many weeks ago are removed by `manage.py purge_appointments`
+APPOINTMENT_RETENTION_WEEKS = 2
+
+APPOINTMENT_PURGE_BATCH_SIZE = 500
+
+# Seconds between purges on a background thread in the web process, None to leave it to cron
+APPOINTMENT_PURGE_INTERVAL = None
+
+# Longest start/end window the calendar can ask for at once (FullCalendar's month view shows six weeks)
+CALENDAR_MAX_WINDOW_DAYS = 42
+
+# Encoder for the JSON views: "auto" (orjson when it is installed), "orjson" or "json"
+JSON_ENCODER = 'auto'
+
+# Broker for the live schedule streams: LocalBroker reaches this process only, RedisBroker every worker
+# (needs the redis package and SCHEDULE_EVENTS_REDIS_URL)
+SCHEDULE_EVENTS_BROKER = 'appointments.events.LocalBroker'
+
+SCHEDULE_EVENTS_REDIS_URL = 'redis://localhost:6379/0'
+
+# Seconds between keepalive comments on an idle stream, and before a stream is closed for the browser to reconnect
+SCHEDULE_EVENTS_KEEPALIVE = 15
+
+SCHEDULE_EVENTS_MAX_SECONDS = 300
+
+# Let the pages keep a stream open instead of polling. Every open tab holds a worker for up to
+# SCHEDULE_EVENTS_MAX_SECONDS, so only turn this on behind workers that can wait on many streams at once
+# (gunicorn --worker-class gevent, or gthread with enough --threads). Off, the calendars load again every
+# SCHEDULE_POLL_SECONDS and the ETags answer 304 while nothing changed.
+SCHEDULE_EVENTS_LIVE = False
+
+SCHEDULE_POLL_SECONDS = 60
+
+# Threads the async views cut availability into slots on (see appointments/aio.py)
+ASYNC_CPU_THREADS = 4
+
+# Rows inserted per statement by `manage.py import_schedule` and the import upload
+IMPORT_BATCH_SIZE = 1000
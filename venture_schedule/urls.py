@@ -13,6 +13,7 @@ Including another URLconf
     1. Import the include() function: from django.conf.urls import url, include
     2. Add a URL to urlpatterns:  url(r'^blog/', include('blog.urls'))
 """
+from django.conf import settings
 from django.conf.urls import url
 from django.contrib import admin
 from appointments.views import *
@@ -24,12 +25,19 @@ urlpatterns = [
     url(r'^type/create$', create_appt_type, name="create_type"),
     url(r'^time/create$', add_time_off, name="create_timeoff"),
     url(r'^session$', login_view, name="login_view"),
+    url(r'^import$', import_schedule_upload, name="import_schedule"),
     url(r'^time/month$', get_appointments_for_month, name="get_month"),
     url(r'^load/appts/(?P<user_id>[-\d]+)$', get_available_appts, name="get_appts"),
+    url(r'^load/next/(?P<user_id>[-\d]+)$', get_next_available, name="get_next_appts"),
     url(r'^time/(?P<user_id>[-\d]+)/today$', get_todays_timeoff_for_user, name="get_today_timeoff"),
+    url(r'^(?P<user_id>[-\d]+)/events$', schedule_events, name="schedule_events"),
+    url(r'^(?P<user_id>[-\d]+)/schedule\.ics$', schedule_feed, name="schedule_feed"),
     url(r'^(?P<user_id>[-\d]+)/today$', get_todays_appt_for_user, name="get_today_appt"),
     url(r'^time/(?P<time_id>[-\d]+)/delete$', delete_time_off, name="delete_timeoff"),
+    url(r'^time/(?P<time_id>[-\d]+)/skip$', skip_time_off, name="skip_timeoff"),
     url(r'^type/(?P<type_id>[-\d]+)/delete$', delete_appt_type, name="delete_type"),
     url(r'^logout$', logout_view, name="logout_view"),
+    url(r'^admin/timings$', timing_summary, name="timing_summary"),
     url(r'^admin/', admin.site.urls),
+    url(r'^%s(?P<path>.+)$' % settings.STATIC_URL.lstrip('/'), static_asset, name="static_asset"),
 ]